@@ -0,0 +1,224 @@
+"""Cross-check the vectorized kernels against the loop reference and time both.
+
+Usage:
+  python cpu_baseline/bench_kernels.py                      # n=2..24 speedup table
+  python cpu_baseline/bench_kernels.py --max-qubits 20 --csv results/tables/kernels.csv
+  python cpu_baseline/bench_kernels.py --qft                # QFT time per apply_ops mode
+  python cpu_baseline/bench_kernels.py --batch --batch-qubits 12   # states*gates/s vs batch size
+  python cpu_baseline/bench_kernels.py --threads 32 --thread-qubits 26  # thread scaling efficiency
+"""
+import argparse, time, os, sys, csv, numpy as np
+
+from sim import statevector as vec
+from sim import statevector_loop as loop
+from circuits.qft import qft_circuit
+from circuits.grover2 import grover2_once
+from circuits.grover import grover_once
+
+# Closed-form QFT reference lives with the other experiment references
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from experiments.ref_sim import qft_states
+
+# apply_ops keyword arguments compared by the cross-check and --qft table
+MODES = {
+    'eager': {},
+    'lazy_swaps': {'lazy_swaps': True},
+    'fuse1': {'fuse': 1},
+    'fuse2': {'fuse': 2},
+    'fuse3': {'fuse': 3},
+    'fold_diag': {'fold_diagonal': True},
+    'fold_diag+fuse2': {'fold_diagonal': True, 'fuse': 2},
+}
+
+def random_state(nqubits, seed, dtype=np.complex64):
+    rng = np.random.default_rng(seed)
+    dim = 1 << nqubits
+    st = rng.standard_normal(dim) + 1j * rng.standard_normal(dim)
+    st /= np.linalg.norm(st)
+    return st.astype(dtype)
+
+def gate_mix(nqubits):
+    """One of each kernel, touching the lowest, middle and highest qubit."""
+    lo, mid, hi = 0, nqubits // 2, nqubits - 1
+    ops = [('H', lo), ('H', hi), ('X', mid), ('Z', hi), ('MASKPHASE', 1 | (1 << hi), 1, 0.7)]
+    if nqubits > 1:
+        ops += [('CNOT', hi, lo), ('CNOT', lo, hi), ('CPHASE', lo, hi, 0.3), ('SWAP', lo, hi)]
+    return ops
+
+def cross_check(max_qubits, atol=1e-5):
+    """Compare every kernel and the bundled circuits against the loop engine."""
+    checked = 0
+    for n in range(1, max_qubits + 1):
+        circuits = [gate_mix(n), qft_circuit(n), grover_once(n)]
+        if n == 2:
+            circuits.append(grover2_once())
+        for seed, ops in enumerate(circuits):
+            for op in ops:
+                a = random_state(n, seed)
+                b = a.copy()
+                ga = vec.apply_ops(a, n, [op])
+                gb = loop.apply_ops(b, n, [op])
+                if ga != gb or not np.allclose(a, b, atol=atol):
+                    raise AssertionError(f"mismatch n={n} op={op}")
+                checked += 1
+            b = random_state(n, seed)
+            gb = loop.apply_ops(b, n, ops)
+            for mode, kwargs in MODES.items():
+                a = random_state(n, seed)
+                if vec.apply_ops(a, n, ops, **kwargs) != gb or not np.allclose(a, b, atol=atol):
+                    raise AssertionError(f"mismatch n={n} mode={mode} circuit={ops}")
+                checked += 1
+        # One-pass bit reversal equals the SWAP ladder
+        a = random_state(n, n)
+        b = a.copy()
+        vec.apply_ops(a, n, [('PERMUTE', vec.bit_reversal(n))])
+        loop.apply_ops(b, n, [('SWAP', j, n - 1 - j) for j in range(n // 2)])
+        if not np.allclose(a, b, atol=atol):
+            raise AssertionError(f"bit-reversal mismatch n={n}")
+        checked += 1
+    return checked
+
+def check_qft_unitary(max_qubits, atol=1e-5):
+    """Push all 2^n basis inputs through QFT as one batch in every mode.
+
+    Row x of ref_sim.qft_states(n) is the circuit's output for input |x>.
+    """
+    checked = 0
+    for n in range(1, max_qubits + 1):
+        want = qft_states(n)
+        for mode, kwargs in MODES.items():
+            st = vec.init_state(n, np.arange(1 << n))
+            vec.apply_ops(st, n, qft_circuit(n), **kwargs)
+            if not np.allclose(st, want, atol=atol):
+                raise AssertionError(f"QFT unitary mismatch n={n} mode={mode}")
+            checked += 1
+    return checked
+
+def time_ops(engine, nqubits, ops, repeats, **kwargs):
+    st = engine.init_state(nqubits)
+    best = float('inf')
+    for _ in range(repeats):
+        t0 = time.perf_counter()
+        engine.apply_ops(st, nqubits, ops, **kwargs)
+        best = min(best, time.perf_counter() - t0)
+    return best * 1000.0 / len(ops)  # ms per gate
+
+def qft_table(min_qubits, max_qubits, repeats):
+    """Whole-circuit QFT time for every apply_ops mode."""
+    header = ['nqubits'] + [f'{m}_ms' for m in MODES]
+    rows = []
+    print(' '.join(f"{h:>16}" for h in header))
+    for n in range(min_qubits, max_qubits + 1):
+        ops = qft_circuit(n)
+        row = [n] + [f"{time_ops(vec, n, ops, repeats, **kw) * len(ops):.6f}" for kw in MODES.values()]
+        rows.append(row)
+        print(' '.join(f"{v:>16}" for v in row))
+    return header, rows
+
+def batch_table(nqubits, max_batch, repeats):
+    """QFT throughput on (batch, 2^n) states for batch = 1, 2, 4, ..., max_batch."""
+    ops = qft_circuit(nqubits)
+    header = ['nqubits', 'batch', 'ms', 'states_gates_per_s']
+    rows = []
+    print(f"{'n':>3} {'batch':>7} {'ms':>12} {'states*gates/s':>16}")
+    batch = 1
+    while batch <= max_batch:
+        st = vec.init_state(nqubits, np.arange(batch) % (1 << nqubits))
+        best = float('inf')
+        for _ in range(repeats):
+            t0 = time.perf_counter()
+            gates = vec.apply_ops(st, nqubits, ops)
+            best = min(best, time.perf_counter() - t0)
+        rows.append([nqubits, batch, f"{best * 1000.0:.6f}", f"{batch * gates / best:.4e}"])
+        print(f"{nqubits:>3} {batch:>7} {rows[-1][2]:>12} {rows[-1][3]:>16}")
+        batch *= 2
+    return header, rows
+
+def thread_table(nqubits, max_threads, repeats):
+    """QFT time and parallel efficiency T1 / (t * Tt) for t = 1, 2, 4, ..., max_threads."""
+    ops = qft_circuit(nqubits)
+    counts = sorted({1 << i for i in range(max_threads.bit_length()) if 1 << i <= max_threads} | {max_threads})
+    header = ['nqubits', 'threads', 'ms', 'speedup', 'efficiency']
+    rows = []
+    print(f"{'n':>3} {'threads':>8} {'ms':>12} {'speedup':>9} {'efficiency':>11}")
+    st = vec.init_state(nqubits)
+    base = None
+    for t in counts:
+        vec.apply_ops(st, nqubits, ops, threads=t)  # warm the plan cache and the pool
+        best = float('inf')
+        for _ in range(repeats):
+            t0 = time.perf_counter()
+            vec.apply_ops(st, nqubits, ops, threads=t)
+            best = min(best, time.perf_counter() - t0)
+        base = best if base is None else base
+        rows.append([nqubits, t, f"{best * 1000.0:.3f}", f"{base / best:.2f}", f"{base / (t * best):.2f}"])
+        print(f"{nqubits:>3} {t:>8} {rows[-1][2]:>12} {rows[-1][3]:>9} {rows[-1][4]:>11}")
+    return header, rows
+
+def write_table(path, header, rows):
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    with open(path, 'w', newline='') as f:
+        w = csv.writer(f)
+        w.writerow(header)
+        w.writerows(rows)
+    print(f"Saved: {path}")
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument('--min-qubits', type=int, default=2)
+    ap.add_argument('--max-qubits', type=int, default=24)
+    ap.add_argument('--loop-max-qubits', type=int, default=16,
+                    help='Largest n timed with the loop kernels (they scale as 2^n Python iterations)')
+    ap.add_argument('--check-max-qubits', type=int, default=10)
+    ap.add_argument('--repeats', type=int, default=3)
+    ap.add_argument('--csv', type=str, default='', help='Optional path for the speedup table')
+    ap.add_argument('--qft', action='store_true', help='Time whole QFT circuits per apply_ops mode instead')
+    ap.add_argument('--batch', action='store_true',
+                    help='Time batched QFT throughput vs batch size instead')
+    ap.add_argument('--batch-qubits', type=int, default=10)
+    ap.add_argument('--max-batch', type=int, default=1024)
+    ap.add_argument('--threads', type=int, default=0,
+                    help='Time QFT with 1..N threads and report scaling efficiency instead')
+    ap.add_argument('--thread-qubits', type=int, default=24)
+    args = ap.parse_args()
+
+    checked = cross_check(args.check_max_qubits)
+    print(f"[OK] cross-check: {checked} kernel/circuit comparisons up to n={args.check_max_qubits}")
+    checked = check_qft_unitary(args.check_max_qubits)
+    print(f"[OK] QFT unitary: {checked} batched all-basis checks up to n={args.check_max_qubits}")
+
+    if args.threads:
+        header, rows = thread_table(args.thread_qubits, args.threads, args.repeats)
+        if args.csv:
+            write_table(args.csv, header, rows)
+        return
+
+    if args.batch:
+        header, rows = batch_table(args.batch_qubits, args.max_batch, args.repeats)
+        if args.csv:
+            write_table(args.csv, header, rows)
+        return
+
+    if args.qft:
+        header, rows = qft_table(args.min_qubits, args.max_qubits, args.repeats)
+        if args.csv:
+            write_table(args.csv, header, rows)
+        return
+
+    header = ['nqubits', 'loop_ms_per_gate', 'vec_ms_per_gate', 'speedup']
+    rows = []
+    print(f"{'n':>3} {'loop ms/gate':>14} {'vec ms/gate':>14} {'speedup':>10}")
+    for n in range(args.min_qubits, args.max_qubits + 1):
+        ops = gate_mix(n)
+        vec_ms = time_ops(vec, n, ops, args.repeats)
+        loop_ms = time_ops(loop, n, ops, 1) if n <= args.loop_max_qubits else None
+        speedup = loop_ms / vec_ms if loop_ms is not None else None
+        rows.append([n, '' if loop_ms is None else f"{loop_ms:.6f}", f"{vec_ms:.6f}",
+                     '' if speedup is None else f"{speedup:.1f}"])
+        print(f"{n:>3} {rows[-1][1] or '-':>14} {rows[-1][2]:>14} {rows[-1][3] or '-':>10}")
+
+    if args.csv:
+        write_table(args.csv, header, rows)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,26 @@
+import numpy as np
+
+def grover_once(nqubits: int, marked=None):
+    """One Grover iteration on nqubits, phase-flipping basis state `marked`
+    (default: all ones). Multi-controlled phases use
+      ('MASKPHASE', mask, value, theta)
+    which multiplies basis states with (index & mask) == value by e^{i theta}.
+    """
+    full = (1 << nqubits) - 1
+    if marked is None:
+        marked = full
+    if not 0 <= marked <= full:
+        raise ValueError("marked index out of range")
+    wires = range(nqubits)
+    ops = []
+    # Initialize uniform superposition
+    ops += [('H', q) for q in wires]
+    # Oracle: phase flip on |marked>
+    ops += [('MASKPHASE', full, marked, float(np.pi))]
+    # Diffusion: H X  (phase flip on |1..1>)  X H
+    ops += [('H', q) for q in wires]
+    ops += [('X', q) for q in wires]
+    ops += [('MASKPHASE', full, full, float(np.pi))]
+    ops += [('X', q) for q in wires]
+    ops += [('H', q) for q in wires]
+    return ops
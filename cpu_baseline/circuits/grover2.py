@@ -1,6 +1,8 @@
 
 import numpy as np
 
+from sim.circuit import Circuit
+
 def grover2_once(mark='11'):
     """One iteration of Grover for 2 qubits, marking state |11⟩ by phase flip.
     Returns an initialized superposition + oracle + diffusion operator.
@@ -21,3 +23,7 @@ def grover2_once(mark='11'):
     ops += [('X', 0), ('X', 1)]
     ops += [('H', 0), ('H', 1)]
     return ops
+
+def grover2_array(mark='11') -> Circuit:
+    """grover2_once(mark) as a Circuit."""
+    return Circuit.from_ops(grover2_once(mark), 2)
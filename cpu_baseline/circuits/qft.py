@@ -1,6 +1,8 @@
 
 import numpy as np
 
+from sim.circuit import Circuit, OP_CPHASE, OP_DTYPE, OP_H, OP_SWAP
+
 def qft_circuit(nqubits: int):
     """Return a gate list for QFT on nqubits.
     Conventions:
@@ -23,3 +25,23 @@ def qft_circuit(nqubits: int):
     for j in range(nqubits // 2):
         ops.append(('SWAP', j, nqubits - 1 - j))
     return ops
+
+def qft_array(nqubits: int) -> Circuit:
+    """qft_circuit(nqubits) as a Circuit, built column-wise without tuples."""
+    # Qubit j contributes H followed by CPHASEs from k = j+1..n-1
+    per_qubit = nqubits - np.arange(nqubits)
+    starts = np.concatenate(([0], np.cumsum(per_qubit)))
+    body = int(starts[-1])
+    rows = np.zeros(body + nqubits // 2, dtype=OP_DTYPE)
+    j = np.repeat(np.arange(nqubits), per_qubit)
+    k = np.arange(body) - starts[j] + j  # k == j marks the H
+    is_h = k == j
+    rows['opcode'][:body] = np.where(is_h, OP_H, OP_CPHASE)
+    rows['q0'][:body] = np.where(is_h, j, k)
+    rows['q1'][:body] = np.where(is_h, 0, j)
+    rows['angle'][:body] = np.where(is_h, 0.0, np.ldexp(np.pi, -(k - j)))
+    half = np.arange(nqubits // 2)
+    rows['opcode'][body:] = OP_SWAP
+    rows['q0'][body:] = half
+    rows['q1'][body:] = nqubits - 1 - half
+    return Circuit(rows, nqubits)
@@ -2,18 +2,27 @@
 import argparse, time, os, csv, numpy as np
 from pathlib import Path
 
-from sim.statevector import init_state, apply_ops
+from sim import statevector, statevector_loop, outofcore, sharded
+from sim.plan import PLAN_CACHE
 from circuits.qft import qft_circuit
 from circuits.grover2 import grover2_once
+from circuits.grover import grover_once
 
-def run_and_time(circuit_ops, nqubits, repeats):
+ENGINES = {'vector': statevector, 'loop': statevector_loop, 'memmap': outofcore,
+           'sharded': sharded}
+
+def run_and_time(circuit_ops, nqubits, repeats, engine='vector', batch=0, init_kwargs=None,
+                 **apply_kwargs):
+    """Time apply_ops; batch > 0 evolves basis inputs 0..batch-1 (mod 2^n) in one call."""
+    init_state, apply_ops = ENGINES[engine].init_state, ENGINES[engine].apply_ops
+    basis = np.arange(batch) % (1 << nqubits) if batch else 0
     times = []
     final_state = None
     gates = 0
     for _ in range(repeats):
-        st = init_state(nqubits, basis=0, dtype=np.complex64)
+        st = init_state(nqubits, basis=basis, dtype=np.complex64, **(init_kwargs or {}))
         t0 = time.perf_counter()
-        gates = apply_ops(st, nqubits, circuit_ops)
+        gates = apply_ops(st, nqubits, circuit_ops, **apply_kwargs)
         t1 = time.perf_counter()
         times.append((t1 - t0) * 1000.0)  # ms
         final_state = st
@@ -31,22 +40,68 @@ def save_csv(path, header, row):
 
 def main():
     ap = argparse.ArgumentParser()
-    ap.add_argument('--circuit', choices=['qft','grover2'], required=True)
-    ap.add_argument('--nqubits', type=int, default=4, help='Only used for QFT')
+    ap.add_argument('--circuit', choices=['qft','grover2','grover'], required=True)
+    ap.add_argument('--nqubits', type=int, default=4, help='Only used for QFT and grover')
     ap.add_argument('--repeats', type=int, default=200)
     ap.add_argument('--outdir', type=str, default='results')
+    ap.add_argument('--engine', choices=sorted(ENGINES), default='vector',
+                    help='vector (default), the original per-element loop kernels, or memmap '
+                         '(out-of-core state file under <outdir>/logs, applied block by block), '
+                         'or sharded (worker processes over shared memory)')
+    ap.add_argument('--block-qubits', type=int, default=outofcore.DEFAULT_BLOCK_QUBITS,
+                    help='memmap engine: amplitudes per block = 2^K (the in-RAM working set)')
+    ap.add_argument('--swap-cost', type=int, default=3,
+                    help='Gates counted per SWAP (default 3 = CNOT decomposition, for FPGA comparison)')
+    ap.add_argument('--lazy-swaps', action='store_true',
+                    help='Relabel qubits on SWAP and permute once at the end (vector engine only)')
+    ap.add_argument('--fuse', type=int, default=0,
+                    help='Fuse gates into dense blocks on at most K qubits (vector engine only, 0 = off)')
+    ap.add_argument('--fold-diagonal', action='store_true',
+                    help='Apply runs of Z/CPHASE/MASKPHASE as one phase multiply (vector engine only)')
+    ap.add_argument('--batch', type=int, default=0,
+                    help='Evolve basis inputs 0..B-1 together as a (B, 2^n) batch (vector engine only)')
+    ap.add_argument('--shards', type=int, default=4,
+                    help='sharded engine: worker processes (power of two; top log2(P) qubits are global)')
+    ap.add_argument('--threads', type=int, default=1,
+                    help='Worker threads per gate (vector and memmap engines)')
+    ap.add_argument('--plan-cache-mb', type=float, default=64,
+                    help='Byte budget of the compiled-plan LRU cache (vector engine, 0 = compile every run)')
     args = ap.parse_args()
+    PLAN_CACHE.max_bytes = int(args.plan_cache_mb * (1 << 20))
 
     if args.circuit == 'qft':
         ops = qft_circuit(args.nqubits)
         n = args.nqubits
         label = f'qft{n}'
+    elif args.circuit == 'grover':
+        ops = grover_once(args.nqubits)
+        n = args.nqubits
+        label = f'grover{n}'
     else:
         ops = grover2_once()
         n = 2
         label = 'grover2'
 
-    final_state, gates, mean_ms, std_ms = run_and_time(ops, n, args.repeats)
+    apply_kwargs, init_kwargs, stats = {}, {}, {}
+    if args.engine == 'vector':
+        apply_kwargs = {'swap_cost': args.swap_cost, 'lazy_swaps': args.lazy_swaps,
+                        'fuse': args.fuse, 'fold_diagonal': args.fold_diagonal, 'stats': stats,
+                        'threads': args.threads}
+    elif args.lazy_swaps or args.fuse or args.fold_diagonal or args.batch:
+        ap.error('--lazy-swaps/--fuse/--fold-diagonal/--batch require --engine vector')
+    elif args.engine == 'memmap':
+        apply_kwargs = {'swap_cost': args.swap_cost, 'stats': stats, 'threads': args.threads}
+        os.makedirs(os.path.join(args.outdir, 'logs'), exist_ok=True)
+        init_kwargs = {'path': os.path.join(args.outdir, 'logs', f'cpu_state_{label}.bin'),
+                       'block_qubits': args.block_qubits}
+    elif args.engine == 'sharded':
+        apply_kwargs = {'swap_cost': args.swap_cost, 'stats': stats}
+        init_kwargs = {'shards': args.shards, 'threads': args.threads}
+    elif args.swap_cost != 3 or args.threads != 1:
+        ap.error('--swap-cost/--threads require --engine vector, memmap or sharded')
+
+    final_state, gates, mean_ms, std_ms = run_and_time(ops, n, args.repeats, args.engine,
+                                                       args.batch, init_kwargs, **apply_kwargs)
 
     logs_path = os.path.join(args.outdir, 'logs', f'cpu_{label}.csv')
     tables_path = os.path.join(args.outdir, 'tables', 'cpu_timing.csv')
@@ -60,9 +115,36 @@ def main():
              [label, n, gates, args.repeats, f"{mean_ms:.6f}", f"{std_ms:.6f}"])
 
     # Save final state (for later correctness checks)
-    fs_path = os.path.join(args.outdir, 'logs', f'cpu_state_{label}.npy')
-    np.save(fs_path, final_state)
-    print(f"[OK] {label}: gates={gates}, mean={mean_ms:.4f} ms ± {std_ms:.4f} ms")
+    if args.engine == 'memmap':
+        # The state already lives in its (raw complex64) file; don't copy it into RAM
+        final_state.flush()
+        fs_path = final_state.path
+    elif args.engine == 'sharded':
+        fs_path = os.path.join(args.outdir, 'logs', f'cpu_state_{label}.npy')
+        np.save(fs_path, final_state.to_array())
+        final_state.close()
+    else:
+        fs_path = os.path.join(args.outdir, 'logs', f'cpu_state_{label}.npy')
+        np.save(fs_path, final_state)
+    print(f"[OK] {label} ({args.engine}): gates={gates}, mean={mean_ms:.4f} ms ± {std_ms:.4f} ms")
+    if args.batch:
+        rate = args.batch * gates / (mean_ms / 1000.0)
+        print(f"[batch] {args.batch} states: {rate:.3e} states*gates/s")
+    if 'diag_folded' in stats:
+        print(f"[diag] folded {stats['diag_folded']} diagonal gates into {stats['diag_sweeps']} phase sweeps")
+    if 'sweeps_eliminated' in stats:
+        print(f"[fuse] k={args.fuse}: sweeps {stats['sweeps_in']} -> {stats['sweeps_out']} "
+              f"({stats['sweeps_eliminated']} eliminated, {stats['fused_blocks']} fused blocks)")
+    if args.engine == 'memmap':
+        # stats accumulate over all repeats
+        print(f"[io] {args.repeats} repeats: {outofcore.io_summary(stats, gates * args.repeats)}")
+    if args.engine == 'sharded':
+        # stats accumulate over all repeats
+        print(f"[comm] {args.repeats} repeats: {sharded.comm_summary(stats, gates * args.repeats)}")
+    if args.engine == 'vector':
+        info = PLAN_CACHE.info()
+        print(f"[plan] cache hits={info['hits']} misses={info['misses']} "
+              f"compile={info['compile_ms']:.3f} ms, {info['nbytes']} B cached")
     print(f"Saved: {logs_path} and appended {tables_path}\nFinal state -> {fs_path}")
 
 if __name__ == '__main__':
@@ -0,0 +1,227 @@
+"""Array-backed circuit container.
+
+A Circuit stores its gates as rows of the structured dtype OP_DTYPE instead
+of a list of tuples:
+  opcode  uint8   OP_H .. OP_MASKPHASE (the FPGA microcode numbering)
+  q0, q1  uint16  target (H/X/Z), (control, target) (CNOT/CPHASE), the two
+                  qubits of a SWAP; unused fields are 0
+  mask    uint64  MASKPHASE mask
+  value   uint64  MASKPHASE value
+  angle   float64 CPHASE/MASKPHASE angle
+The rows live in one or more read-only array segments, so slicing returns
+views and concatenation only joins the segment tuples; neither copies gates.
+Iterating a Circuit yields the usual ops tuples, so it can be passed anywhere
+an ops list is accepted, and statevector.apply_ops compiles it straight from
+the integer opcodes. save/load write a 16-byte header and the raw rows.
+"""
+import hashlib
+from pathlib import Path
+
+import numpy as np
+
+OP_H, OP_X, OP_Z, OP_CNOT, OP_CPHASE, OP_SWAP, OP_MASKPHASE = 1, 2, 3, 4, 5, 6, 7
+OPCODES = {'H': OP_H, 'X': OP_X, 'Z': OP_Z, 'CNOT': OP_CNOT, 'CPHASE': OP_CPHASE,
+           'SWAP': OP_SWAP, 'MASKPHASE': OP_MASKPHASE}
+OPCODE_TAGS = {code: tag for tag, code in OPCODES.items()}
+
+OP_DTYPE = np.dtype([('opcode', 'u1'), ('q0', '<u2'), ('q1', '<u2'),
+                     ('mask', '<u8'), ('value', '<u8'), ('angle', '<f8')])
+
+_MAGIC = b'QCIR'
+_HEADER = np.dtype([('magic', 'S4'), ('version', '<u2'), ('nqubits', '<u2'), ('count', '<u8')])
+
+def op_fields(op: tuple) -> tuple:
+    """(opcode, q0, q1, mask, value, angle) of one ops tuple."""
+    tag = op[0].upper()
+    code = OPCODES.get(tag)
+    if code is None:
+        raise ValueError(f"op {tag} has no circuit opcode")
+    if code in (OP_H, OP_X, OP_Z):
+        return (code, op[1], 0, 0, 0, 0.0)
+    if code in (OP_CNOT, OP_SWAP):
+        return (code, op[1], op[2], 0, 0, 0.0)
+    if code == OP_CPHASE:
+        return (code, op[1], op[2], 0, 0, float(op[3]))
+    return (code, 0, 0, op[1], op[2], float(op[3]))
+
+def fields_op(code: int, q0: int, q1: int, mask: int, value: int, angle: float) -> tuple:
+    """Inverse of op_fields."""
+    tag = OPCODE_TAGS[code]
+    if code in (OP_H, OP_X, OP_Z):
+        return (tag, q0)
+    if code in (OP_CNOT, OP_SWAP):
+        return (tag, q0, q1)
+    if code == OP_CPHASE:
+        return (tag, q0, q1, angle)
+    return (tag, mask, value, angle)
+
+def _frozen(arr: np.ndarray) -> np.ndarray:
+    arr = arr.view()
+    arr.setflags(write=False)
+    return arr
+
+class Circuit:
+    """Immutable sequence of gates backed by OP_DTYPE array segments."""
+    __slots__ = ('nqubits', '_parts', '_offsets', '_digest')
+
+    def __init__(self, data=None, nqubits: int = None):
+        if data is None:
+            parts = ()
+        elif isinstance(data, np.ndarray):
+            if data.dtype != OP_DTYPE or data.ndim != 1:
+                raise ValueError(f"circuit rows must be a 1-d {OP_DTYPE} array")
+            parts = (_frozen(data),) if len(data) else ()
+        else:
+            parts = tuple(_frozen(p) for p in data if len(p))
+            if any(p.dtype != OP_DTYPE or p.ndim != 1 for p in parts):
+                raise ValueError(f"circuit segments must be 1-d {OP_DTYPE} arrays")
+        self._parts = parts
+        self._offsets = np.cumsum([0] + [len(p) for p in parts])
+        self._digest = None
+        if nqubits is None:
+            nqubits = self._min_qubits()
+        self.nqubits = nqubits
+
+    @classmethod
+    def from_ops(cls, ops, nqubits: int = None) -> 'Circuit':
+        ops = list(ops)
+        rows = np.empty(len(ops), dtype=OP_DTYPE)
+        if ops:
+            rows[:] = [op_fields(op) for op in ops]
+        return cls(rows, nqubits)
+
+    def _min_qubits(self) -> int:
+        n = 0
+        for p in self._parts:
+            one_q = np.isin(p['opcode'], (OP_H, OP_X, OP_Z))
+            two_q = np.isin(p['opcode'], (OP_CNOT, OP_CPHASE, OP_SWAP))
+            if one_q.any():
+                n = max(n, int(p['q0'][one_q].max()) + 1)
+            if two_q.any():
+                n = max(n, int(np.maximum(p['q0'][two_q], p['q1'][two_q]).max()) + 1)
+            masks = p['mask'][p['opcode'] == OP_MASKPHASE]
+            if masks.size:
+                n = max(n, int(np.bitwise_or.reduce(masks)).bit_length())
+        return n
+
+    @property
+    def array(self) -> np.ndarray:
+        """All rows as one read-only array (joins the segments once)."""
+        if len(self._parts) != 1:
+            joined = np.concatenate(self._parts) if self._parts else np.empty(0, dtype=OP_DTYPE)
+            self._parts = (_frozen(joined),) if len(joined) else ()
+            self._offsets = np.array([0, len(joined)]) if len(joined) else np.array([0])
+        return self._parts[0] if self._parts else _frozen(np.empty(0, dtype=OP_DTYPE))
+
+    def __len__(self) -> int:
+        return int(self._offsets[-1])
+
+    def __add__(self, other: 'Circuit') -> 'Circuit':
+        if not isinstance(other, Circuit):
+            return NotImplemented
+        return Circuit(self._parts + other._parts, max(self.nqubits, other.nqubits))
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            start, stop, step = key.indices(len(self))
+            if step != 1:
+                return Circuit(self.array[key], self.nqubits)
+            parts = []
+            for p, off in zip(self._parts, self._offsets):
+                lo, hi = max(start - off, 0), min(stop - off, len(p))
+                if lo < hi:
+                    parts.append(p[lo:hi])
+            return Circuit(tuple(parts), self.nqubits)
+        i = int(key)
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError("circuit index out of range")
+        seg = int(np.searchsorted(self._offsets, i, side='right')) - 1
+        return fields_op(*self._parts[seg][i - self._offsets[seg]].tolist())
+
+    def __iter__(self):
+        for p in self._parts:
+            for row in p.tolist():
+                yield fields_op(*row)
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, Circuit):
+            return NotImplemented
+        return self.nqubits == other.nqubits and np.array_equal(self.array, other.array)
+
+    __hash__ = None
+
+    def __repr__(self) -> str:
+        return f"Circuit(nqubits={self.nqubits}, gates={len(self)}, segments={len(self._parts)})"
+
+    def to_ops(self) -> list:
+        return list(self)
+
+    def columns(self):
+        """(opcode, q0, q1, mask, value, angle) as Python lists, one pass per segment."""
+        cols = [[] for _ in OP_DTYPE.names]
+        for p in self._parts:
+            for col, name in zip(cols, OP_DTYPE.names):
+                col.extend(p[name].tolist())
+        return cols
+
+    def digest(self) -> str:
+        """SHA-1 of the rows (cached); plan_key uses it for the plan cache."""
+        if self._digest is None:
+            h = hashlib.sha1(f"{self.nqubits};".encode())
+            for p in self._parts:
+                h.update(np.ascontiguousarray(p).data)
+            self._digest = h.hexdigest()
+        return self._digest
+
+    def count_gates(self, swap_cost: int = 3) -> int:
+        """Same count as statevector.count_gates on the equivalent ops list."""
+        swaps = sum(int(np.count_nonzero(p['opcode'] == OP_SWAP)) for p in self._parts)
+        return len(self) + (swap_cost - 1) * swaps
+
+    def save(self, path) -> Path:
+        path = Path(path)
+        header = np.array([(_MAGIC, 1, self.nqubits, len(self))], dtype=_HEADER)
+        with path.open('wb') as f:
+            f.write(header.tobytes())
+            for p in self._parts:
+                p.tofile(f)
+        return path
+
+    @classmethod
+    def load(cls, path, mmap: bool = False) -> 'Circuit':
+        """Read a saved circuit; mmap=True maps the rows instead of reading them."""
+        path = Path(path)
+        header = np.fromfile(path, dtype=_HEADER, count=1)
+        if header.size != 1 or header['magic'][0] != _MAGIC or int(header['version'][0]) != 1:
+            raise ValueError(f"{path} is not a saved circuit")
+        count = int(header['count'][0])
+        if mmap and count:
+            rows = np.memmap(path, dtype=OP_DTYPE, mode='r', offset=_HEADER.itemsize, shape=(count,))
+        else:
+            rows = np.fromfile(path, dtype=OP_DTYPE, count=count, offset=_HEADER.itemsize)
+            if len(rows) != count:
+                raise ValueError(f"{path}: truncated circuit ({len(rows)} of {count} gates)")
+        return cls(rows, int(header['nqubits'][0]))
+
+def random_circuit(nqubits: int, gates: int, seed: int = 0) -> Circuit:
+    """Random mix of all seven opcodes, generated column-wise."""
+    if nqubits < 2:
+        raise ValueError("random_circuit needs at least 2 qubits")
+    rng = np.random.default_rng(seed)
+    rows = np.zeros(gates, dtype=OP_DTYPE)
+    code = rng.integers(OP_H, OP_MASKPHASE + 1, gates)
+    q0 = rng.integers(0, nqubits, gates)
+    # q1 != q0 for the two-qubit gates
+    q1 = (q0 + rng.integers(1, nqubits, gates)) % nqubits
+    two_q = np.isin(code, (OP_CNOT, OP_CPHASE, OP_SWAP))
+    masked = code == OP_MASKPHASE
+    mask = rng.integers(1, 1 << nqubits, gates, dtype=np.uint64) * masked
+    rows['opcode'] = code
+    rows['q0'] = np.where(masked, 0, q0)
+    rows['q1'] = np.where(two_q, q1, 0)
+    rows['mask'] = mask
+    rows['value'] = rng.integers(0, 1 << nqubits, gates, dtype=np.uint64) & mask
+    rows['angle'] = np.where((code == OP_CPHASE) | masked, rng.uniform(-np.pi, np.pi, gates), 0.0)
+    return Circuit(rows, nqubits)
@@ -0,0 +1,209 @@
+"""Out-of-core statevector kept in an np.memmap file.
+
+The state is split into blocks of 2**block_qubits contiguous amplitudes, so
+qubits below block_qubits ("low") live inside a block and the others ("high")
+select the block. apply_ops groups the ops list into runs:
+  - a run whose non-diagonal gates only touch low qubits streams through the
+    file once, applying the whole run to each block in place;
+  - a run whose gates also touch high qubits H loads the 2^|H| blocks that
+    differ only in H together (pairs for one high qubit), so H become extra
+    local qubits of a small in-RAM state.
+Diagonal gates never force blocks to be paired: within a group the other high
+bits are fixed, so each phase term either reduces to a local MASKPHASE or does
+not apply, and groups left with no ops are not read at all.
+
+Local work reuses the in-RAM kernels (statevector.apply_ops) with a private
+plan cache. Every run records the bytes it read and wrote; see io_summary.
+"""
+import mmap
+import os
+import resource
+import tempfile
+import time
+import weakref
+
+import numpy as np
+
+from . import statevector
+from .passes import is_diagonal, permutation_swaps, restrict_op
+from .plan import PlanCache
+
+DEFAULT_BLOCK_QUBITS = 20
+
+class MemmapState:
+    """A 2**n amplitude state stored in a raw (headerless) memmap file."""
+
+    def __init__(self, nqubits: int, path=None, dtype=np.complex64,
+                 block_qubits: int = DEFAULT_BLOCK_QUBITS):
+        self.nqubits = nqubits
+        self.dtype = np.dtype(dtype)
+        self.block_qubits = min(block_qubits, nqubits)
+        if path is None:
+            fd, path = tempfile.mkstemp(prefix='qc_state_', suffix='.bin')
+            os.close(fd)
+            weakref.finalize(self, _remove, path)
+        self.path = str(path)
+        # mode 'w+' truncates and re-extends the file, so it starts as all zeros
+        self.data = np.memmap(self.path, dtype=self.dtype, mode='w+', shape=(1 << nqubits,))
+        self.cache = PlanCache(16 << 20)
+
+    @property
+    def shape(self):
+        return self.data.shape
+
+    @property
+    def block_size(self) -> int:
+        return 1 << self.block_qubits
+
+    def block(self, i: int) -> np.ndarray:
+        return self.data[i * self.block_size:(i + 1) * self.block_size]
+
+    def release(self, i: int) -> None:
+        """Drop block i's pages from this process (they stay in the page cache)."""
+        mm = getattr(self.data, '_mmap', None)
+        nbytes = self.block_size * self.dtype.itemsize
+        start = i * nbytes
+        if mm is None or not hasattr(mmap, 'MADV_DONTNEED') or start % mmap.PAGESIZE:
+            return
+        mm.madvise(mmap.MADV_DONTNEED, start, nbytes)
+
+    def to_array(self) -> np.ndarray:
+        return np.array(self.data)
+
+    def flush(self) -> None:
+        self.data.flush()
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+def init_state(nqubits: int, basis: int = 0, dtype=np.complex64, path=None,
+               block_qubits: int = DEFAULT_BLOCK_QUBITS) -> MemmapState:
+    """|basis> in a memmap file at path (a temporary file if None)."""
+    if np.ndim(basis) != 0:
+        raise ValueError("the memmap backend holds a single state; batches are not supported")
+    state = MemmapState(nqubits, path, dtype, block_qubits)
+    state.data[basis] = 1.0 + 0.0j
+    return state
+
+def peak_rss_mb() -> float:
+    """Peak resident set size of this process in MiB (ru_maxrss is KiB on Linux)."""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+
+def _op_qubits(op: tuple) -> tuple:
+    tag = op[0].upper()
+    if tag in ('H', 'X'):
+        return (op[1],)
+    if tag in ('CNOT', 'SWAP'):
+        return tuple(op[1:3])
+    if tag == 'UNITARY':
+        return tuple(op[1])
+    raise ValueError(f"Unknown op {tag}")
+
+def plan_runs(ops: list, block_qubits: int) -> list:
+    """Split ops into (high_qubits, ops) runs; see the module docstring.
+
+    A run extends while its non-diagonal gates touch at most two distinct
+    high qubits (larger fused gates get a run of their own).
+    """
+    runs, high, cur = [], set(), []
+    for op in ops:
+        tag = op[0].upper()
+        if tag == 'PERMUTE':
+            expanded = permutation_swaps(op[1])
+        elif tag == 'SWAP' and op[1] == op[2]:
+            expanded = []
+        else:
+            expanded = [op]
+        for gate in expanded:
+            if not is_diagonal(gate):
+                hq = {q for q in _op_qubits(gate) if q >= block_qubits}
+                if len(high | hq) > max(2, len(hq)):
+                    runs.append((tuple(sorted(high)), cur))
+                    high, cur = set(), []
+                high |= hq
+            cur.append(gate)
+    if cur:
+        runs.append((tuple(sorted(high)), cur))
+    return runs
+
+def _scatter(x: int, bits) -> int:
+    """Place bit j of x at position bits[j]."""
+    out = 0
+    for j, b in enumerate(bits):
+        out |= ((x >> j) & 1) << b
+    return out
+
+def _apply_run(state: MemmapState, high: tuple, ops: list, swap_cost: int, threads: int) -> dict:
+    n, b = state.nqubits, state.block_qubits
+    k = len(high)
+    mapping = {q: q for q in range(b)}
+    mapping.update({h: b + j for j, h in enumerate(high)})
+    outside = ((1 << n) - 1) & ~((1 << b) - 1)
+    for h in high:
+        outside &= ~(1 << h)
+    hbits = [h - b for h in high]
+    free = [i for i in range(n - b) if i not in hbits]
+    buf = np.empty((1 << k, state.block_size), dtype=state.dtype) if k else None
+    nbytes = state.block_size * state.dtype.itemsize
+    rec = {'high': high, 'ops': len(ops), 'gates': statevector.count_gates(ops, swap_cost),
+           'read': 0, 'written': 0, 'blocks_skipped': 0}
+    t0 = time.perf_counter()
+    for g in range(1 << len(free)):
+        base = _scatter(g, free)
+        local_ops = [o for o in (restrict_op(op, mapping, outside, base << b) for op in ops)
+                     if o is not None]
+        blocks = [base | _scatter(c, hbits) for c in range(1 << k)]
+        if not local_ops:
+            rec['blocks_skipped'] += len(blocks)
+            continue
+        if k == 0:
+            # A single block is contiguous in the file: work on the mapped pages directly
+            statevector.apply_ops(state.block(base), b, local_ops, swap_cost,
+                                  cache=state.cache, threads=threads)
+        else:
+            for j, i in enumerate(blocks):
+                buf[j] = state.block(i)
+            statevector.apply_ops(buf.reshape(-1), b + k, local_ops, swap_cost,
+                                  cache=state.cache, threads=threads)
+            for j, i in enumerate(blocks):
+                state.block(i)[...] = buf[j]
+        for i in blocks:
+            state.release(i)
+        rec['read'] += len(blocks) * nbytes
+        rec['written'] += len(blocks) * nbytes
+    rec['seconds'] = time.perf_counter() - t0
+    return rec
+
+def apply_ops(state: MemmapState, nqubits: int, ops: list, swap_cost: int = 3,
+              stats: dict = None, threads: int = 1) -> int:
+    """Apply ops to a MemmapState block by block. Returns gate count.
+
+    stats: optional dict updated with 'io' (one record per run: high qubits,
+      gates, bytes read/written, blocks skipped, seconds), the byte totals,
+      'state_bytes' and 'peak_rss_mb'.
+    threads: worker threads for the in-RAM work on each block group.
+    """
+    if nqubits != state.nqubits:
+        raise ValueError(f"state has {state.nqubits} qubits, expected {nqubits}")
+    gates = statevector.count_gates(ops, swap_cost)
+    records = [_apply_run(state, high, run, swap_cost, threads)
+               for high, run in plan_runs(ops, state.block_qubits)]
+    if stats is not None:
+        stats.setdefault('io', []).extend(records)
+        stats['bytes_read'] = stats.get('bytes_read', 0) + sum(r['read'] for r in records)
+        stats['bytes_written'] = stats.get('bytes_written', 0) + sum(r['written'] for r in records)
+        stats['state_bytes'] = state.data.nbytes
+        stats['peak_rss_mb'] = peak_rss_mb()
+    return gates
+
+def io_summary(stats: dict, gates: int) -> str:
+    """One-line I/O report for a stats dict filled by apply_ops."""
+    read, written = stats.get('bytes_read', 0), stats.get('bytes_written', 0)
+    sweeps = read / stats['state_bytes'] if stats.get('state_bytes') else 0.0
+    return (f"read {read / 2**20:.1f} MiB, wrote {written / 2**20:.1f} MiB "
+            f"({read / max(gates, 1) / 2**20:.2f} / {written / max(gates, 1) / 2**20:.2f} MiB per gate, "
+            f"{sweeps:.1f} state sweeps, {len(stats.get('io', []))} runs), "
+            f"peak RSS {stats.get('peak_rss_mb', 0.0):.1f} MiB")
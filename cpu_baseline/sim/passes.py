@@ -0,0 +1,280 @@
+"""Circuit-level rewrites applied to ops lists before execution.
+
+Passes take and return ops lists in the tuple format used by circuits/*.py
+and never touch the state. Besides the circuit ops they may emit:
+  ('PERMUTE', perm)            qubit q moves to position perm[q]
+  ('UNITARY', qubits, matrix)  dense 2^k x 2^k matrix; bit j of its row/column
+                               index is the value of qubits[j]
+  ('DIAG', terms)              product of phases; each (mask, value, theta)
+                               term multiplies basis states with
+                               (index & mask) == value by e^{i theta}
+"""
+import numpy as np
+
+_H = np.array([[1, 1], [1, -1]], dtype=np.complex128) / np.sqrt(2.0)
+_X = np.array([[0, 1], [1, 0]], dtype=np.complex128)
+_Z = np.diag([1, -1]).astype(np.complex128)
+# Two-qubit gates on (q0, q1): local index = bit(q0) + 2*bit(q1)
+_CNOT = np.eye(4, dtype=np.complex128)[[0, 3, 2, 1]]   # (control, target)
+_SWAP = np.eye(4, dtype=np.complex128)[[0, 2, 1, 3]]
+
+def mask_qubits(mask: int) -> list:
+    """Qubit indices of the set bits in mask."""
+    return [q for q in range(mask.bit_length()) if (mask >> q) & 1]
+
+def mask_select(mask: int, value: int):
+    """Split a (mask, value) pattern into (qubits, local) where bit j of local
+    is the required value of qubits[j]."""
+    qubits = mask_qubits(mask)
+    return qubits, sum(((value >> q) & 1) << j for j, q in enumerate(qubits))
+
+def remap_mask(mask: int, mapping) -> int:
+    out = 0
+    for q in mask_qubits(mask):
+        out |= 1 << mapping[q]
+    return out
+
+def remap_op(op: tuple, mapping) -> tuple:
+    """Rewrite the qubit operands of op through mapping[q]."""
+    tag = op[0].upper()
+    if tag in ('H', 'X', 'Z'):
+        return (op[0], mapping[op[1]])
+    if tag in ('CNOT', 'SWAP'):
+        return (op[0], mapping[op[1]], mapping[op[2]])
+    if tag == 'CPHASE':
+        return (op[0], mapping[op[1]], mapping[op[2]], op[3])
+    if tag == 'UNITARY':
+        return (op[0], tuple(mapping[q] for q in op[1]), op[2])
+    if tag == 'MASKPHASE':
+        _, mask, value, theta = op
+        return (op[0], remap_mask(mask, mapping), remap_mask(value, mapping), theta)
+    if tag == 'DIAG':
+        return (op[0], tuple((remap_mask(m, mapping), remap_mask(v, mapping), th)
+                             for m, v, th in op[1]))
+    raise ValueError(f"Cannot remap op {tag}")
+
+def relabel_swaps(ops: list, nqubits: int) -> list:
+    """Drop SWAP/PERMUTE ops by tracking a logical->physical qubit map.
+
+    Gates after a SWAP are rewritten onto the physical qubits that hold their
+    operands, and a single ('PERMUTE', perm) is appended to restore logical
+    order in one pass (perm[p] is the destination of physical qubit p).
+    """
+    phys = list(range(nqubits))
+    out = []
+    for op in ops:
+        tag = op[0].upper()
+        if tag == 'SWAP':
+            _, q1, q2 = op
+            phys[q1], phys[q2] = phys[q2], phys[q1]
+        elif tag == 'PERMUTE':
+            _, perm = op
+            moved = list(phys)
+            for q, p in enumerate(perm):
+                moved[p] = phys[q]
+            phys = moved
+        else:
+            out.append(remap_op(op, phys))
+    perm = [0] * nqubits
+    for q, p in enumerate(phys):
+        perm[p] = q
+    if perm != list(range(nqubits)):
+        out.append(('PERMUTE', tuple(perm)))
+    return out
+
+def gate_matrix(op: tuple):
+    """Return (qubits, matrix) for a gate op, or None if it has no dense form."""
+    tag = op[0].upper()
+    if tag == 'H':
+        return (op[1],), _H
+    if tag == 'X':
+        return (op[1],), _X
+    if tag == 'Z':
+        return (op[1],), _Z
+    if tag == 'CNOT':
+        if op[1] == op[2]:
+            raise ValueError("control and target must differ")
+        return (op[1], op[2]), _CNOT
+    if tag == 'CPHASE':
+        _, c, t, theta = op
+        phase = np.exp(1j * theta)
+        if c == t:
+            return (t,), np.diag([1, phase])
+        return (c, t), np.diag([1, 1, 1, phase])
+    if tag == 'SWAP':
+        if op[1] == op[2]:
+            return (op[1],), np.eye(2, dtype=np.complex128)
+        return (op[1], op[2]), _SWAP
+    if tag == 'MASKPHASE':
+        _, mask, value, theta = op
+        qubits, local = mask_select(mask, value)
+        diag = np.ones(1 << len(qubits), dtype=np.complex128)
+        diag[local] = np.exp(1j * theta)
+        return tuple(qubits), np.diag(diag)
+    if tag == 'UNITARY':
+        return tuple(op[1]), np.asarray(op[2], dtype=np.complex128)
+    return None
+
+def embed(mat: np.ndarray, qubits, block) -> np.ndarray:
+    """Expand a matrix on qubits to the (larger) ordered qubit list block."""
+    qubits, block = list(qubits), list(block)
+    if qubits == block:
+        return mat
+    k = len(block)
+    pos = [block.index(q) for q in qubits]
+    rest = 0
+    for p in pos:
+        rest |= 1 << p
+    out = np.zeros((1 << k, 1 << k), dtype=np.complex128)
+    for col in range(1 << k):
+        sub = 0
+        for j, p in enumerate(pos):
+            sub |= ((col >> p) & 1) << j
+        base = col & ~rest
+        for r in range(1 << len(pos)):
+            row = base
+            for j, p in enumerate(pos):
+                row |= ((r >> j) & 1) << p
+            out[row, col] = mat[r, sub]
+    return out
+
+def fuse_gates(ops: list, max_qubits: int = 2):
+    """Fuse runs of gates into dense blocks on at most max_qubits qubits.
+
+    Open blocks act on disjoint qubit sets, so a gate is folded into every
+    block it overlaps as long as the union stays within max_qubits; otherwise
+    those blocks are emitted first. Blocks holding a single gate are emitted as
+    the original op so they keep their specialised kernel.
+
+    Returns (ops, report) where report counts the full-state sweeps (one per
+    emitted op) before and after fusion.
+    """
+    if max_qubits < 1:
+        raise ValueError("max_qubits must be >= 1")
+    out = []
+    blocks = []  # [qubits (sorted list), matrix, source ops], in creation order
+
+    def take(selected):
+        blocks[:] = [b for b in blocks if not any(b is s for s in selected)]
+
+    def flush(selected):
+        take(selected)
+        for qubits, mat, src in selected:
+            out.append(src[0] if len(src) == 1 else ('UNITARY', tuple(qubits), mat))
+
+    for op in ops:
+        if op[0].upper() == 'MASKPHASE' and len(mask_qubits(op[1])) > max_qubits:
+            dense = None  # too wide to fuse; don't build its 2^k x 2^k matrix
+        else:
+            dense = gate_matrix(op)
+        if dense is None:
+            flush(list(blocks))
+            out.append(op)
+            continue
+        gq, gm = dense
+        hit = [b for b in blocks if set(b[0]) & set(gq)]
+        union = sorted(set(gq).union(*(b[0] for b in hit)))
+        if len(union) > max_qubits:
+            flush(hit)
+            if len(set(gq)) > max_qubits:
+                out.append(op)
+                continue
+            hit, union = [], sorted(set(gq))
+        mat = np.eye(1 << len(union), dtype=np.complex128)
+        src = []
+        for b in hit:
+            mat = embed(b[1], b[0], union) @ mat
+            src += b[2]
+        take(hit)
+        mat = embed(gm, gq, union) @ mat
+        blocks.append([union, mat, src + [op]])
+    flush(list(blocks))
+
+    report = {
+        'sweeps_in': len(ops),
+        'sweeps_out': len(out),
+        'sweeps_eliminated': len(ops) - len(out),
+        'fused_blocks': sum(1 for op in out if op[0] == 'UNITARY'),
+    }
+    return out, report
+
+def diagonal_term(op: tuple):
+    """Return the (mask, value, theta) phase term of a diagonal gate, else None."""
+    tag = op[0].upper()
+    if tag == 'Z':
+        m = 1 << op[1]
+        return (m, m, float(np.pi))
+    if tag == 'CPHASE':
+        _, c, t, theta = op
+        m = (1 << c) | (1 << t)
+        return (m, m, float(theta))
+    if tag == 'MASKPHASE':
+        _, mask, value, theta = op
+        return (mask, value & mask, float(theta))
+    return None
+
+def is_diagonal(op: tuple) -> bool:
+    return op[0].upper() == 'DIAG' or diagonal_term(op) is not None
+
+def restrict_op(op: tuple, mapping, outside: int, fixed: int):
+    """Rewrite op for the slice of the state where the qubits in mask outside
+    hold the bits of fixed, with the remaining qubits renamed through mapping.
+
+    Diagonal ops reduce to a MASKPHASE/DIAG on the remaining qubits (or None
+    if no term applies to the slice); other ops must not touch outside.
+    """
+    if not is_diagonal(op):
+        return remap_op(op, mapping)
+    terms = op[1] if op[0].upper() == 'DIAG' else [diagonal_term(op)]
+    local = []
+    for mask, value, theta in terms:
+        if (value ^ fixed) & mask & outside:
+            continue
+        inner = mask & ~outside
+        local.append((remap_mask(inner, mapping), remap_mask(value & inner, mapping), theta))
+    if not local:
+        return None
+    if len(local) == 1:
+        return ('MASKPHASE',) + local[0]
+    return ('DIAG', tuple(local))
+
+def permutation_swaps(perm) -> list:
+    """SWAP ops realising ('PERMUTE', perm), i.e. qubit q moves to perm[q]."""
+    where = list(range(len(perm)))  # where[p]: qubit currently at position p
+    ops = []
+    for q, p in enumerate(perm):
+        cur = where.index(q)
+        if cur != p:
+            ops.append(('SWAP', cur, p))
+            where[cur], where[p] = where[p], where[cur]
+    return ops
+
+def fold_diagonals(ops: list):
+    """Collapse each run of consecutive diagonal gates into one ('DIAG', terms).
+
+    Z, CPHASE and MASKPHASE all commute, so a run is applied as a single phase
+    multiply just before the next non-diagonal gate (or at the end). Runs of
+    one gate keep their original op.
+
+    Returns (ops, report) with the number of gates folded and DIAG ops emitted.
+    """
+    out, run = [], []
+    report = {'diag_folded': 0, 'diag_sweeps': 0}
+
+    def flush():
+        if len(run) == 1:
+            out.append(run[0])
+        elif run:
+            out.append(('DIAG', tuple(diagonal_term(op) for op in run)))
+            report['diag_folded'] += len(run)
+            report['diag_sweeps'] += 1
+        run.clear()
+
+    for op in ops:
+        if diagonal_term(op) is None:
+            flush()
+            out.append(op)
+        else:
+            run.append(op)
+    flush()
+    return out, report
@@ -0,0 +1,130 @@
+"""Compiled execution plans and the in-process plan cache.
+
+statevector.compile_ops turns an ops list into a Plan: the pass pipeline has
+already run, tags are resolved, and every step carries its precomputed view
+shape, index tuples and dtype-cast phase constants / matrices. Plans are
+immutable, so one compiled plan can be reused by any number of apply_ops calls.
+
+PlanCache keeps plans keyed by plan_key(ops, nqubits, dtype, options) in LRU
+order under a byte budget.
+"""
+import hashlib
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+# Rough per-step bookkeeping cost (tuples, slices) added to the array payload
+_STEP_BYTES = 256
+
+class Plan:
+    """Immutable compiled form of an ops list for one (nqubits, dtype)."""
+    __slots__ = ('nqubits', 'dtype', 'steps', 'gates', 'report', 'nbytes')
+
+    def __init__(self, nqubits, dtype, steps, gates, report):
+        nbytes = 0
+        for step in steps:
+            nbytes += _STEP_BYTES
+            for arg in step[1:]:
+                if isinstance(arg, np.ndarray):
+                    arg.setflags(write=False)
+                    nbytes += arg.nbytes
+        set_ = object.__setattr__
+        set_(self, 'nqubits', nqubits)
+        set_(self, 'dtype', np.dtype(dtype))
+        set_(self, 'steps', tuple(steps))
+        set_(self, 'gates', gates)
+        set_(self, 'report', dict(report))
+        set_(self, 'nbytes', nbytes)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("Plan is immutable")
+
+    def __len__(self):
+        return len(self.steps)
+
+    def __repr__(self):
+        return (f"Plan(nqubits={self.nqubits}, dtype={self.dtype}, steps={len(self.steps)}, "
+                f"gates={self.gates}, nbytes={self.nbytes})")
+
+def _content_digest(ops) -> str:
+    h = hashlib.sha1()
+    for op in ops:
+        for field in op:
+            if isinstance(field, np.ndarray):
+                h.update(f"<{field.dtype.str}{field.shape}>".encode())
+                h.update(np.ascontiguousarray(field).tobytes())
+            else:
+                h.update(repr(field).encode())
+            h.update(b',')
+        h.update(b';')
+    return h.hexdigest()
+
+def plan_key(ops, nqubits, dtype, **options) -> tuple:
+    """Cache key for (ops, nqubits, dtype, options).
+
+    Ops made of hashable tuples key by value, so dict lookup hashes them and
+    compares for equality on a hit; ops carrying arrays (e.g. UNITARY matrices)
+    key by a SHA-1 of their contents instead.
+    """
+    head = (nqubits, np.dtype(dtype).str, tuple(sorted(options.items())))
+    if hasattr(ops, 'digest'):
+        # sim.circuit.Circuit: key by its cached content hash
+        return (head, ('circuit', ops.digest()))
+    key = (head, tuple(ops))
+    try:
+        hash(key)
+    except TypeError:
+        key = (head, _content_digest(ops))
+    return key
+
+class PlanCache:
+    """LRU cache of compiled plans bounded by the sum of Plan.nbytes.
+
+    A plan larger than max_bytes is returned but not stored. max_bytes=0
+    disables caching while still counting misses.
+    """
+
+    def __init__(self, max_bytes: int = 64 << 20):
+        self.max_bytes = max_bytes
+        self._plans = OrderedDict()
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.compile_s = 0.0
+
+    def get(self, key, build):
+        """Return the plan for key, calling build() to compile it on a miss."""
+        plan = self._plans.get(key)
+        if plan is not None:
+            self._plans.move_to_end(key)
+            self.hits += 1
+            return plan
+        self.misses += 1
+        t0 = time.perf_counter()
+        plan = build()
+        self.compile_s += time.perf_counter() - t0
+        if plan.nbytes <= self.max_bytes:
+            self._plans[key] = plan
+            self.nbytes += plan.nbytes
+            while self.nbytes > self.max_bytes:
+                _, old = self._plans.popitem(last=False)
+                self.nbytes -= old.nbytes
+                self.evictions += 1
+        return plan
+
+    def clear(self):
+        self._plans.clear()
+        self.nbytes = 0
+
+    def info(self) -> dict:
+        return {'plans': len(self._plans), 'nbytes': self.nbytes, 'max_bytes': self.max_bytes,
+                'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions,
+                'compile_ms': self.compile_s * 1000.0}
+
+    def __len__(self):
+        return len(self._plans)
+
+# Default cache used by statevector.apply_ops
+PLAN_CACHE = PlanCache()
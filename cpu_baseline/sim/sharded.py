@@ -0,0 +1,266 @@
+"""Statevector sharded across worker processes over multiprocessing.shared_memory.
+
+With P = 2^g shards the top g qubits are "global": they select the shard,
+and each worker owns one contiguous shard of 2^(n-g) amplitudes in a single
+shared segment. apply_ops keeps a logical->physical qubit map and sends
+every worker its slice of each run of ops:
+  - gates on local qubits run in every worker without communication;
+  - diagonal gates and CNOT controls on global qubits never communicate:
+    the shard index fixes those bits, so each worker gets a local
+    MASKPHASE / X or nothing;
+  - SWAP and PERMUTE only update the qubit map;
+  - a gate whose target is global first remaps that qubit with a local one
+    (chosen as the one needed furthest in the future) by a pairwise exchange
+    of half-shards between partner workers.
+The map is restored at the end, so the shared state is in logical order
+after every call and equals statevector.apply_ops on the same ops.
+
+Communication is counted as the bytes of amplitudes that change shard.
+"""
+import multiprocessing as mp
+import weakref
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from . import statevector
+from .passes import is_diagonal, permutation_swaps, remap_op, restrict_op
+from .plan import PlanCache
+
+# How many upcoming ops the remap heuristic looks at
+_LOOKAHEAD = 64
+
+class ShardedState:
+    """A 2**n state in one shared-memory segment, one worker process per shard."""
+
+    def __init__(self, nqubits: int, shards: int = 4, dtype=np.complex64, threads: int = 1):
+        if shards < 1 or shards & (shards - 1):
+            raise ValueError(f"shards must be a power of two, got {shards}")
+        if shards > 1 << max(nqubits - 1, 0):
+            raise ValueError(f"{shards} shards leave no local qubit on {nqubits} qubits")
+        self.nqubits = nqubits
+        self.shards = shards
+        self.local_qubits = nqubits - (shards.bit_length() - 1)
+        self.dtype = np.dtype(dtype)
+        self.shm = shared_memory.SharedMemory(create=True, size=(1 << nqubits) * self.dtype.itemsize)
+        self.data = np.ndarray((1 << nqubits,), dtype=self.dtype, buffer=self.shm.buf)
+        self.data[:] = 0
+        methods = mp.get_all_start_methods()
+        ctx = mp.get_context('fork' if 'fork' in methods else None)
+        self._conns, self._procs = [], []
+        for i in range(shards):
+            conn, child = ctx.Pipe()
+            proc = ctx.Process(target=_worker, daemon=True,
+                               args=(self.shm, nqubits, self.local_qubits, i, self.dtype.str, child, threads))
+            proc.start()
+            child.close()
+            self._conns.append(conn)
+            self._procs.append(proc)
+        self._finalizer = weakref.finalize(self, _shutdown, self._conns, self._procs, self.shm)
+
+    @property
+    def shape(self):
+        return self.data.shape
+
+    @property
+    def shard_bytes(self) -> int:
+        return (1 << self.local_qubits) * self.dtype.itemsize
+
+    def to_array(self) -> np.ndarray:
+        return self.data.copy()
+
+    def command(self, cmds) -> None:
+        """Send cmds[i] to worker i (skipping None) and wait for all of them."""
+        sent = []
+        for conn, cmd in zip(self._conns, cmds):
+            if cmd is not None:
+                conn.send(cmd)
+                sent.append(conn)
+        errors = [reply[1] for reply in (conn.recv() for conn in sent) if reply[0] == 'error']
+        if errors:
+            raise RuntimeError(f"shard worker failed: {errors[0]}")
+
+    def close(self) -> None:
+        """Stop the workers and free the shared segment."""
+        self.data = None
+        self._finalizer()
+
+def _shutdown(conns, procs, shm):
+    for conn in conns:
+        try:
+            conn.send(None)
+        except (BrokenPipeError, OSError):
+            pass
+    for proc in procs:
+        proc.join(timeout=5)
+        if proc.is_alive():
+            proc.terminate()
+    shm.close()
+    shm.unlink()
+
+def _worker(shm, nqubits, local_qubits, index, dtype, conn, threads):
+    full = np.ndarray((1 << (nqubits - local_qubits), 1 << local_qubits), dtype=dtype, buffer=shm.buf)
+    mine = full[index]
+    cache = PlanCache(16 << 20)
+    while True:
+        cmd = conn.recv()
+        if cmd is None:
+            break
+        try:
+            if cmd[0] == 'ops':
+                statevector.apply_ops(mine, local_qubits, cmd[1], cache=cache, threads=threads)
+            elif cmd[0] == 'exchange':
+                # Swap (local bit l = 1) here with (local bit l = 0) in the partner shard
+                _, partner, l = cmd
+                statevector._swap(mine.reshape(-1, 2, 1 << l)[:, 1],
+                                  full[partner].reshape(-1, 2, 1 << l)[:, 0])
+            elif cmd[0] == 'swap_shard':
+                statevector._swap(mine, full[cmd[1]])
+            conn.send(('ok',))
+        except Exception as exc:
+            conn.send(('error', f"{type(exc).__name__}: {exc}"))
+    del mine, full
+
+def init_state(nqubits: int, basis: int = 0, dtype=np.complex64, shards: int = 4,
+               threads: int = 1) -> ShardedState:
+    if np.ndim(basis) != 0:
+        raise ValueError("the sharded backend holds a single state; batches are not supported")
+    state = ShardedState(nqubits, shards, dtype, threads)
+    state.data[basis] = 1.0 + 0.0j
+    return state
+
+def _needs_local(op: tuple, local_qubits: int) -> list:
+    """Physical qubits of op that must be local before it can run in a shard."""
+    if is_diagonal(op):
+        return []
+    tag = op[0].upper()
+    if tag in ('H', 'X'):
+        qubits = [op[1]]
+    elif tag == 'CNOT':
+        qubits = [op[2]]  # a global control is resolved per shard
+    elif tag == 'UNITARY':
+        qubits = list(op[1])
+    else:
+        raise ValueError(f"Unknown op {tag}")
+    return [q for q in qubits if q >= local_qubits]
+
+def _op_logical_qubits(op: tuple) -> set:
+    tag = op[0].upper()
+    if tag in ('H', 'X'):
+        return {op[1]}
+    if tag == 'CNOT':
+        return {op[2]}
+    if tag == 'UNITARY':
+        return set(op[1])
+    return set()
+
+def _shard_op(op: tuple, nqubits: int, local_qubits: int, fixed: int):
+    """The part of a physical op that runs in the shard whose global bits are fixed."""
+    if op[0].upper() == 'CNOT' and op[1] >= local_qubits:
+        return ('X', op[2]) if (fixed >> op[1]) & 1 else None
+    outside = ((1 << nqubits) - 1) & ~((1 << local_qubits) - 1)
+    return restrict_op(op, list(range(local_qubits)), outside, fixed)
+
+def apply_ops(state: ShardedState, nqubits: int, ops: list, swap_cost: int = 3,
+              stats: dict = None) -> int:
+    """Apply ops across the shards. Returns gate count.
+
+    stats: optional dict updated with 'comm_per_op' (bytes moved between shards
+      before each op, aligned with ops), 'comm_restore_bytes', 'comm_bytes',
+      'exchanges', 'shards' and 'local_qubits'.
+    """
+    if nqubits != state.nqubits:
+        raise ValueError(f"state has {state.nqubits} qubits, expected {nqubits}")
+    gates = statevector.count_gates(ops, swap_cost)
+    L, P = state.local_qubits, state.shards
+    half_state = (1 << nqubits) * state.dtype.itemsize // 2
+    pos = list(range(nqubits))   # pos[q]: physical position of logical qubit q
+    at = list(range(nqubits))    # at[p]: logical qubit at physical position p
+    pending = []
+    counters = {'exchanges': 0}
+
+    def flush():
+        if pending:
+            cmds = []
+            for s in range(P):
+                local = [o for o in (_shard_op(op, nqubits, L, s << L) for op in pending) if o is not None]
+                cmds.append(('ops', local) if local else None)
+            state.command(cmds)
+            pending.clear()
+
+    def relabel(p1, p2):
+        q1, q2 = at[p1], at[p2]
+        at[p1], at[p2] = q2, q1
+        pos[q1], pos[q2] = p2, p1
+
+    def exchange(p1, p2):
+        """Physically swap positions p1 and p2 (at least one global)."""
+        flush()
+        g1, g2 = max(p1, p2), min(p1, p2)
+        bit = 1 << (g1 - L)
+        if g2 < L:
+            state.command([('exchange', s | bit, g2) if not s & bit else None for s in range(P)])
+        else:
+            other = 1 << (g2 - L)
+            state.command([('swap_shard', (s | bit) & ~other) if (s & other) and not s & bit else None
+                           for s in range(P)])
+        relabel(p1, p2)
+        counters['exchanges'] += 1
+        return half_state
+
+    def pick_local(busy, upcoming):
+        # Evict the local position whose logical qubit is needed furthest ahead
+        best, best_next = None, -1
+        for p in range(L - 1, -1, -1):
+            if p in busy:
+                continue
+            q = at[p]
+            nxt = next((i for i, op in enumerate(upcoming) if q in _op_logical_qubits(op)), len(upcoming))
+            if nxt > best_next:
+                best, best_next = p, nxt
+        if best is None:
+            raise ValueError(f"op needs more than the {L} local qubits")
+        return best
+
+    per_op = []
+    for i, op in enumerate(ops):
+        tag = op[0].upper()
+        moved = 0
+        if tag == 'SWAP':
+            relabel(pos[op[1]], pos[op[2]])
+        elif tag == 'PERMUTE':
+            for _, a, b in permutation_swaps(op[1]):
+                relabel(pos[a], pos[b])
+        else:
+            phys = remap_op(op, pos)
+            for p in _needs_local(phys, L):
+                busy = {pos[q] for q in _op_logical_qubits(op)}
+                moved += exchange(p, pick_local(busy, ops[i + 1:i + 1 + _LOOKAHEAD]))
+            pending.append(remap_op(op, pos))
+        per_op.append(moved)
+
+    # Put every logical qubit back at its own position
+    restore = 0
+    for _, a, b in permutation_swaps([at[p] for p in range(nqubits)]):
+        if a < L and b < L:
+            pending.append(('SWAP', a, b))
+            relabel(a, b)
+        else:
+            restore += exchange(a, b)
+    flush()
+
+    if stats is not None:
+        stats['comm_per_op'] = per_op
+        stats['comm_restore_bytes'] = restore
+        stats['comm_bytes'] = stats.get('comm_bytes', 0) + sum(per_op) + restore
+        stats['exchanges'] = stats.get('exchanges', 0) + counters['exchanges']
+        stats['shards'] = P
+        stats['local_qubits'] = L
+    return gates
+
+def comm_summary(stats: dict, gates: int) -> str:
+    """One-line communication report for a stats dict filled by apply_ops."""
+    moved = stats.get('comm_bytes', 0)
+    return (f"shards={stats.get('shards')} local_qubits={stats.get('local_qubits')}: "
+            f"{stats.get('exchanges', 0)} exchanges, {moved / 2**20:.1f} MiB moved "
+            f"({moved / max(gates, 1) / 2**20:.3f} MiB per gate)")
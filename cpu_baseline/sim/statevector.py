@@ -1,100 +1,437 @@
+"""Vectorized statevector kernels.
+
+The state is viewed through strided reshapes so that each gate becomes a few
+whole-array slice operations instead of a Python loop over amplitudes:
+  - single-qubit gates use (blocks, 2, 2**t), where [:, 0] / [:, 1] are the
+    halves with the target bit clear / set;
+  - two-qubit gates use (blocks, 2, mid, 2, low), axis 1 being the higher and
+    axis 3 the lower of the two qubits.
+Qubit 0 is the LSB of the basis index. All kernels work in place, on a single
+state of shape (2**n,) or a batch of shape (batch, 2**n) alike.
+"""
+from concurrent.futures import ThreadPoolExecutor
 
 import numpy as np
 
+from .circuit import (Circuit, OPCODES, op_fields, OP_H, OP_X, OP_Z,
+                      OP_CNOT, OP_CPHASE, OP_SWAP)
+from .passes import (relabel_swaps, fuse_gates, fold_diagonals,
+                     mask_qubits, mask_select, remap_mask)
+from .plan import Plan, PLAN_CACHE, plan_key
+
 SQRT2_INV = 1.0 / np.sqrt(2.0)
 
-def init_state(nqubits: int, basis: int = 0, dtype=np.complex64) -> np.ndarray:
+# Upper bound (in amplitudes) on scratch buffers used by kernels that need one
+_CHUNK = 1 << 14
+
+# Steps on fewer amplitudes than this run on the calling thread even when
+# threads > 1 (pool dispatch costs more than the work)
+_PARALLEL_MIN = 1 << 16
+_EXECUTORS = {}
+
+def init_state(nqubits: int, basis=0, dtype=np.complex64) -> np.ndarray:
+    """|basis>, or a (batch, 2**n) array with one row per entry if basis is a sequence."""
     dim = 1 << nqubits
-    state = np.zeros(dim, dtype=dtype)
-    state[basis] = 1.0 + 0.0j
+    if np.ndim(basis) == 0:
+        state = np.zeros(dim, dtype=dtype)
+        state[basis] = 1.0 + 0.0j
+        return state
+    basis = np.asarray(basis, dtype=np.int64)
+    state = np.zeros((basis.shape[0], dim), dtype=dtype)
+    state[np.arange(basis.shape[0]), basis] = 1.0 + 0.0j
     return state
 
 def _bit(x: int, k: int) -> int:
     return (x >> k) & 1
 
+def _pair_view(state: np.ndarray, target: int) -> np.ndarray:
+    if not state.flags.c_contiguous:
+        raise ValueError("state must be C-contiguous for in-place kernels")
+    return state.reshape(-1, 2, 1 << target)
+
+def _quad_view(state: np.ndarray, q1: int, q2: int) -> np.ndarray:
+    if not state.flags.c_contiguous:
+        raise ValueError("state must be C-contiguous for in-place kernels")
+    hi, lo = max(q1, q2), min(q1, q2)
+    return state.reshape(-1, 2, 1 << (hi - lo - 1), 2, 1 << lo)
+
+def _chunked(fn, *views) -> None:
+    """Call fn on matching pieces of equally shaped views, each at most _CHUNK amplitudes."""
+    while views[0].ndim > 1 and views[0].shape[0] == 1:
+        views = tuple(v[0] for v in views)
+    a = views[0]
+    if a.size <= _CHUNK:
+        fn(*views)
+        return
+    step = max(1, _CHUNK * a.shape[0] // a.size)
+    for i in range(0, a.shape[0], step):
+        _chunked(fn, *(v[i:i + step] for v in views))
+
+def _swap_block(a: np.ndarray, b: np.ndarray) -> None:
+    tmp = a.copy()
+    a[...] = b
+    b[...] = tmp
+
+def _swap(a: np.ndarray, b: np.ndarray) -> None:
+    """Exchange two equally shaped views with bounded scratch space."""
+    _chunked(_swap_block, a, b)
+
+def _hadamard(a: np.ndarray, b: np.ndarray) -> None:
+    # a' = (a+b)/sqrt2, then b' = a' - sqrt2*b == (a-b)/sqrt2 without a temporary
+    a += b
+    a *= SQRT2_INV
+    b *= -2.0 * SQRT2_INV
+    b += a
+
 def apply_h(state: np.ndarray, nqubits: int, target: int) -> None:
-    dim = state.shape[0]
-    step = 1 << target
-    for base in range(0, dim, step << 1):
-        for j in range(step):
-            a = state[base + j]
-            b = state[base + j + step]
-            state[base + j]         = (a + b) * SQRT2_INV
-            state[base + j + step]  = (a - b) * SQRT2_INV
+    v = _pair_view(state, target)
+    _hadamard(v[:, 0], v[:, 1])
 
 def apply_x(state: np.ndarray, nqubits: int, target: int) -> None:
-    dim = state.shape[0]
-    step = 1 << target
-    for base in range(0, dim, step << 1):
-        for j in range(step):
-            i0 = base + j
-            i1 = base + j + step
-            tmp = state[i0]
-            state[i0] = state[i1]
-            state[i1] = tmp
+    v = _pair_view(state, target)
+    _swap(v[:, 0], v[:, 1])
 
 def apply_z(state: np.ndarray, nqubits: int, target: int) -> None:
-    dim = state.shape[0]
-    step = 1 << target
-    for base in range(0, dim, step << 1):
-        for j in range(step):
-            i1 = base + j + step
-            state[i1] = -state[i1]
+    v = _pair_view(state, target)
+    v[:, 1] *= -1
 
 def apply_cnot(state: np.ndarray, nqubits: int, control: int, target: int) -> None:
     if control == target:
         raise ValueError("control and target must differ")
-    dim = state.shape[0]
-    for idx in range(dim):
-        if ((idx >> control) & 1) == 1:
-            tbit = (idx >> target) & 1
-            if tbit == 0:
-                j = idx | (1 << target)
-            else:
-                j = idx & ~(1 << target)
-            if j > idx:
-                tmp = state[idx]
-                state[idx] = state[j]
-                state[j] = tmp
+    v = _quad_view(state, control, target)
+    if control > target:
+        _swap(v[:, 1, :, 0], v[:, 1, :, 1])
+    else:
+        _swap(v[:, 0, :, 1], v[:, 1, :, 1])
 
 def apply_cphase(state: np.ndarray, nqubits: int, control: int, target: int, theta: float) -> None:
-    dim = state.shape[0]
     phase = np.exp(1j * theta).astype(state.dtype)
-    for idx in range(dim):
-        if (((idx >> control) & 1) == 1) and (((idx >> target) & 1) == 1):
-            state[idx] *= phase
+    if control == target:
+        _pair_view(state, target)[:, 1] *= phase
+        return
+    v = _quad_view(state, control, target)
+    v[:, 1, :, 1] *= phase
+
+def apply_maskphase(state: np.ndarray, nqubits: int, mask: int, value: int, theta: float) -> None:
+    """Multiply basis states with (index & mask) == value by e^{i theta}."""
+    phase = np.exp(1j * theta).astype(state.dtype)
+    qubits, local = mask_select(mask, value)
+    if not qubits:
+        state *= phase
+        return
+    _multi_view(state, qubits)[local] *= phase
+
+def diagonal_phases(terms, dtype=np.complex64):
+    """Phase table for a ('DIAG', terms) op over only the qubits it touches.
+
+    Returns (qubits, table) where table[local] is the phase of every basis
+    state whose qubits[j] bit equals bit j of local. Each term adds its angle
+    on the strided sub-array of the table selected by its mask bits.
+    """
+    touched = 0
+    for mask, _, _ in terms:
+        touched |= mask
+    qubits = mask_qubits(touched)
+    local = {q: j for j, q in enumerate(qubits)}
+    angle = np.zeros(1 << len(qubits), dtype=np.float64)
+    for mask, value, theta in terms:
+        sel, pick = mask_select(remap_mask(mask, local), remap_mask(value, local))
+        if sel:
+            _multi_view(angle, sel)[pick] += theta
+        else:
+            angle += theta
+    table = np.empty(angle.shape, dtype=dtype)
+    np.cos(angle, out=table.real)
+    np.sin(angle, out=table.imag)
+    return qubits, table
+
+def apply_diagonal(state: np.ndarray, nqubits: int, terms) -> None:
+    """Apply a folded run of diagonal gates as a single broadcast multiply."""
+    qubits, table = diagonal_phases(terms, state.dtype)
+    # Table axes follow descending qubit order, like the state tensor's axes
+    shape = [1] + [2 if q in qubits else 1 for q in range(nqubits - 1, -1, -1)]
+    psi = state.reshape((-1,) + (2,) * nqubits)
+    psi *= table.reshape(shape)
 
 def apply_swap(state: np.ndarray, nqubits: int, q1: int, q2: int) -> None:
-    # Implement via 3 CNOTs (q1,q2) sequence to avoid complex index mapping
-    if q1 == q2: 
+    if q1 == q2:
+        return
+    v = _quad_view(state, q1, q2)
+    _swap(v[:, 0, :, 1], v[:, 1, :, 0])
+
+def apply_permutation(state: np.ndarray, nqubits: int, perm) -> None:
+    """Move qubit q to position perm[q] for all qubits in one transpose pass."""
+    axes = _permutation_axes(nqubits, perm)
+    if axes == list(range(nqubits + 1)):
         return
-    apply_cnot(state, nqubits, q1, q2)
-    apply_cnot(state, nqubits, q2, q1)
-    apply_cnot(state, nqubits, q1, q2)
+    psi = state.reshape((-1,) + (2,) * nqubits)
+    state[...] = np.transpose(psi, axes).reshape(state.shape)
+
+def _multi_layout(qubits) -> tuple:
+    """(shape, indices) such that state.reshape(shape)[indices[c]] is view c of _multi_view."""
+    desc = sorted(qubits, reverse=True)
+    shape, axis, prev = [-1], {}, None
+    for q in desc:
+        if prev is not None:
+            shape.append(1 << (prev - q - 1))
+        axis[q] = len(shape)
+        shape.append(2)
+        prev = q
+    shape.append(1 << desc[-1])
+    indices = []
+    for c in range(1 << len(qubits)):
+        idx = [slice(None)] * len(shape)
+        for j, q in enumerate(qubits):
+            idx[axis[q]] = (c >> j) & 1
+        indices.append(tuple(idx))
+    return tuple(shape), tuple(indices)
+
+def _multi_view(state: np.ndarray, qubits) -> list:
+    """Equally shaped views of the 2^k sub-arrays selected by the values of qubits.
 
-def apply_ops(state: np.ndarray, nqubits: int, ops: list) -> int:
-    """Apply a list of ops. Returns gate count."""
+    View c holds the amplitudes whose qubits[j] bit equals bit j of c.
+    """
+    if not state.flags.c_contiguous:
+        raise ValueError("state must be C-contiguous for in-place kernels")
+    shape, indices = _multi_layout(qubits)
+    v = state.reshape(shape)
+    return [v[idx] for idx in indices]
+
+def _matmul_block(mat: np.ndarray, *views) -> None:
+    res = np.tensordot(mat, np.stack(views), axes=(1, 0))
+    for v, r in zip(views, res):
+        v[...] = r
+
+def apply_unitary(state: np.ndarray, nqubits: int, qubits, mat) -> None:
+    """Apply a dense 2^k x 2^k matrix; bit j of its index is qubit qubits[j]."""
+    qubits = tuple(qubits)
+    if len(set(qubits)) != len(qubits):
+        raise ValueError(f"repeated qubit in {qubits}")
+    mat = np.asarray(mat).astype(state.dtype)
+    _chunked(lambda *views: _matmul_block(mat, *views), *_multi_view(state, qubits))
+
+def bit_reversal(nqubits: int) -> tuple:
+    """Permutation that reverses qubit order (the QFT output reordering)."""
+    return tuple(nqubits - 1 - q for q in range(nqubits))
+
+def count_gates(ops: list, swap_cost: int = 3) -> int:
+    """Gate count of an ops list; SWAP counts as swap_cost (3 CNOTs by default)."""
+    if isinstance(ops, Circuit):
+        return ops.count_gates(swap_cost)
     gates = 0
     for op in ops:
         tag = op[0].upper()
-        if tag == 'H':
-            _, t = op
-            apply_h(state, nqubits, t); gates += 1
-        elif tag == 'X':
-            _, t = op
-            apply_x(state, nqubits, t); gates += 1
-        elif tag == 'Z':
-            _, t = op
-            apply_z(state, nqubits, t); gates += 1
-        elif tag == 'CNOT':
-            _, c, t = op
-            apply_cnot(state, nqubits, c, t); gates += 1
-        elif tag == 'CPHASE':
-            _, c, t, theta = op
-            apply_cphase(state, nqubits, c, t, theta); gates += 1
+        if tag in ('H', 'X', 'Z', 'CNOT', 'CPHASE', 'MASKPHASE', 'UNITARY'):
+            gates += 1
+        elif tag == 'DIAG':
+            gates += len(op[1])
         elif tag == 'SWAP':
-            _, q1, q2 = op
-            apply_swap(state, nqubits, q1, q2); gates += 3  # modeled as 3 CNOTs
-        else:
+            gates += swap_cost
+        elif tag != 'PERMUTE':
             raise ValueError(f"Unknown op {tag}")
     return gates
+
+def _permutation_axes(nqubits: int, perm) -> list:
+    perm = [int(p) for p in perm]
+    if sorted(perm) != list(range(nqubits)):
+        raise ValueError(f"not a permutation of {nqubits} qubits: {perm}")
+    # Tensor axis of qubit q is nqubits-1-q (axis 0 is a batch/leading axis)
+    axes = [0] * (nqubits + 1)
+    for q, p in enumerate(perm):
+        axes[nqubits - p] = nqubits - q
+    return axes
+
+def _compile_code(code: int, q0: int, q1: int, mask: int, value: int, theta: float, dtype):
+    """Plan step for one gate given as circuit.OP_DTYPE fields (integer opcode)."""
+    if code == OP_H:
+        return ('h',) + _multi_layout([q0])
+    if code == OP_X:
+        shape, idx = _multi_layout([q0])
+        return ('swap', shape, idx[0], idx[1])
+    if code == OP_Z:
+        shape, idx = _multi_layout([q0])
+        return ('scale', shape, idx[1], dtype.type(-1))
+    if code == OP_CNOT:
+        if q0 == q1:
+            raise ValueError("control and target must differ")
+        shape, idx = _multi_layout([q0, q1])
+        return ('swap', shape, idx[1], idx[3])
+    if code == OP_SWAP:
+        if q0 == q1:
+            return None
+        shape, idx = _multi_layout([q0, q1])
+        return ('swap', shape, idx[1], idx[2])
+    if code == OP_CPHASE:
+        qubits, local = sorted({q0, q1}), (1 << len({q0, q1})) - 1
+    else:
+        qubits, local = mask_select(mask, value)
+    phase = dtype.type(np.exp(1j * theta))
+    if not qubits:
+        return ('scale', (-1,), (Ellipsis,), phase)
+    shape, idx = _multi_layout(qubits)
+    return ('scale', shape, idx[local], phase)
+
+def _compile_step(op: tuple, nqubits: int, dtype):
+    """Lower one (post-pass) op to a plan step, or None if it is a no-op.
+
+    Steps are ('h', shape), ('swap', shape, ia, ib), ('scale', shape, idx, phase),
+    ('diag', shape, table), ('unitary', shape, indices, matrix) and
+    ('permute', axes); shape is applied to the state with reshape and the index
+    tuples select views of the result, exactly as the apply_* kernels do.
+    """
+    tag = op[0].upper()
+    if tag in OPCODES:
+        return _compile_code(*op_fields(op), dtype)
+    if tag == 'DIAG':
+        qubits, table = diagonal_phases(op[1], dtype)
+        if not qubits:
+            return ('scale', (-1,), (Ellipsis,), table[0])
+        # Table axes line up with the touched axes of the _multi_layout view
+        # (highest qubit first); the other axes broadcast and can be split freely
+        shape, _ = _multi_layout(qubits)
+        bshape = [1] + [1 if i % 2 == 0 else 2 for i in range(1, len(shape) - 1)] + [1]
+        return ('diag', shape, table.reshape(bshape))
+    if tag == 'PERMUTE':
+        axes = _permutation_axes(nqubits, op[1])
+        return None if axes == list(range(nqubits + 1)) else ('permute', tuple(axes))
+    if tag == 'UNITARY':
+        _, qubits, mat = op
+        if len(set(qubits)) != len(qubits):
+            raise ValueError(f"repeated qubit in {tuple(qubits)}")
+        return ('unitary',) + _multi_layout(qubits) + (np.asarray(mat).astype(dtype),)
+    raise ValueError(f"Unknown op {tag}")
+
+def compile_ops(ops: list, nqubits: int, dtype=np.complex64,
+                swap_cost: int = 3, lazy_swaps: bool = False,
+                fuse: int = None, fold_diagonal: bool = False,
+                cache=PLAN_CACHE) -> Plan:
+    """Run the pass pipeline and lower ops to an immutable Plan.
+
+    With a cache (default: plan.PLAN_CACHE) the plan is looked up by
+    plan_key(ops, nqubits, dtype, options) and compiled only on a miss;
+    cache=None always compiles.
+    """
+    dtype = np.dtype(dtype)
+
+    def build():
+        gates = count_gates(ops, swap_cost)
+        if isinstance(ops, Circuit):
+            if not (lazy_swaps or fold_diagonal or fuse):
+                # Fast path: dispatch on the integer opcode columns
+                steps = [_compile_code(*row, dtype) for row in zip(*ops.columns())]
+                return Plan(nqubits, dtype, [s for s in steps if s is not None], gates, {})
+            body = ops.to_ops()
+        else:
+            body = ops
+        report = {}
+        if lazy_swaps:
+            body = relabel_swaps(body, nqubits)
+        if fold_diagonal:
+            body, rep = fold_diagonals(body)
+            report.update(rep)
+        if fuse:
+            body, rep = fuse_gates(body, fuse)
+            report.update(rep)
+        steps = [_compile_step(op, nqubits, dtype) for op in body]
+        return Plan(nqubits, dtype, [s for s in steps if s is not None], gates, report)
+
+    if cache is None:
+        return build()
+    key = plan_key(ops, nqubits, dtype, swap_cost=swap_cost, lazy_swaps=bool(lazy_swaps),
+                   fuse=fuse or 0, fold_diagonal=bool(fold_diagonal))
+    return cache.get(key, build)
+
+def _executor(threads: int) -> ThreadPoolExecutor:
+    if threads not in _EXECUTORS:
+        _EXECUTORS[threads] = ThreadPoolExecutor(threads, thread_name_prefix='statevector')
+    return _EXECUTORS[threads]
+
+def _scale(v: np.ndarray, phase) -> None:
+    v *= phase
+
+def _parallel(fn, views, threads: int, axes=None) -> None:
+    """Call fn on matching pieces of equally shaped views from a thread pool.
+
+    The views are cut along their longest axis (restricted to axes if given);
+    every axis of a kernel view other than the gate's own qubit axes indexes
+    independent amplitudes, so the pieces never share a pair. NumPy releases
+    the GIL inside the ufunc/BLAS calls, so the pieces run concurrently.
+    """
+    shape = views[0].shape
+    axes = range(len(shape)) if axes is None else axes
+    ax = max(axes, key=lambda a: shape[a])
+    parts = min(threads, shape[ax])
+    if parts <= 1 or views[0].size < _PARALLEL_MIN:
+        fn(*views)
+        return
+    bounds = [shape[ax] * i // parts for i in range(parts + 1)]
+    pieces = []
+    for lo, hi in zip(bounds[:-1], bounds[1:]):
+        idx = (slice(None),) * ax + (slice(lo, hi),)
+        pieces.append([v[idx] for v in views])
+    for f in [_executor(threads).submit(fn, *p) for p in pieces]:
+        f.result()
+
+def execute_plan(state: np.ndarray, plan: Plan, threads: int = 1) -> int:
+    """Run a compiled plan in place on a (2**n,) or (batch, 2**n) state. Returns gate count.
+
+    threads > 1 splits each step's index space into that many chunks run on a
+    shared thread pool (the PERMUTE transpose stays single-threaded).
+    """
+    if state.shape[-1] != 1 << plan.nqubits:
+        raise ValueError(f"state has {state.shape[-1]} amplitudes, expected {1 << plan.nqubits}")
+    if state.dtype != plan.dtype:
+        raise ValueError(f"plan compiled for {plan.dtype}, state is {state.dtype}")
+    if not state.flags.c_contiguous:
+        raise ValueError("state must be C-contiguous for in-place kernels")
+    for step in plan.steps:
+        kind = step[0]
+        if kind == 'h':
+            v = state.reshape(step[1])
+            _parallel(_hadamard, [v[step[2][0]], v[step[2][1]]], threads)
+        elif kind == 'swap':
+            v = state.reshape(step[1])
+            _parallel(_swap, [v[step[2]], v[step[3]]], threads)
+        elif kind == 'scale':
+            phase = step[3]
+            _parallel(lambda v: _scale(v, phase), [state.reshape(step[1])[step[2]]], threads)
+        elif kind == 'diag':
+            table = step[2]
+            free = [a for a in range(table.ndim) if table.shape[a] == 1]
+            _parallel(lambda v: _scale(v, table), [state.reshape(step[1])], threads, free)
+        elif kind == 'permute':
+            psi = state.reshape((-1,) + (2,) * plan.nqubits)
+            state[...] = np.transpose(psi, step[1]).reshape(state.shape)
+        elif kind == 'unitary':
+            v = state.reshape(step[1])
+            mat = step[3]
+            _parallel(lambda *views: _chunked(lambda *b: _matmul_block(mat, *b), *views),
+                      [v[idx] for idx in step[2]], threads)
+    return plan.gates
+
+def apply_ops(state: np.ndarray, nqubits: int, ops: list,
+              swap_cost: int = 3, lazy_swaps: bool = False,
+              fuse: int = None, fold_diagonal: bool = False,
+              stats: dict = None, cache=PLAN_CACHE, threads: int = 1) -> int:
+    """Apply a list of ops to a (2**n,) state or a (batch, 2**n) batch.
+    Returns gate count (per state).
+
+    swap_cost: gates charged per SWAP (3 models the FPGA's CNOT decomposition).
+    lazy_swaps: relabel qubits instead of moving amplitudes on SWAP and apply
+      the accumulated permutation once at the end (see passes.relabel_swaps).
+    fuse: if set, fuse gates into dense blocks on at most this many qubits
+      (see passes.fuse_gates). Off by default so benchmark numbers are stable.
+    fold_diagonal: apply each run of Z/CPHASE/MASKPHASE gates as one phase
+      vector multiply (see passes.fold_diagonals).
+    stats: optional dict updated with the pass reports (e.g. sweeps_eliminated,
+      diag_folded).
+    cache: PlanCache holding compiled plans (see compile_ops); None recompiles
+      on every call.
+    threads: worker threads per step (see execute_plan); 1 runs inline.
+    """
+    if state.shape[-1] != 1 << nqubits:
+        raise ValueError(f"state has {state.shape[-1]} amplitudes, expected {1 << nqubits}")
+    plan = compile_ops(ops, nqubits, state.dtype, swap_cost, lazy_swaps, fuse, fold_diagonal, cache)
+    if stats is not None:
+        stats.update(plan.report)
+    return execute_plan(state, plan, threads)
@@ -1,20 +1,30 @@
 #!/usr/bin/env python3
-"""Minimal CPU reference kernels for quantum circuits."""
+"""Minimal CPU reference kernels for quantum circuits.
+
+time_prog(prog, engine, runs, warmup) is the in-process timing API: one
+cold run, warmups, then `runs` timed repetitions in the same interpreter,
+summarised as min/median/p95/p99/stddev plus the cold-start latency.
+"""
 from __future__ import annotations
 
 import argparse
 import math
+import statistics
 import sys
 import time
-from typing import Tuple
+from typing import Dict, List, Tuple
 
+_IMPORT_T0 = time.perf_counter()
 try:
     import numpy as np
 except ImportError:  # pragma: no cover - numpy should be available, but fail gracefully
     np = None
+# NumPy import cost; only meaningful when this module is imported in a fresh process
+IMPORT_MS = (time.perf_counter() - _IMPORT_T0) * 1000.0
 
 
-def result_line(prog: str, ms: float | None, ok: bool, reason: str | None = None) -> str:
+def result_line(prog: str, ms: float | None, ok: bool, reason: str | None = None,
+                engine: str | None = None, stats: Dict[str, float] | None = None) -> str:
     parts = [f"CPU_RESULT prog={prog}"]
     if ms is not None:
         parts.append(f"ms={ms:.6f}")
@@ -23,6 +33,11 @@ def result_line(prog: str, ms: float | None, ok: bool, reason: str | None = None
     parts.append(f"ok={1 if ok else 0}")
     if reason:
         parts.append(f"reason={reason}")
+    if engine:
+        parts.append(f"engine={engine}")
+    for key, value in (stats or {}).items():
+        if key != "engine":
+            parts.append(f"{key}={value:.6f}" if isinstance(value, float) else f"{key}={value}")
     return " ".join(parts)
 
 
@@ -33,81 +48,270 @@ def ensure_numpy(prog: str) -> None:
         sys.exit(1)
 
 
-def run_qft(qubits: int) -> None:
+# --engine choices. "fast" resolves per family: np.fft for QFT, the
+# closed-form reflection for Grover, direct amplitudes for Bell.
+ENGINES = ("fast", "statevector", "dense")
+FAST_ENGINE = {"qft": "fft", "grover": "reflect", "bell": "direct"}
+# Dense matrices are N x N complex128: 2**12 -> 256 MiB, enough for a reference
+DENSE_MAX_QUBITS = 12
+
+
+class EngineError(Exception):
+    """Raised when an engine cannot run a program; the message is the reason."""
+
+
+def resolve_engine(family: str, engine: str) -> str:
+    if engine not in ENGINES:
+        raise EngineError("unknown_engine")
+    return FAST_ENGINE[family] if engine == "fast" else engine
+
+
+def _check_dense(qubits: int) -> None:
+    if qubits > DENSE_MAX_QUBITS:
+        raise EngineError("dense_too_large")
+
+
+def _apply_h(state: "np.ndarray", qubits: int, q: int) -> None:
+    v = state.reshape(1 << (qubits - 1 - q), 2, 1 << q)
+    a = v[:, 0].copy()
+    v[:, 0] += v[:, 1]
+    a -= v[:, 1]
+    v[:, 1] = a
+    v *= 1 / math.sqrt(2)
+
+
+def _apply_x(state: "np.ndarray", qubits: int, q: int) -> None:
+    v = state.reshape(1 << (qubits - 1 - q), 2, 1 << q)
+    v[:, [0, 1]] = v[:, [1, 0]]
+
+
+def _bit_reverse(state: "np.ndarray", qubits: int) -> "np.ndarray":
+    # Reversing the axes of the (2,)*n view reverses the bits of every index
+    return np.ascontiguousarray(state.reshape((2,) * qubits).transpose()).reshape(-1)
+
+
+def run_qft(qubits: int, engine: str = "fast") -> "np.ndarray":
+    """DFT of |1>: out[k] = exp(2*pi*i*k/N) / sqrt(N), natural index order."""
     ensure_numpy(f"qft{qubits}")
+    engine = resolve_engine("qft", engine)
     size = 1 << qubits
     state = np.zeros(size, dtype=np.complex128)
     state[1 % size] = 1.0  # simple deterministic input
-    omega = np.exp(2j * math.pi / size)
-    norm = 1 / math.sqrt(size)
-    mat = np.array([[omega ** (x * k) for x in range(size)] for k in range(size)], dtype=np.complex128)
-    out = norm * mat @ state
+    if engine == "fft":
+        # ifft uses the +i sign convention of the QFT; rescale 1/N -> 1/sqrt(N)
+        out = np.fft.ifft(state) * math.sqrt(size)
+    elif engine == "statevector":
+        # Textbook circuit, MSB first: H on q, then the controlled R_k from
+        # every lower qubit m, which together multiply the |1>_q half by
+        # exp(i*pi*(x mod 2^q)/2^q); final SWAP network as one bit reversal
+        for q in range(qubits - 1, -1, -1):
+            _apply_h(state, qubits, q)
+            if q:
+                ramp = np.exp(1j * math.pi * np.arange(1 << q) / (1 << q))
+                state.reshape(-1, 2, 1 << q)[:, 1] *= ramp
+        out = _bit_reverse(state, qubits)
+    else:
+        _check_dense(qubits)
+        k = np.arange(size)
+        # Exponents reduced mod N keep the phases exact for large N
+        mat = np.exp(2j * math.pi * (np.outer(k, k) % size) / size)
+        out = mat @ state / math.sqrt(size)
     # Touch result to avoid optimisation
     _ = float(np.abs(out[0]))
+    return out
 
 
-def run_bell2() -> None:
+def run_bell2(engine: str = "fast") -> "np.ndarray":
     ensure_numpy("bell2")
-    state = np.array([1, 0, 0, 0], dtype=np.complex128)
-    h = (1 / math.sqrt(2)) * np.array([[1, 1], [1, -1]], dtype=np.complex128)
-    kron = np.kron(h, np.eye(2))
-    state = kron @ state
-    cnot = np.array([[1, 0, 0, 0],
-                     [0, 1, 0, 0],
-                     [0, 0, 0, 1],
-                     [0, 0, 1, 0]], dtype=np.complex128)
-    state = cnot @ state
+    engine = resolve_engine("bell", engine)
+    if engine == "direct":
+        state = np.zeros(4, dtype=np.complex128)
+        state[0] = state[3] = 1 / math.sqrt(2)
+    elif engine == "statevector":
+        state = np.array([1, 0, 0, 0], dtype=np.complex128)
+        _apply_h(state, 2, 1)
+        state[[2, 3]] = state[[3, 2]]  # CNOT control q1 -> target q0
+    else:
+        state = np.array([1, 0, 0, 0], dtype=np.complex128)
+        h = (1 / math.sqrt(2)) * np.array([[1, 1], [1, -1]], dtype=np.complex128)
+        kron = np.kron(h, np.eye(2))
+        state = kron @ state
+        cnot = np.array([[1, 0, 0, 0],
+                         [0, 1, 0, 0],
+                         [0, 0, 0, 1],
+                         [0, 0, 1, 0]], dtype=np.complex128)
+        state = cnot @ state
     _ = float(np.abs(state[0]))
+    return state
 
 
-def run_grover(qubits: int) -> None:
+def run_grover(qubits: int, engine: str = "fast") -> "np.ndarray":
+    """One Grover iteration from |0..0> marking the all-ones state."""
     ensure_numpy(f"grover{qubits}")
+    engine = resolve_engine("grover", engine)
     size = 1 << qubits
-    state = np.ones(size, dtype=np.complex128) / math.sqrt(size)
     target = size - 1
-    # Oracle: phase flip on target
-    state[target] *= -1
-    # Diffusion about the mean
-    mean = np.mean(state)
-    state = 2 * mean - state
+    if engine == "reflect":
+        state = np.ones(size, dtype=np.complex128) / math.sqrt(size)
+        # Oracle: phase flip on target
+        state[target] *= -1
+        # Diffusion about the mean
+        mean = np.mean(state)
+        state = 2 * mean - state
+    elif engine == "statevector":
+        # H^n, oracle, H^n X^n (phase flip on |1..1>) X^n H^n, gate by gate;
+        # the diffusion comes out as -(2|s><s| - I), equal up to global phase
+        state = np.zeros(size, dtype=np.complex128)
+        state[0] = 1.0
+        for q in range(qubits):
+            _apply_h(state, qubits, q)
+        state[target] *= -1
+        for layer in (_apply_h, _apply_x):
+            for q in range(qubits):
+                layer(state, qubits, q)
+        state[target] *= -1
+        for layer in (_apply_x, _apply_h):
+            for q in range(qubits):
+                layer(state, qubits, q)
+    else:
+        _check_dense(qubits)
+        h = (1 / math.sqrt(2)) * np.array([[1, 1], [1, -1]], dtype=np.complex128)
+        hn = np.ones((1, 1), dtype=np.complex128)
+        for _ in range(qubits):
+            hn = np.kron(hn, h)
+        oracle = np.eye(size, dtype=np.complex128)
+        oracle[target, target] = -1
+        s = hn[:, 0:1]
+        diffusion = 2 * (s @ s.conj().T) - np.eye(size)
+        state = np.zeros(size, dtype=np.complex128)
+        state[0] = 1.0
+        state = diffusion @ (oracle @ (hn @ state))
     _ = float(np.abs(state[target]))
+    return state
 
 
-def dispatch(prog: str) -> Tuple[bool, str | None]:
+def prog_family(prog: str) -> str | None:
     if prog.startswith("qft") and prog[3:].isdigit():
-        qubits = int(prog[3:])
-        if qubits < 1:
-            return False, "invalid_qubits"
-        run_qft(qubits)
-        return True, None
+        return "qft"
     if prog == "bell2":
-        run_bell2()
-        return True, None
+        return "bell"
     if prog.startswith("grover") and prog[6:].isdigit():
-        qubits = int(prog[6:])
-        if qubits < 2:
-            return False, "invalid_qubits"
-        run_grover(qubits)
-        return True, None
+        return "grover"
+    return None
+
+
+def dispatch(prog: str, engine: str = "fast") -> Tuple[bool, str | None]:
+    family = prog_family(prog)
+    try:
+        if family == "qft":
+            qubits = int(prog[3:])
+            if qubits < 1:
+                return False, "invalid_qubits"
+            run_qft(qubits, engine)
+            return True, None
+        if family == "bell":
+            run_bell2(engine)
+            return True, None
+        if family == "grover":
+            qubits = int(prog[6:])
+            if qubits < 2:
+                return False, "invalid_qubits"
+            run_grover(qubits, engine)
+            return True, None
+    except EngineError as exc:
+        return False, str(exc)
     return False, "not_implemented"
 
 
+def summarize(samples_ms: List[float]) -> Dict[str, float]:
+    """min/median/p95/p99/stddev (population) of timed samples, in ms."""
+    ordered = sorted(samples_ms)
+
+    def pct(q: float) -> float:
+        # Linear interpolation between closest ranks (numpy's default)
+        pos = (len(ordered) - 1) * q
+        lo = int(math.floor(pos))
+        hi = min(lo + 1, len(ordered) - 1)
+        return ordered[lo] + (ordered[hi] - ordered[lo]) * (pos - lo)
+
+    return {
+        "min_ms": ordered[0],
+        "median_ms": statistics.median(ordered),
+        "p95_ms": pct(0.95),
+        "p99_ms": pct(0.99),
+        "std_ms": statistics.pstdev(ordered),
+    }
+
+
+def time_prog(prog: str, engine: str = "fast", runs: int = 50, warmup: int = 3) -> Dict[str, float]:
+    """Time prog in this process.
+
+    The first call is the cold run (cold_ms adds the module's NumPy import
+    time); `warmup` more calls are discarded, then `runs` calls are timed.
+    Returns summarize() of the timed runs plus runs, warmup, cold_ms,
+    import_ms and the resolved engine. Raises EngineError(reason) when the
+    program cannot run.
+    """
+    if runs < 1:
+        raise ValueError("runs must be >= 1")
+    family = prog_family(prog)
+    if family is None:
+        raise EngineError("not_implemented")
+    resolved = resolve_engine(family, engine)
+    start = time.perf_counter()
+    ok, reason = dispatch(prog, engine)
+    first_ms = (time.perf_counter() - start) * 1000.0
+    if not ok:
+        raise EngineError(reason or "cpu_fail")
+    for _ in range(warmup):
+        dispatch(prog, engine)
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        dispatch(prog, engine)
+        samples.append((time.perf_counter() - start) * 1000.0)
+    out: Dict[str, float] = summarize(samples)
+    out.update({"runs": runs, "warmup": warmup, "cold_ms": IMPORT_MS + first_ms,
+                "import_ms": IMPORT_MS, "engine": resolved})
+    return out
+
+
 def main() -> int:
     parser = argparse.ArgumentParser(description="CPU reference runner")
     parser.add_argument("--prog", required=True, help="Program name, e.g. qft4")
+    parser.add_argument("--engine", choices=ENGINES, default="fast",
+                        help="fast (np.fft QFT / closed-form Grover and Bell), gate-level statevector, "
+                             f"or dense matrices (reference, up to {DENSE_MAX_QUBITS} qubits)")
+    parser.add_argument("--runs", type=int, default=0,
+                        help="Timed repetitions in this process after warmup; 0 keeps the single-run output")
+    parser.add_argument("--warmup", type=int, default=3, help="Untimed runs after the cold run (with --runs)")
     args = parser.parse_args()
     prog = args.prog
+    family = prog_family(prog)
+    engine = resolve_engine(family, args.engine) if family else None
+
+    if args.runs > 0:
+        try:
+            stats = time_prog(prog, args.engine, args.runs, args.warmup)
+        except EngineError as exc:
+            print(result_line(prog, None, False, str(exc), engine))
+            return 1
+        except Exception as exc:  # pragma: no cover - propagate failure
+            print(result_line(prog, None, False, f"exception:{exc.__class__.__name__}", engine))
+            return 1
+        print(result_line(prog, stats["median_ms"], True, None, engine, stats))
+        return 0
 
     start = time.perf_counter()
     ok = False
     reason: str | None = None
     try:
-        ok, reason = dispatch(prog)
+        ok, reason = dispatch(prog, args.engine)
     except Exception as exc:  # pragma: no cover - propagate failure
         reason = f"exception:{exc.__class__.__name__}"
         ok = False
     elapsed_ms = (time.perf_counter() - start) * 1000.0 if ok else None
-    line = result_line(prog, elapsed_ms, ok, reason)
+    line = result_line(prog, elapsed_ms, ok, reason, engine)
     print(line)
     return 0 if ok else 1
 
@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""Content-addressed cache of built Verilator models.
+
+Each configuration is keyed by a SHA-256 over the RTL sources, the
+testbench, the Makefile (which holds the Verilator/C++ flags), the output
+of `verilator --version` and any extra flags, and is built by the regular
+Makefile rule into its own directory under fpga_core/build_cache/<key>/.
+A directory whose build.json records the same key is reused without
+running make, so unchanged trees skip the build entirely and switching
+between configurations (N_QUBITS overrides, coverage) is just a lookup.
+
+Exports:
+  - build_key(extra_flags="") -> (key, manifest dict).
+  - ensure_model(extra_flags="", force=False) -> (path to Vqc_top, info)
+    where info has key, hit (bool), build_s and dir.
+"""
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import shutil
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+FPGA_CORE_DIR = REPO_ROOT / "fpga_core"
+CACHE_DIR = FPGA_CORE_DIR / "build_cache"
+TOP = "qc_top"
+VERILATOR = "verilator"
+
+
+class BuildError(Exception):
+    pass
+
+
+def build_inputs() -> List[Path]:
+    """Files whose contents define a build: RTL, testbench and Makefile."""
+    rtl = sorted((FPGA_CORE_DIR / "rtl").glob("*.sv"))
+    tb = sorted((FPGA_CORE_DIR / "tb").glob("*.cpp"))
+    return rtl + tb + [FPGA_CORE_DIR / "Makefile"]
+
+
+def verilator_version(verilator: str = VERILATOR) -> str:
+    if shutil.which(verilator) is None:
+        raise BuildError(f"{verilator} not found on PATH")
+    out = subprocess.run([verilator, "--version"], capture_output=True, text=True)
+    return out.stdout.strip()
+
+
+def build_key(extra_flags: str = "", verilator: str = VERILATOR) -> Tuple[str, Dict[str, object]]:
+    h = hashlib.sha256()
+    files = {}
+    for path in build_inputs():
+        digest = hashlib.sha256(path.read_bytes()).hexdigest()
+        rel = str(path.relative_to(FPGA_CORE_DIR))
+        files[rel] = digest
+        h.update(f"{rel}:{digest}\n".encode())
+    version = verilator_version(verilator)
+    h.update(f"verilator:{version}\nflags:{extra_flags}\n".encode())
+    manifest = {"files": files, "verilator": version, "flags": extra_flags}
+    return h.hexdigest()[:16], manifest
+
+
+def ensure_model(extra_flags: str = "", force: bool = False, verilator: str = VERILATOR) -> Tuple[Path, Dict[str, object]]:
+    """Return the cached Vqc_top for this configuration, building it on a miss."""
+    key, manifest = build_key(extra_flags, verilator)
+    build_dir = CACHE_DIR / key
+    sim = build_dir / f"V{TOP}"
+    stamp = build_dir / "build.json"
+    info: Dict[str, object] = {"key": key, "dir": build_dir, "hit": False, "build_s": 0.0}
+    if not force and sim.exists() and stamp.exists():
+        try:
+            if json.loads(stamp.read_text()).get("key") == key:
+                info["hit"] = True
+                return sim, info
+        except (OSError, ValueError):
+            pass
+
+    if build_dir.exists():
+        shutil.rmtree(build_dir)
+    build_dir.mkdir(parents=True)
+    cmd = ["make", "-C", str(FPGA_CORE_DIR), f"BUILD_DIR={build_dir}", f"VEXTRA={extra_flags}",
+           f"VERILATOR={verilator}", str(sim)]
+    t0 = time.perf_counter()
+    proc = subprocess.run(cmd, capture_output=True, text=True)
+    info["build_s"] = time.perf_counter() - t0
+    (build_dir / "build.log").write_text(proc.stdout + proc.stderr)
+    if proc.returncode != 0 or not sim.exists():
+        raise BuildError(f"Verilator build failed (see {build_dir / 'build.log'})")
+    # Written last: a directory without it is an interrupted build
+    stamp.write_text(json.dumps({"key": key, "build_s": info["build_s"], **manifest}, indent=2))
+    return sim, info
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--vflags", default="", help="Extra Verilator flags, e.g. -GN_QUBITS=5")
+    ap.add_argument("--force", action="store_true", help="Rebuild even on a cache hit")
+    ap.add_argument("--key-only", action="store_true", help="Print the cache key and exit")
+    args = ap.parse_args()
+    try:
+        if args.key_only:
+            print(build_key(args.vflags)[0])
+            return 0
+        sim, info = ensure_model(args.vflags, args.force)
+    except BuildError as exc:
+        print(f"[build] {exc}", file=sys.stderr)
+        return 1
+    state = "hit" if info["hit"] else f"miss, built in {info['build_s']:.1f} s"
+    print(f"[build] cache {state}: {sim}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,232 @@
+#!/usr/bin/env python3
+"""Cycle-count model of the scheduler.sv FSM.
+
+cycle_count advances once per clock in the execute states, S_NEXT and S_FIN
+(S_FETCH only decodes), and the TB samples it on the first cycle with done=1,
+i.e. after one S_FIN cycle. Per instruction, with DIM = 2**N_QUBITS:
+  - S_EXEC_PAIR (H, X, CNOT): every index with the target bit clear takes a
+    compute and a write cycle, every index with it set is skipped in one
+    cycle -> 1.5 * DIM. A target outside the address width never reads as
+    set, so all DIM indices take two cycles -> 2 * DIM. With the scheduler's
+    PIPELINE=1 an in-range target issues one pair per clock into the read /
+    gate / write stages over the DIM/2 pair addresses -> DIM / 2; the last
+    two pairs drain during S_NEXT/S_FETCH (out-of-range targets keep the
+    serial walk);
+  - S_EXEC_DIAG (Z, CPHASE, MASKPHASE) and S_EXEC_SWAP: one cycle per index
+    -> DIM. With DIAG_FAST=1 a diagonal op visits only the addresses it
+    changes, one per clock -> DIM / 2**(bits fixed by target/control/mask),
+    i.e. DIM/2 for Z and DIM/4 for CPHASE, and 0 for identity phases or
+    patterns no address matches;
+  - S_NEXT: +1 after every instruction, NOPs included;
+  - S_FIN: +1 once at END.
+The counts do not depend on amplitudes or on the phase angles, only on the
+opcode class and target of each instruction.
+
+Exports (all counting functions take pipelined=False, diag_fast=False for
+the default build):
+  - instr_cycles(op, target, mem_qubits) -> cycles for one instruction.
+  - words_cycles(words, mem_qubits=4) / ops_cycles(ops, mem_qubits) -> total.
+  - program_ops(prog) -> ops list from cpu_baseline/circuits (qftN, groverN).
+  - model_cycles(prog) -> (cycles, mem_qubits, source) for ROM or modeled
+    programs; sizes beyond qc_top's N_QUBITS assume the scheduler is
+    instantiated with N_QUBITS = n.
+  - validate(csv_path) -> per-program comparison with results.csv, for
+    fpga_cycles (default build), fpga_cycles_pipe (PIPELINE=1) and
+    fpga_cycles_diag (DIAG_FAST=1) when present, on the row's fpga_qubits
+    (the model's N_QUBITS; TOP_QUBITS for rows without it).
+"""
+from __future__ import annotations
+
+import argparse
+import csv
+import math
+import re
+import sys
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+if str(REPO_ROOT) not in sys.path:
+    sys.path.insert(0, str(REPO_ROOT))
+
+from experiments.microcode import (  # noqa: E402
+    ANGLE_TOL, OP_CNOT, OP_CPHASE, OP_END, OP_H, OP_MASKPHASE, OP_SWAP, OP_X, OP_Z,
+    PHASE_ANGLES, add_import_paths, decode, load_rom,
+)
+
+DEFAULT_CSV = REPO_ROOT / "experiments" / "results" / "results.csv"
+
+# qc_top.sv instantiates the scheduler with N_QUBITS=4
+TOP_QUBITS = 4
+NEXT_CYCLES = 1
+FIN_CYCLES = 1
+
+PAIR_OPS = (OP_H, OP_X, OP_CNOT)
+DIAG_OPS = (OP_Z, OP_CPHASE, OP_MASKPHASE)
+
+# ops tuple tag -> (opcode, index of the field the scheduler decodes as
+# target (qa), index of the one it decodes as qb or None)
+OP_TAGS = {
+    "H": (OP_H, 1, None), "X": (OP_X, 1, None), "Z": (OP_Z, 1, None),
+    "CNOT": (OP_CNOT, 2, 1), "CPHASE": (OP_CPHASE, 2, 1),
+    "SWAP": (OP_SWAP, 1, 2), "MASKPHASE": (OP_MASKPHASE, 1, 2),
+}
+
+
+def diag_fast_cycles(op: int, target: int, aux: int, identity: bool, mem_qubits: int) -> int:
+    """S_EXEC_DIAG cycles of a DIAG_FAST=1 core: the addresses op changes.
+
+    aux is the CPHASE control or the MASKPHASE value (target is its mask).
+    """
+    dim = 1 << mem_qubits
+    if op != OP_Z and identity:
+        return 0
+    if op == OP_MASKPHASE:
+        # The scheduler only compares mask/value bits below the address width
+        mask, value = target & (dim - 1), aux & (dim - 1)
+        if value & ~mask:
+            return 0
+    else:
+        qubits = {target, aux} if op == OP_CPHASE else {target}
+        if max(qubits) >= mem_qubits:
+            return 0  # is_bit_set() reads such a qubit as 0, so nothing matches
+        mask = sum(1 << q for q in qubits)
+    return dim >> bin(mask).count("1")
+
+
+def instr_cycles(op: int, target: int, mem_qubits: int = TOP_QUBITS, pipelined: bool = False,
+                 diag_fast: bool = False, aux: int = 0, identity: bool = False) -> int:
+    """Cycles one instruction spends in its execute state plus S_NEXT.
+
+    aux (CPHASE control, MASKPHASE value) and identity (the phase is 1) only
+    matter with diag_fast.
+    """
+    dim = 1 << mem_qubits
+    if op in PAIR_OPS:
+        if target >= mem_qubits:
+            exec_cycles = 2 * dim
+        else:
+            exec_cycles = dim // 2 if pipelined else dim + dim // 2
+    elif op in DIAG_OPS:
+        exec_cycles = diag_fast_cycles(op, target, aux, identity, mem_qubits) if diag_fast else dim
+    elif op == OP_SWAP:
+        exec_cycles = dim
+    elif op == OP_END:
+        raise ValueError("END has no execute state")
+    else:
+        exec_cycles = 0  # NOP and unknown opcodes go straight to S_NEXT
+    return exec_cycles + NEXT_CYCLES
+
+
+def words_cycles(words: Iterable[int], mem_qubits: int = TOP_QUBITS, pipelined: bool = False,
+                 diag_fast: bool = False) -> int:
+    """cycle_count the TB reports for a microcode program."""
+    total = 0
+    for word in words:
+        ins = decode(word)
+        if ins.op == OP_END:
+            return total + FIN_CYCLES
+        # phase_lut maps every id it does not list to the identity
+        total += instr_cycles(ins.op, ins.qa, mem_qubits, pipelined, diag_fast,
+                              ins.qb, ins.angle_id not in PHASE_ANGLES)
+    raise ValueError("program has no END word")
+
+
+def ops_cycles(ops: Iterable[tuple], mem_qubits: int, pipelined: bool = False,
+               diag_fast: bool = False) -> int:
+    """cycle_count for ops as the scheduler would run them, one instruction each."""
+    total = FIN_CYCLES
+    for op in ops:
+        tag = op[0].upper()
+        if tag not in OP_TAGS:
+            raise ValueError(f"op {tag} has no scheduler instruction")
+        opcode, target, aux = OP_TAGS[tag]
+        identity = tag in ("CPHASE", "MASKPHASE") and abs(math.remainder(op[3], 2 * math.pi)) <= ANGLE_TOL
+        total += instr_cycles(opcode, op[target], mem_qubits, pipelined, diag_fast,
+                              op[aux] if aux is not None else 0, identity)
+    return total
+
+
+def program_ops(prog: str) -> List[tuple]:
+    """Ops list for qftN / groverN / bell2 from cpu_baseline/circuits."""
+    add_import_paths()
+    m = re.fullmatch(r"(qft|grover)(\d+)", prog)
+    if m and m.group(1) == "qft":
+        from circuits.qft import qft_circuit
+        return qft_circuit(int(m.group(2)))
+    if m:
+        from circuits.grover import grover_once
+        return grover_once(int(m.group(2)))
+    if prog == "bell2":
+        return [("H", 0), ("CNOT", 0, 1)]
+    raise KeyError(f"no circuit for program {prog!r}")
+
+
+def model_cycles(prog: str, rom: Optional[Dict[str, List[int]]] = None,
+                 pipelined: bool = False, diag_fast: bool = False) -> Tuple[int, int, str]:
+    """(cycles, mem_qubits, source); source is 'rom' or 'ops'.
+
+    ROM programs are counted from their words on qc_top's memory. Anything
+    else is counted from its ops list on a scheduler sized to the program
+    (at least qc_top's N_QUBITS).
+    """
+    rom = rom if rom is not None else load_rom()
+    if prog in rom:
+        return words_cycles(rom[prog], TOP_QUBITS, pipelined, diag_fast), TOP_QUBITS, "rom"
+    m = re.search(r"(\d+)$", prog)
+    n = int(m.group(1)) if m else TOP_QUBITS
+    mem_qubits = max(TOP_QUBITS, n)
+    return ops_cycles(program_ops(prog), mem_qubits, pipelined, diag_fast), mem_qubits, "ops"
+
+
+# results.csv column -> (mode label, pipelined, diag_fast) of the build that produced it
+MODES = (
+    ("fpga_cycles", "serial", False, False),
+    ("fpga_cycles_pipe", "pipelined", True, False),
+    ("fpga_cycles_diag", "diag_fast", False, True),
+)
+
+
+def validate(csv_path: Path = DEFAULT_CSV) -> List[Dict[str, object]]:
+    """Compare model_cycles with the simulated cycle columns in csv_path."""
+    rom = load_rom()
+    out = []
+    with Path(csv_path).open() as f:
+        for row in csv.DictReader(f):
+            prog = row.get("prog", "")
+            if prog not in rom or row.get("fpga_source", "rtl") != "rtl":
+                continue
+            mem_qubits = int(row.get("fpga_qubits") or TOP_QUBITS)
+            for column, mode, pipelined, diag_fast in MODES:
+                measured = row.get(column, "")
+                if not measured:
+                    continue
+                out.append({"prog": prog, "mode": mode, "measured": int(float(measured)),
+                            "model": words_cycles(rom[prog], mem_qubits, pipelined, diag_fast),
+                            "ops_model": ops_cycles(program_ops(prog), mem_qubits, pipelined, diag_fast)})
+    return out
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--csv", type=Path, default=DEFAULT_CSV, help="results.csv to validate against")
+    ap.add_argument("--prog", action="append", default=[], help="Also print the modeled count for these programs")
+    args = ap.parse_args()
+
+    ok = True
+    for r in validate(args.csv):
+        match = r["model"] == r["measured"]
+        ok &= match
+        print(f"[cycles] {r['prog']:8s} {r['mode']:9s} rtl={r['measured']:5d} model={r['model']:5d} "
+              f"ops_model={r['ops_model']:5d} {'match' if match else 'MISMATCH'}")
+    for prog in args.prog or ["qft5", "qft6"]:
+        cycles, mem_qubits, source = model_cycles(prog)
+        pipe, _, _ = model_cycles(prog, pipelined=True)
+        fast, _, _ = model_cycles(prog, diag_fast=True)
+        print(f"[cycles] {prog:8s} modeled={cycles:5d} pipelined={pipe:5d} diag_fast={fast:5d} "
+              f"(N_QUBITS={mem_qubits}, from {source})")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
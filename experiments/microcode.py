@@ -0,0 +1,445 @@
+#!/usr/bin/env python3
+"""Microcode word format of the FPGA core: ROM reader, assembler, disassembler.
+
+Word layout (see fpga_core/rtl/microcode_rom.sv):
+  [31:28] opcode   [27:24] qa (target, or MASKPHASE mask)
+  [23:20] qb (control/aux, or MASKPHASE value)
+  [19:12] p0       [11:4]  p1 (phase_lut angle id)   [3:0] 0
+
+Exports:
+  - OP_* opcodes, OPCODE_NAMES, PROG_IDS (prog name -> ROM prog_id).
+  - decode(word) -> Instr (named fields).
+  - load_rom(path=None) -> {prog name: [word, ...]} parsed from the SV
+    source, up to and including the END word.
+  - angle_id(theta), assemble_op(op) / assemble_ops(ops) -> words from
+    cpu_baseline ops tuples (H, X, Z, CNOT, CPHASE, SWAP, MASKPHASE).
+  - word_op(word) / words_ops(words) -> ops tuples back from words.
+  - assemble(text) -> words from the disassembly syntax; disassemble(words)
+    -> lines that assemble() maps back to the same words.
+  - write_readmemh(words, path) / read_readmemh(path): ROM images for
+    microcode_rom.sv's prog_id 7 slot (+rom_image=<file> in the TB).
+"""
+from __future__ import annotations
+
+import argparse
+import math
+import re
+import sys
+from pathlib import Path
+from typing import Dict, Iterable, List, NamedTuple, Optional
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+ROM_SV = REPO_ROOT / "fpga_core" / "rtl" / "microcode_rom.sv"
+
+OP_NOP = 0
+OP_H = 1
+OP_X = 2
+OP_Z = 3
+OP_CNOT = 4
+OP_CPHASE = 5
+OP_SWAP = 6
+OP_MASKPHASE = 7
+OP_END = 15
+
+OPCODE_NAMES = {
+    OP_NOP: "NOP", OP_H: "H", OP_X: "X", OP_Z: "Z", OP_CNOT: "CNOT",
+    OP_CPHASE: "CPHASE", OP_SWAP: "SWAP", OP_MASKPHASE: "MASKPHASE", OP_END: "END",
+}
+
+# prog_id values decoded by microcode_rom.sv and selected by qc_tb.cpp (+prog=)
+PROG_IDS = {
+    "qft2": 0, "qft3": 1, "qft4": 2,
+    "grover2": 3, "grover3": 4, "grover4": 5,
+    "bell2": 6,
+}
+# prog_id of the ROM slot filled from a $readmemh image (+rom_image=<file>)
+IMAGE_PROG_ID = 7
+IMAGE_PROG = "image"
+ROM_DEPTH = 256
+
+# phase_lut.sv angle ids; id 0 and unlisted ids read as cos=1, sin=0
+PHASE_ANGLES = {1: math.pi, 2: math.pi / 2, 3: math.pi / 4, 4: math.pi / 8}
+ANGLE_TOL = 1e-9
+
+
+class Instr(NamedTuple):
+    op: int
+    qa: int
+    qb: int
+    p0: int
+    p1: int
+
+    @property
+    def name(self) -> str:
+        return OPCODE_NAMES.get(self.op, f"OP{self.op}")
+
+    @property
+    def angle_id(self) -> int:
+        return self.p1
+
+
+def decode(word: int) -> Instr:
+    return Instr((word >> 28) & 0xF, (word >> 24) & 0xF, (word >> 20) & 0xF,
+                 (word >> 12) & 0xFF, (word >> 4) & 0xFF)
+
+
+def encode(op: int, qa: int = 0, qb: int = 0, p0: int = 0, p1: int = 0) -> int:
+    return ((op & 0xF) << 28) | ((qa & 0xF) << 24) | ((qb & 0xF) << 20) | ((p0 & 0xFF) << 12) | ((p1 & 0xFF) << 4)
+
+
+_LIT_RE = re.compile(r"^(?:(\d+)?'s?([hdb]))?([0-9a-fA-F_]+)$")
+_PROG_RE = re.compile(r"3'd(\d+)\s*:\s*begin")
+_ENTRY_RE = re.compile(r"8'd(\d+)\s*:\s*data\s*=\s*(pack_i16|pack_pair8|pack_mask)\s*\(([^)]*)\)")
+
+
+def _literal(text: str) -> int:
+    m = _LIT_RE.match(text.strip())
+    if not m:
+        raise ValueError(f"unsupported literal {text!r}")
+    base = {"h": 16, "d": 10, "b": 2, None: 10}[m.group(2)]
+    return int(m.group(3).replace("_", ""), base)
+
+
+def _pack(fn: str, args: List[int]) -> int:
+    if fn == "pack_i16":
+        op, qa, qb, imm16 = args
+        return encode(op, qa, qb, (imm16 >> 8) & 0xFF, imm16 & 0xFF)
+    if fn == "pack_pair8":
+        return encode(*args)
+    mask, value, ang = args  # pack_mask
+    return encode(OP_MASKPHASE, mask, value, 0, ang)
+
+
+def load_rom(path: Optional[Path] = None) -> Dict[str, List[int]]:
+    """Parse every program of microcode_rom.sv into its list of words."""
+    text = Path(path or ROM_SV).read_text()
+    names = {pid: name for name, pid in PROG_IDS.items()}
+    progs: Dict[int, Dict[int, int]] = {}
+    current = None
+    for line in text.splitlines():
+        line = line.split("//", 1)[0]
+        m = _PROG_RE.search(line)
+        if m:
+            current = progs.setdefault(int(m.group(1)), {})
+            continue
+        m = _ENTRY_RE.search(line)
+        if m and current is not None:
+            args = [_literal(a) for a in m.group(3).split(",")]
+            current[int(m.group(1))] = _pack(m.group(2), args)
+    out: Dict[str, List[int]] = {}
+    for pid, entries in sorted(progs.items()):
+        words = []
+        for addr in range(max(entries) + 1):
+            # Unlisted addresses fall through to the default END word
+            word = entries.get(addr, encode(OP_END))
+            words.append(word)
+            if decode(word).op == OP_END:
+                break
+        out[names.get(pid, f"prog{pid}")] = words
+    return out
+
+
+def format_instr(ins: Instr) -> str:
+    if ins.op in (OP_H, OP_X, OP_Z):
+        return f"{ins.name} q{ins.qa}"
+    if ins.op == OP_CNOT:
+        return f"CNOT c{ins.qb} -> t{ins.qa}"
+    if ins.op == OP_CPHASE:
+        return f"CPHASE c{ins.qb} -> t{ins.qa} angle_id={ins.angle_id}"
+    if ins.op == OP_SWAP:
+        return f"SWAP q{ins.qa} q{ins.qb}"
+    if ins.op == OP_MASKPHASE:
+        return f"MASKPHASE mask={ins.qa:#x} value={ins.qb:#x} angle_id={ins.angle_id}"
+    return ins.name
+
+
+
+def angle_id(theta: float) -> int:
+    """phase_lut id of theta (mod 2*pi); 0 for the identity phase."""
+    t = math.remainder(float(theta), 2 * math.pi)
+    if abs(t) <= ANGLE_TOL:
+        return 0
+    for aid, ang in PHASE_ANGLES.items():
+        if abs(math.remainder(t - ang, 2 * math.pi)) <= ANGLE_TOL:
+            return aid
+    raise ValueError(f"angle {theta!r} is not in phase_lut (pi, pi/2, pi/4, pi/8)")
+
+
+def _field(value: int, what: str, width: int = 4) -> int:
+    value = int(value)
+    if not 0 <= value < (1 << width):
+        raise ValueError(f"{what} {value} does not fit the {width}-bit microcode field")
+    return value
+
+
+def assemble_op(op: tuple) -> int:
+    """Microcode word of one ops tuple (qubit 0 = LSB, as in cpu_baseline)."""
+    tag = op[0].upper()
+    if tag in ("H", "X", "Z"):
+        return encode({"H": OP_H, "X": OP_X, "Z": OP_Z}[tag], _field(op[1], "qubit"))
+    if tag == "CNOT":
+        return encode(OP_CNOT, _field(op[2], "target"), _field(op[1], "control"))
+    if tag == "CPHASE":
+        return encode(OP_CPHASE, _field(op[2], "target"), _field(op[1], "control"), 0, angle_id(op[3]))
+    if tag == "SWAP":
+        return encode(OP_SWAP, _field(op[1], "qubit"), _field(op[2], "qubit"))
+    if tag == "MASKPHASE":
+        mask = _field(op[1], "mask")
+        value = _field(op[2], "value")
+        if value & ~mask:
+            raise ValueError(f"MASKPHASE value {value:#x} has bits outside mask {mask:#x}")
+        return encode(OP_MASKPHASE, mask, value, 0, angle_id(op[3]))
+    raise ValueError(f"op {tag} has no microcode instruction")
+
+
+def assemble_ops(ops: Iterable[tuple]) -> List[int]:
+    """Words for an ops list (or a Circuit), END appended."""
+    words = [assemble_op(op) for op in ops]
+    words.append(encode(OP_END))
+    if len(words) > ROM_DEPTH:
+        raise ValueError(f"program needs {len(words)} words, the ROM holds {ROM_DEPTH}")
+    return words
+
+
+def word_op(word: int) -> Optional[tuple]:
+    """Ops tuple a word executes; None for NOP and END."""
+    ins = decode(word)
+    theta = PHASE_ANGLES.get(ins.angle_id, 0.0)
+    if ins.op in (OP_H, OP_X, OP_Z):
+        return (ins.name, ins.qa)
+    if ins.op == OP_CNOT:
+        return ("CNOT", ins.qb, ins.qa)
+    if ins.op == OP_CPHASE:
+        return ("CPHASE", ins.qb, ins.qa, theta)
+    if ins.op == OP_SWAP:
+        return ("SWAP", ins.qa, ins.qb)
+    if ins.op == OP_MASKPHASE:
+        return ("MASKPHASE", ins.qa, ins.qb, theta)
+    return None
+
+
+def words_ops(words: Iterable[int]) -> List[tuple]:
+    """Ops executed by a program, up to its END word."""
+    ops = []
+    for word in words:
+        if decode(word).op == OP_END:
+            break
+        op = word_op(word)
+        if op is not None:
+            ops.append(op)
+    return ops
+
+
+_NAMED_OPS = {name: op for op, name in OPCODE_NAMES.items()}
+_ARG_RE = re.compile(r"^([qct])(\d+)$")
+_PI_RE = re.compile(r"^(-?)pi(?:/(\d+))?$")
+
+
+def _theta(text: str) -> float:
+    m = _PI_RE.match(text)
+    if m:
+        theta = math.pi / int(m.group(2) or 1)
+        return -theta if m.group(1) else theta
+    return float(text)
+
+
+def parse_instr(line: str) -> int:
+    """Word for one line of disassembly syntax (see format_instr).
+
+    Besides angle_id=N, phases may be given as theta=<radians | pi | pi/K>.
+    `.word 0x...` emits a raw word.
+    """
+    tokens = line.replace("->", " ").split()
+    if tokens[0] == ".word":
+        return int(tokens[1], 0) & 0xFFFFFFFF
+    name = tokens[0].upper()
+    if name not in _NAMED_OPS:
+        raise ValueError(f"unknown instruction {tokens[0]!r}")
+    op = _NAMED_OPS[name]
+    qubits: Dict[str, List[int]] = {"q": [], "c": [], "t": []}
+    kw: Dict[str, str] = {}
+    for tok in tokens[1:]:
+        if "=" in tok:
+            key, _, val = tok.partition("=")
+            kw[key.lower()] = val
+            continue
+        m = _ARG_RE.match(tok.lower())
+        if not m:
+            raise ValueError(f"bad operand {tok!r} in {line.strip()!r}")
+        qubits[m.group(1)].append(int(m.group(2)))
+    aid = int(kw["angle_id"], 0) if "angle_id" in kw else angle_id(_theta(kw["theta"])) if "theta" in kw else None
+
+    def one(key: str) -> int:
+        if len(qubits[key]) != 1:
+            raise ValueError(f"{name} needs one {key}<n> operand: {line.strip()!r}")
+        return qubits[key][0]
+
+    if op in (OP_H, OP_X, OP_Z):
+        return encode(op, _field(one("q"), "qubit"))
+    if op in (OP_CNOT, OP_CPHASE):
+        if op == OP_CPHASE and aid is None:
+            raise ValueError(f"CPHASE needs angle_id= or theta=: {line.strip()!r}")
+        return encode(op, _field(one("t"), "target"), _field(one("c"), "control"), 0,
+                      _field(aid or 0, "angle_id", 8))
+    if op == OP_SWAP:
+        if len(qubits["q"]) != 2:
+            raise ValueError(f"SWAP needs two q<n> operands: {line.strip()!r}")
+        return encode(op, *(_field(q, "qubit") for q in qubits["q"]))
+    if op == OP_MASKPHASE:
+        if aid is None or "mask" not in kw or "value" not in kw:
+            raise ValueError(f"MASKPHASE needs mask=, value= and angle_id= or theta=: {line.strip()!r}")
+        return encode(op, _field(int(kw["mask"], 0), "mask"), _field(int(kw["value"], 0), "value"), 0,
+                      _field(aid, "angle_id", 8))
+    return encode(op)  # NOP, END
+
+
+def assemble(text: str) -> List[int]:
+    """Words for a program in disassembly syntax; END is appended if missing.
+
+    Blank lines, `#`/`//` comments and a leading `<addr>:` label are ignored.
+    """
+    words = []
+    for line in text.splitlines():
+        line = re.split(r"#|//", line, maxsplit=1)[0]
+        line = re.sub(r"^\s*\d+\s*:", "", line).strip()
+        if line:
+            words.append(parse_instr(line))
+    if not words or decode(words[-1]).op != OP_END:
+        words.append(encode(OP_END))
+    if len(words) > ROM_DEPTH:
+        raise ValueError(f"program needs {len(words)} words, the ROM holds {ROM_DEPTH}")
+    return words
+
+
+def disassemble(words: Iterable[int]) -> List[str]:
+    """One line per word; words with bits format_instr drops become .word."""
+    lines = []
+    for word in words:
+        text = format_instr(decode(word))
+        try:
+            exact = parse_instr(text) == word
+        except ValueError:
+            exact = False
+        lines.append(text if exact else f".word {word:#010x}")
+    return lines
+
+
+def write_readmemh(words: List[int], path: Path, comments: bool = True) -> Path:
+    """$readmemh image: one 8-digit hex word per line from address 0."""
+    if len(words) > ROM_DEPTH:
+        raise ValueError(f"program needs {len(words)} words, the ROM holds {ROM_DEPTH}")
+    path = Path(path)
+    lines = []
+    for addr, (word, text) in enumerate(zip(words, disassemble(words))):
+        lines.append(f"{word:08x}  // {addr:3d}: {text}" if comments else f"{word:08x}")
+    path.write_text("\n".join(lines) + "\n")
+    return path
+
+
+def read_readmemh(path: Path) -> List[int]:
+    """Words of a $readmemh image (// comments and @addr jumps allowed)."""
+    mem: Dict[int, int] = {}
+    addr = 0
+    for line in Path(path).read_text().splitlines():
+        for tok in line.split("//", 1)[0].split():
+            if tok.startswith("@"):
+                addr = int(tok[1:], 16)
+                continue
+            mem[addr] = int(tok.replace("_", ""), 16)
+            addr += 1
+    # Unwritten addresses keep the ROM's END fill
+    return [mem.get(a, encode(OP_END)) for a in range(max(mem) + 1)] if mem else []
+
+
+def add_import_paths() -> None:
+    """Put the repo root (experiments.*) and cpu_baseline/ (circuits, sim) on sys.path."""
+    for p in (REPO_ROOT, REPO_ROOT / "cpu_baseline"):
+        if str(p) not in sys.path:
+            sys.path.insert(0, str(p))
+
+
+def _rom_circuits() -> Dict[str, List[tuple]]:
+    """cpu_baseline circuits the ROM programs were hand-assembled from."""
+    add_import_paths()
+    from circuits.grover import grover_once
+    from circuits.grover2 import grover2_once
+    from circuits.qft import qft_circuit
+    out = {f"qft{n}": qft_circuit(n) for n in (2, 3, 4)}
+    out.update({f"grover{n}": grover_once(n) for n in (3, 4)})
+    out["grover2"] = grover2_once()
+    out["bell2"] = [("H", 0), ("CNOT", 0, 1)]
+    return out
+
+
+def check_roundtrip(rom: Optional[Dict[str, List[int]]] = None,
+                    tmp_dir: Optional[Path] = None) -> List[Dict[str, object]]:
+    """Per ROM program: disassemble/assemble, $readmemh write/read and ops
+    round trips (must be identical), plus whether assembling the matching
+    cpu_baseline circuit reproduces the hand-written words."""
+    import tempfile
+    rom = rom if rom is not None else load_rom()
+    circuits = _rom_circuits()
+    out = []
+    with tempfile.TemporaryDirectory(dir=tmp_dir) as tmp:
+        for prog, words in rom.items():
+            image = write_readmemh(words, Path(tmp) / f"{prog}.hex")
+            circuit = circuits.get(prog)
+            out.append({
+                "prog": prog,
+                "words": len(words),
+                "text": assemble("\n".join(disassemble(words))) == words,
+                "image": read_readmemh(image) == words,
+                "ops": assemble_ops(words_ops(words)) == words,
+                "circuit": None if circuit is None else assemble_ops(circuit) == words,
+            })
+    return out
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--asm", type=Path, help="Assemble a program in disassembly syntax")
+    ap.add_argument("--circuit", help="Assemble a cpu_baseline circuit (qftN, groverN, bell2)")
+    ap.add_argument("-o", "--out", type=Path, help="$readmemh image to write (default: print words)")
+    ap.add_argument("--disasm", type=Path, help="Disassemble a $readmemh image")
+    ap.add_argument("--check", action="store_true",
+                    help="Round-trip every ROM program through the assembler and image format")
+    args = ap.parse_args()
+
+    if args.check:
+        ok = True
+        for r in check_roundtrip():
+            same = r["text"] and r["image"] and r["ops"]
+            ok &= same
+            circuit = "n/a" if r["circuit"] is None else ("same" if r["circuit"] else "differs")
+            print(f"[asm] {r['prog']:8s} {r['words']:3d} words  text={r['text']} image={r['image']} "
+                  f"ops={r['ops']}  circuit->{circuit}")
+        return 0 if ok else 1
+    if args.asm or args.circuit:
+        if args.asm:
+            words = assemble(args.asm.read_text())
+        else:
+            add_import_paths()
+            from experiments.cycle_model import program_ops
+            words = assemble_ops(program_ops(args.circuit))
+        if args.out:
+            write_readmemh(words, args.out)
+            print(f"[asm] {len(words)} words -> {args.out} (run with +prog={IMAGE_PROG} +rom_image={args.out})")
+        else:
+            for addr, (word, text) in enumerate(zip(words, disassemble(words))):
+                print(f"  {addr:3d}  {word:08x}  {text}")
+        return 0
+    if args.disasm:
+        words = read_readmemh(args.disasm)
+        for addr, (word, text) in enumerate(zip(words, disassemble(words))):
+            print(f"  {addr:3d}  {word:08x}  {text}")
+        return 0
+
+    for prog, words in load_rom().items():
+        print(f"{prog}:")
+        for addr, word in enumerate(words):
+            print(f"  {addr:3d}  {word:08x}  {format_instr(decode(word))}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
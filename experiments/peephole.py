@@ -0,0 +1,430 @@
+#!/usr/bin/env python3
+"""Cycle-aware peephole optimizer for microcode programs.
+
+Every instruction costs a full pass over the state in scheduler.sv, so
+removing or cheapening instructions pays off directly. Rewrites work on the
+ops form of a program (microcode.words_ops / assemble_ops convert both ways):
+  - cancel: adjacent self-inverse pairs (H H, X X, Z Z, CNOT CNOT, SWAP SWAP)
+    cancel, also across gates on other qubits and, for Z, across other
+    diagonal gates;
+  - absorb_x: X_q D ... X_q, where only diagonal gates or gates on other
+    qubits lie between the two X, becomes D' ... with bit q of every
+    diagonal's value pattern flipped (Z and CPHASE turn into MASKPHASE),
+    e.g. Grover's X0 X1 CZ X0 X1 -> MASKPHASE(mask=3, value=0, pi);
+  - merge_phases: diagonal gates with the same mask/value pattern commute
+    into one whose angle is the sum (if phase_lut has it); identity phases
+    are dropped;
+  - relabel: SWAPs are removed by renaming qubits in the gates after them
+    (cpu_baseline passes.relabel_swaps); the leftover permutation is
+    returned as a readout relabeling instead of being executed.
+A rewrite is kept only if cycle_model.ops_cycles of the instructions it
+adds is lower than of those it removes, so the result never costs more
+cycles than the input under the scheduler's cost model. With a HwGuard
+(report and main use one for every ROM program), each candidate must also
+leave the q15_sim state of the target core no worse: the ideal rewrites
+are exact, but the default core's diagonal-gate read timing makes e.g.
+Grover's absorbed X layers (value != mask) wrong there, and they only
+survive when the target is a DIAG_FAST=1 core.
+
+Exports:
+  - optimize(ops, mem_qubits, relabel=True, guard=None) -> Optimized(ops,
+    readout, stats).
+  - HwGuard(ops, n, diag_fast=False) -> candidate filter for optimize.
+  - optimize_words(words, ...) -> (words, Optimized) for microcode programs.
+  - verify(before, after, readout, n) -> max amplitude error on all 2**n
+    basis inputs (cpu_baseline statevector engine).
+  - hw_score(words, ideal, readout, diag_fast=False) -> (fidelity, raw
+    norm) of the q15_sim emulation of the RTL (which has its own timing
+    effects on diagonal gates unless built with DIAG_FAST=1) against the
+    ideal output; the fidelity is of the normalized state, so the norm is
+    what shows a broken image.
+  - report(progs, diag_fast=False) -> per-program before/after cycles,
+    verification and target-core scores.
+"""
+from __future__ import annotations
+
+import argparse
+import math
+import sys
+from pathlib import Path
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+if str(REPO_ROOT) not in sys.path:
+    sys.path.insert(0, str(REPO_ROOT))
+
+from experiments.cycle_model import FIN_CYCLES, TOP_QUBITS, ops_cycles, program_ops  # noqa: E402
+from experiments.microcode import (  # noqa: E402
+    add_import_paths, angle_id, assemble_ops, load_rom, words_ops, write_readmemh,
+)
+from experiments.q15_sim import run_words, to_complex  # noqa: E402
+from experiments.ref_sim import fidelity  # noqa: E402
+
+add_import_paths()
+from sim.passes import mask_qubits, relabel_swaps  # noqa: E402
+from sim.statevector import apply_ops, apply_permutation, init_state  # noqa: E402
+
+# MASKPHASE mask/value are 4-bit microcode fields
+MASK_BITS = 4
+SELF_INVERSE = ("H", "X", "Z", "CNOT", "SWAP")
+DIAGONAL = ("Z", "CPHASE", "MASKPHASE")
+# Allowed q15_sim fidelity loss / norm drift per accepted rewrite (Q15 rounding)
+HW_TOL = 1e-3
+
+Accept = Callable[[List[tuple]], bool]
+
+
+def _accept_all(ops: List[tuple]) -> bool:
+    return True
+
+
+class Optimized(NamedTuple):
+    ops: List[tuple]
+    readout: Optional[Tuple[int, ...]]  # physical qubit p holds logical readout[p]
+    stats: Dict[str, int]
+
+
+def _qubits(op: tuple) -> set:
+    tag = op[0].upper()
+    if tag == "MASKPHASE":
+        return set(mask_qubits(op[1]))
+    if tag in ("CNOT", "CPHASE", "SWAP"):
+        return {op[1], op[2]}
+    return {op[1]}
+
+
+def _pattern(op: tuple) -> Tuple[int, int, float]:
+    """(mask, value, theta) of a diagonal gate."""
+    tag = op[0].upper()
+    if tag == "Z":
+        return 1 << op[1], 1 << op[1], math.pi
+    if tag == "CPHASE":
+        m = (1 << op[1]) | (1 << op[2])
+        return m, m, float(op[3])
+    return int(op[1]), int(op[2]), float(op[3])
+
+
+def _same(a: tuple, b: tuple) -> bool:
+    if a[0].upper() != b[0].upper():
+        return False
+    if a[0].upper() == "SWAP":
+        return {a[1], a[2]} == {b[1], b[2]}
+    return a[1:] == b[1:]
+
+
+def _commute(a: tuple, b: tuple) -> bool:
+    if not (_qubits(a) & _qubits(b)):
+        return True
+    return a[0].upper() in DIAGONAL and b[0].upper() in DIAGONAL
+
+
+def _live(ops: List[Optional[tuple]]) -> List[tuple]:
+    return [op for op in ops if op is not None]
+
+
+def _cost(ops: List[tuple], mem_qubits: int) -> int:
+    return ops_cycles(ops, mem_qubits) - FIN_CYCLES
+
+
+def _phase_op(like: tuple, mask: int, value: int, theta: float) -> Optional[tuple]:
+    """Diagonal gate for (mask, value, theta), in the form of `like` if it
+    fits; None if theta is the identity or phase_lut has no such angle."""
+    try:
+        if angle_id(theta) == 0:
+            return None
+    except ValueError:
+        return None
+    theta = math.remainder(theta, 2 * math.pi)
+    tag = like[0].upper()
+    if tag == "CPHASE" and value == mask == (1 << like[1]) | (1 << like[2]):
+        return ("CPHASE", like[1], like[2], theta)
+    if tag == "Z" and value == mask == 1 << like[1] and abs(abs(theta) - math.pi) < 1e-9:
+        return like
+    return ("MASKPHASE", mask, value, theta)
+
+
+def cancel(ops: List[tuple], mem_qubits: int, stats: Dict[str, int],
+           accept: Accept = _accept_all) -> List[tuple]:
+    out: List[Optional[tuple]] = []
+    for i, op in enumerate(ops):
+        tag = op[0].upper()
+        if tag in SELF_INVERSE:
+            for j in range(len(out) - 1, -1, -1):
+                prev = out[j]
+                if prev is None:
+                    continue
+                if _same(prev, op):
+                    if _cost([prev, op], mem_qubits) > 0 and accept(_live(out[:j] + out[j + 1:]) + ops[i + 1:]):
+                        out[j] = None
+                        stats["cancelled"] = stats.get("cancelled", 0) + 2
+                        op = None
+                    break
+                if not _commute(prev, op):
+                    break
+        if op is not None:
+            out.append(op)
+    return _live(out)
+
+
+def merge_phases(ops: List[tuple], mem_qubits: int, stats: Dict[str, int],
+                 accept: Accept = _accept_all) -> List[tuple]:
+    out: List[Optional[tuple]] = []
+    for i, op in enumerate(ops):
+        tag = op[0].upper()
+        if tag in DIAGONAL:
+            mask, value, theta = _pattern(op)
+            try:
+                identity = angle_id(theta) == 0
+            except ValueError:
+                identity = False
+            if identity and accept(_live(out) + ops[i + 1:]):
+                stats["identity_dropped"] = stats.get("identity_dropped", 0) + 1
+                continue
+            for j in range(len(out) - 1, -1, -1):
+                prev = out[j]
+                if prev is None:
+                    continue
+                if prev[0].upper() in DIAGONAL and _pattern(prev)[:2] == (mask, value):
+                    merged = _phase_op(prev, mask, value, _pattern(prev)[2] + theta)
+                    try:
+                        gone = angle_id(_pattern(prev)[2] + theta) == 0
+                    except ValueError:
+                        gone = False
+                    new = [] if gone else [merged] if merged is not None else None
+                    if (new is not None and _cost(new, mem_qubits) < _cost([prev, op], mem_qubits)
+                            and accept(_live(out[:j] + new + out[j + 1:]) + ops[i + 1:])):
+                        out[j] = new[0] if new else None
+                        stats["phases_merged"] = stats.get("phases_merged", 0) + 1
+                        op = None
+                    break
+                if not _commute(prev, op):
+                    break
+        if op is not None:
+            out.append(op)
+    return _live(out)
+
+
+def absorb_x(ops: List[tuple], mem_qubits: int, stats: Dict[str, int],
+             accept: Accept = _accept_all) -> List[tuple]:
+    ops = list(ops)
+    i = 0
+    while i < len(ops):
+        op = ops[i]
+        if op[0].upper() != "X" or op[1] >= MASK_BITS:
+            i += 1
+            continue
+        q = op[1]
+        flipped: Dict[int, tuple] = {}
+        for j in range(i + 1, len(ops)):
+            other = ops[j]
+            if q not in _qubits(other):
+                continue
+            if _same(other, op):
+                new = [flipped.get(k, ops[k]) for k in range(i + 1, j)]
+                old = ops[i:j + 1]
+                if _cost(new, mem_qubits) < _cost(old, mem_qubits) and accept(ops[:i] + new + ops[j + 1:]):
+                    ops[i:j + 1] = new
+                    stats["x_absorbed"] = stats.get("x_absorbed", 0) + 2
+                    i -= 1
+                break
+            if other[0].upper() not in DIAGONAL:
+                break
+            mask, value, theta = _pattern(other)
+            if mask >> MASK_BITS:
+                break
+            flipped[j] = ("MASKPHASE", mask, value ^ (1 << q), theta)
+        i += 1
+    return ops
+
+
+def optimize(ops, mem_qubits: int = TOP_QUBITS, relabel: bool = True,
+             nqubits: Optional[int] = None, guard: Optional[HwGuard] = None) -> Optimized:
+    """Apply the rewrites to a fixed point; see the module docstring.
+
+    guard, built from the same ops, vetoes rewrites that make the target
+    core's emulated state worse.
+    """
+    ops = [tuple(op) for op in ops]
+    accept = guard if guard is not None else _accept_all
+    stats: Dict[str, int] = {}
+    readout = None
+    if relabel and any(op[0].upper() == "SWAP" for op in ops):
+        n = nqubits or max(max(_qubits(op)) for op in ops) + 1
+        body = relabel_swaps(ops, n)
+        perm = None
+        if body and body[-1][0] == "PERMUTE":
+            perm = tuple(body[-1][1])
+            body = body[:-1]
+        if _cost(body, mem_qubits) < _cost(ops, mem_qubits) and (guard is None or guard.relabel(body, perm)):
+            stats["swaps_relabeled"] = sum(op[0].upper() == "SWAP" for op in ops)
+            ops, readout = body, perm
+    while True:
+        before = _cost(ops, mem_qubits), len(ops)
+        for rewrite in (cancel, absorb_x, merge_phases):
+            ops = rewrite(ops, mem_qubits, stats, accept)
+        if (_cost(ops, mem_qubits), len(ops)) == before:
+            return Optimized(ops, readout, stats)
+
+
+def optimize_words(words: List[int], mem_qubits: int = TOP_QUBITS, relabel: bool = True,
+                   nqubits: Optional[int] = None, diag_fast: Optional[bool] = None) -> Tuple[List[int], Optimized]:
+    """diag_fast=False/True guards the rewrites with the default/DIAG_FAST=1
+    core's emulation (words must be a program of nqubits <= TOP_QUBITS)."""
+    ops = words_ops(words)
+    guard = None
+    if diag_fast is not None:
+        n = nqubits or max(max(_qubits(op)) for op in ops) + 1
+        guard = HwGuard(ops, n, diag_fast)
+    result = optimize(ops, mem_qubits, relabel, nqubits, guard)
+    return assemble_ops(result.ops), result
+
+
+def verify(before: List[tuple], after: List[tuple], readout: Optional[Tuple[int, ...]], n: int) -> float:
+    """Max |amplitude| difference over all 2**n basis inputs after applying
+    the readout relabeling to the optimized program's output."""
+    a = init_state(n, basis=list(range(1 << n)), dtype=np.complex128)
+    b = a.copy()
+    apply_ops(a, n, list(before), cache=None)
+    tail = [("PERMUTE", readout)] if readout is not None else []
+    apply_ops(b, n, list(after) + tail, cache=None)
+    return float(np.max(np.abs(a - b)))
+
+
+def hw_score(words: List[int], ideal: np.ndarray, readout: Optional[Tuple[int, ...]] = None,
+             diag_fast: bool = False) -> Tuple[float, float]:
+    """(fidelity, raw norm) of the emulated RTL state over the whole memory.
+
+    The ideal occupies the first len(ideal) addresses; amplitude that leaks
+    to higher addresses counts against both numbers, as in the TB checks.
+    """
+    n = int(ideal.size).bit_length() - 1
+    vec = to_complex(*run_words(words, diag_fast=diag_fast)).astype(np.complex128)
+    if readout is not None:
+        apply_permutation(vec, n, readout)  # the unused high qubits act as a batch axis
+    norm = float(np.linalg.norm(vec))
+    padded = np.zeros_like(vec)
+    padded[: ideal.size] = ideal
+    return (fidelity(vec / norm, padded) if norm > 0.0 else 0.0), norm
+
+
+def hw_regressed(before: Tuple[float, float], after: Tuple[float, float]) -> bool:
+    """True if after loses fidelity or drifts further from norm 1 than before (beyond HW_TOL)."""
+    return after[0] < before[0] - HW_TOL or abs(after[1] - 1.0) > abs(before[1] - 1.0) + HW_TOL
+
+
+class HwGuard:
+    """Accepts a candidate program only if its q15_sim state on the target
+    core (DIAG_FAST=1 if diag_fast) is no worse than the current one's.
+
+    The ideal is the output of the original ops on |0...0>. Every accepted
+    candidate becomes the new current program, so the final score is never
+    below the original's by more than HW_TOL per rewrite.
+    """
+
+    def __init__(self, ops: List[tuple], n: int, diag_fast: bool = False):
+        self.n, self.diag_fast, self.readout = n, diag_fast, None
+        self.ideal = init_state(n, dtype=np.complex128)
+        apply_ops(self.ideal, n, list(ops), cache=None)
+        self.score = self._score(ops, None)
+        self.rejected = 0
+
+    def _score(self, ops: List[tuple], readout: Optional[Tuple[int, ...]]) -> Optional[Tuple[float, float]]:
+        try:
+            words = assemble_ops(ops)
+        except ValueError:
+            return None
+        return hw_score(words, self.ideal, readout, self.diag_fast)
+
+    def relabel(self, ops: List[tuple], readout: Optional[Tuple[int, ...]]) -> bool:
+        if self.score is None:
+            return True  # not a microcode program: nothing to emulate
+        score = self._score(ops, readout)
+        if score is None or hw_regressed(self.score, score):
+            self.rejected += 1
+            return False
+        self.score, self.readout = score, readout
+        return True
+
+    def __call__(self, ops: List[tuple]) -> bool:
+        return self.relabel(ops, self.readout)
+
+
+def _prog_qubits(prog: str) -> int:
+    digits = prog[len(prog.rstrip("0123456789")):]
+    return int(digits) if digits else TOP_QUBITS
+
+
+def report(progs: List[str], relabel: bool = True, out_dir: Optional[Path] = None,
+           diag_fast: bool = False) -> List[Dict[str, object]]:
+    """ROM programs are optimized under a HwGuard for the target core
+    (DIAG_FAST=1 if diag_fast) and scored on it before and after."""
+    rom = load_rom()
+    rows = []
+    for prog in progs:
+        n = _prog_qubits(prog)
+        ops = words_ops(rom[prog]) if prog in rom else program_ops(prog)
+        mem_qubits = TOP_QUBITS if prog in rom else max(TOP_QUBITS, n)
+        guard = HwGuard(ops, n, diag_fast) if prog in rom else None
+        result = optimize(ops, mem_qubits, relabel, n, guard)
+        row = {
+            "prog": prog, "n": n, "ops_before": len(ops), "ops_after": len(result.ops),
+            "cycles_before": ops_cycles(ops, mem_qubits), "cycles_after": ops_cycles(result.ops, mem_qubits),
+            "readout": result.readout, "stats": result.stats,
+            "max_err": verify(ops, result.ops, result.readout, n), "image": None,
+            "hw_before": None, "hw_after": None, "hw_regressed": False,
+            "hw_rejected": guard.rejected if guard is not None else 0,
+        }
+        try:
+            words = assemble_ops(result.ops)
+        except ValueError:
+            words = None  # angles outside phase_lut; the ops result still stands
+        if words is not None and guard is not None:
+            row["hw_before"] = hw_score(rom[prog], guard.ideal, None, diag_fast)
+            row["hw_after"] = hw_score(words, guard.ideal, result.readout, diag_fast)
+            row["hw_regressed"] = hw_regressed(row["hw_before"], row["hw_after"])
+        if words is not None and out_dir is not None:
+            row["image"] = write_readmemh(words, Path(out_dir) / f"{prog}_opt.hex")
+        rows.append(row)
+    return rows
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--prog", action="append", default=[],
+                    help="Program to optimize (ROM name or qftN/groverN); default: every ROM program")
+    ap.add_argument("--keep-swaps", action="store_true", help="Do not relabel SWAPs into a readout permutation")
+    ap.add_argument("-o", "--out-dir", type=Path, help="Write <prog>_opt.hex $readmemh images here")
+    ap.add_argument("--diag-fast", action="store_true",
+                    help="Target a DIAG_FAST=1 core: guard and score the rewrites with its emulation")
+    args = ap.parse_args()
+    if args.out_dir:
+        args.out_dir.mkdir(parents=True, exist_ok=True)
+
+    core = "DIAG_FAST=1 core" if args.diag_fast else "default core"
+    ok = True
+    for r in report(args.prog or list(load_rom()), not args.keep_swaps, args.out_dir, args.diag_fast):
+        good = r["max_err"] < 1e-9
+        ok &= good and not r["hw_regressed"]
+        saved = r["cycles_before"] - r["cycles_after"]
+        rewrites = ", ".join(f"{k}={v}" for k, v in sorted(r["stats"].items())) or "none"
+        print(f"[peephole] {r['prog']:8s} ops {r['ops_before']:3d} -> {r['ops_after']:3d}  "
+              f"cycles {r['cycles_before']:5d} -> {r['cycles_after']:5d} "
+              f"(-{saved}, {100.0 * saved / r['cycles_before']:.1f}%)  "
+              f"{'verified' if good else 'MISMATCH'} (max err {r['max_err']:.1e})")
+        print(f"[peephole]          rewrites: {rewrites}")
+        if r["hw_before"] is not None:
+            (fid0, norm0), (fid1, norm1) = r["hw_before"], r["hw_after"]
+            print(f"[peephole]          q15 {core}: fidelity {fid0:.4f} -> {fid1:.4f}, norm {norm0:.4f} -> "
+                  f"{norm1:.4f}  {'REGRESSED' if r['hw_regressed'] else 'ok'} "
+                  f"({r['hw_rejected']} rewrite(s) rejected)")
+        if r["readout"] is not None:
+            print(f"[peephole]          readout: physical qubit p holds logical {list(r['readout'])}[p]")
+        if r["image"] is not None:
+            print(f"[peephole]          image: {r['image']}")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -58,7 +58,7 @@ def extract_family(rows: List[Dict[str, str]], prefix: str) -> Tuple[Dict[int, f
         except ValueError:
             continue
         status = row.get("status", "")
-        if status not in {"ok", "no_cpu", "unsupported"}:
+        if status not in {"ok", "no_cpu", "unsupported", "modeled"}:
             skipped_fpga += 1
             skipped_cpu += 1
             continue
@@ -67,7 +67,8 @@ def extract_family(rows: List[Dict[str, str]], prefix: str) -> Tuple[Dict[int, f
             fpga[qubits] = float(fpga_val)
         else:
             skipped_fpga += 1
-        cpu_val = row.get("cpu_ms", "")
+        # cpu_median_ms since the in-process timing harness; cpu_ms in older CSVs
+        cpu_val = row.get("cpu_median_ms") or row.get("cpu_ms", "")
         if cpu_val:
             cpu[qubits] = float(cpu_val)
         else:
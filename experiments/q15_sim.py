@@ -0,0 +1,356 @@
+#!/usr/bin/env python3
+"""Bit-exact NumPy emulation of the FPGA core's Q1.15 datapath.
+
+The core (fpga_core/rtl) keeps 2**N_QUBITS amplitudes as int16 pairs in
+state_mem.sv and walks every address once per gate in scheduler.sv. This
+module reproduces its results without Verilator:
+  - H:        ((a +/- b) * 0x5A82) >>> 15 on 17/32-bit intermediates,
+              truncated to int16 (two's-complement wrap, no saturation);
+  - X/CNOT:   pair swaps (CNOT's control is the bit of the lower address);
+  - Z, MASKPHASE angle_id 1: int16 negation (-0x8000 stays -0x8000);
+  - CPHASE / MASKPHASE: gate_phase with the phase_lut (cos, sin) pair,
+              32-bit products and difference, >>> 15, then int16 wrap.
+It also models the scheduler's memory timing, which the ideal circuit does
+not have:
+  - pair gates (H/X/CNOT) read a pair one cycle before writing it, so they
+    are exact;
+  - diagonal gates (Z/CPHASE/MASKPHASE) read the registered address of the
+    previous cycle, so new[k] = f(old[k-1]) wherever the condition holds at
+    k, and k = 0 reads the address left over from the previous instruction
+    (0 after a pair gate or at start, DIM-1 after a diagonal gate or SWAP);
+  - SWAP likewise writes values read at the previous cycle's addresses, with
+    writes landing one cycle later; its effect is a fixed permutation that is
+    computed once per (qubits, start address) and applied as a gather.
+With diag_fast=True it models a core built with DIAG_FAST=1 instead:
+diagonal gates read and write each matching address in the same cycle, so
+new[k] = f(old[k]), and identity phases are skipped. PIPELINE=1 needs no
+flag, because its pair gates compute the same values as the serial walk.
+All gates are whole-array NumPy operations and work on (..., DIM) batches.
+
+Exports:
+  - run_words(words, ...) / run_prog(name) -> (re, im) int16 arrays
+    (diag_fast=False by default, as in every function below).
+  - to_complex(re, im), tb_csv_lines(re, im, n) (exact TB CSV dump text).
+  - predict_fidelity(prog) -> fidelity of the emulated state vs ref_sim.
+  - validate(states_dir) -> per-program comparison with the TB dumps: raw
+    int16 equality for binary .bin dumps, exact text for .csv exports.
+"""
+from __future__ import annotations
+
+import argparse
+import sys
+import time
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+if str(REPO_ROOT) not in sys.path:
+    sys.path.insert(0, str(REPO_ROOT))
+
+from experiments.microcode import (  # noqa: E402
+    OP_CNOT, OP_CPHASE, OP_END, OP_H, OP_MASKPHASE, OP_SWAP, OP_X, OP_Z,
+    decode, load_rom,
+)
+from experiments.ref_sim import (  # noqa: E402
+    bell_state, fidelity, grover_state, open_state_dump, qft_state,
+)
+
+STATES_DIR = REPO_ROOT / "experiments" / "results" / "states"
+
+# qc_top.sv instantiates the scheduler with N_QUBITS=4 for every program
+N_QUBITS = 4
+INV_SQRT2 = 0x5A82
+Q15_ONE = 0x7FFF
+
+# phase_lut.sv: angle_id -> (cos, sin) as signed Q15
+PHASE_LUT = {
+    1: (-0x8000, 0x0000),   # pi
+    2: (0x0000, 0x7FFF),    # pi/2
+    3: (0x5A82, 0x5A82),    # pi/4
+    4: (0x7641, 0x30FB),    # pi/8
+}
+PHASE_DEFAULT = (0x7FFF, 0x0000)
+
+PAIR_OPS = (OP_H, OP_X, OP_CNOT)
+DIAG_OPS = (OP_Z, OP_CPHASE, OP_MASKPHASE)
+
+
+def wrap16(x: np.ndarray) -> np.ndarray:
+    """Truncate to a signed 16-bit value (what assigning to q15_t does)."""
+    return ((np.asarray(x, dtype=np.int64) + 0x8000) & 0xFFFF) - 0x8000
+
+
+def wrap32(x: np.ndarray) -> np.ndarray:
+    return ((np.asarray(x, dtype=np.int64) + 0x80000000) & 0xFFFFFFFF) - 0x80000000
+
+
+def gate_h(ar, ai, br, bi):
+    """gate_h.sv on int64 arrays -> (out0r, out0i, out1r, out1i)."""
+    return tuple(wrap16(((s * INV_SQRT2) >> 15)) for s in (ar + br, ai + bi, ar - br, ai - bi))
+
+
+def gate_phase(inr, ini, cos_t: int, sin_t: int):
+    """gate_phase.sv on int64 arrays."""
+    outr = wrap16(wrap32(inr * cos_t - ini * sin_t) >> 15)
+    outi = wrap16(wrap32(inr * sin_t + ini * cos_t) >> 15)
+    return outr, outi
+
+
+def _bits(idx: np.ndarray, b: int, aw: int) -> np.ndarray:
+    # is_bit_set(): qubit fields beyond the address width read as 0
+    return (idx >> b) & 1 if b < aw else np.zeros_like(idx)
+
+
+@lru_cache(maxsize=None)
+def swap_gather(aw: int, q1: int, q2: int, a0: int) -> np.ndarray:
+    """Source index of every address after one S_EXEC_SWAP pass.
+
+    Cycle k reads the addresses registered at cycle k-1 ((a0, a0) for k = 0)
+    and, if k < p(k), writes mem[k] <- b_read, mem[p(k)] <- a_read one cycle
+    later. Tracking source indices instead of values gives a permutation-like
+    map (entries may repeat) with new = old[map].
+    """
+    dim = 1 << aw
+
+    def swap_bits(x: int) -> int:
+        v1 = (x >> q1) & 1 if q1 < aw else 0
+        v2 = (x >> q2) & 1 if q2 < aw else 0
+        mask = (1 << q1 if q1 < aw else 0) | (1 << q2 if q2 < aw else 0)
+        return x ^ mask if v1 != v2 else x
+
+    mem = list(range(dim))
+    prev_a = prev_b = a0
+    pending: List[Tuple[int, int]] = []
+    for k in range(dim):
+        va, vb = mem[prev_a], mem[prev_b]
+        for addr, val in pending:
+            mem[addr] = val
+        p = swap_bits(k)
+        pending = [(k, vb), (p, va)] if k < p else []
+        prev_a, prev_b = k, p
+    for addr, val in pending:
+        mem[addr] = val
+    out = np.array(mem, dtype=np.int64)
+    out.setflags(write=False)
+    return out
+
+
+def _pair_gate(ins, re, im, aw):
+    dim = 1 << aw
+    idx = np.arange(dim)
+    t = ins.qa
+    if t < aw:
+        lo = idx[_bits(idx, t, aw) == 0]
+        hi = lo | (1 << t)
+    else:
+        lo = hi = idx  # partner() leaves the address unchanged
+    ar, ai, br, bi = re[..., lo], im[..., lo], re[..., hi], im[..., hi]
+    if ins.op == OP_H:
+        o0r, o0i, o1r, o1i = gate_h(ar, ai, br, bi)
+    elif ins.op == OP_X:
+        o0r, o0i, o1r, o1i = br, bi, ar, ai
+    else:
+        swap = _bits(lo, ins.qb, aw).astype(bool)
+        o0r, o0i = np.where(swap, br, ar), np.where(swap, bi, ai)
+        o1r, o1i = np.where(swap, ar, br), np.where(swap, ai, bi)
+    # Port B is written after port A, so it wins when lo == hi
+    re[..., lo], im[..., lo] = o0r, o0i
+    re[..., hi], im[..., hi] = o1r, o1i
+
+
+def _diag_gate(ins, re, im, aw, a0, fast=False):
+    dim = 1 << aw
+    k = np.arange(dim)
+    if ins.op == OP_Z:
+        cond = _bits(k, ins.qa, aw) == 1
+    elif ins.op == OP_CPHASE:
+        cond = (_bits(k, ins.qa, aw) & _bits(k, ins.qb, aw)) == 1
+    else:
+        width = min(aw, 4)
+        mask, match = ins.qa & ((1 << width) - 1), ins.qb & ((1 << width) - 1)
+        cond = (k & mask) == match
+    if fast:
+        # Same-cycle read-modify-write of the matching addresses only
+        src = k
+    else:
+        # Registered read address: previous cycle's index, a0 for the first one
+        src = np.concatenate(([a0], k[:-1]))
+    inr, ini = re[..., src], im[..., src]
+    if ins.op == OP_Z or (ins.op == OP_MASKPHASE and ins.angle_id == 1):
+        outr, outi = wrap16(-inr), wrap16(-ini)
+    else:
+        cos_t, sin_t = PHASE_LUT.get(ins.angle_id, PHASE_DEFAULT)
+        outr, outi = gate_phase(inr, ini, cos_t, sin_t)
+    re[...] = np.where(cond, outr, re)
+    im[...] = np.where(cond, outi, im)
+
+
+def run_words(words: List[int], n_qubits: int = N_QUBITS,
+              re: Optional[np.ndarray] = None, im: Optional[np.ndarray] = None,
+              diag_fast: bool = False) -> Tuple[np.ndarray, np.ndarray]:
+    """Execute microcode words until END.
+
+    re/im: optional initial int16 state of shape (..., 2**n_qubits); defaults
+    to the reset state (mem[0] = 0x7FFF). Returns int16 (re, im).
+    """
+    dim = 1 << n_qubits
+    if re is None:
+        re = np.zeros(dim, dtype=np.int64)
+        im = np.zeros(dim, dtype=np.int64)
+        re[0] = Q15_ONE
+    else:
+        re = np.array(re, dtype=np.int64)
+        im = np.array(im, dtype=np.int64)
+    last = dim - 1
+    a0 = 0  # idx left by the previous instruction (start resets it to 0)
+    for word in words:
+        ins = decode(word)
+        if ins.op == OP_END:
+            break
+        if ins.op in PAIR_OPS:
+            _pair_gate(ins, re, im, n_qubits)
+            a0 = 0      # the last pair cycle wraps idx to 0
+        elif ins.op in DIAG_OPS:
+            if diag_fast and ins.op != OP_Z and ins.angle_id not in PHASE_LUT:
+                a0 = 0  # identity phase: S_FETCH goes straight to S_NEXT
+                continue
+            _diag_gate(ins, re, im, n_qubits, a0, diag_fast)
+            a0 = last
+        elif ins.op == OP_SWAP:
+            src = swap_gather(n_qubits, ins.qa, ins.qb, a0)
+            re, im = re[..., src], im[..., src]
+            a0 = last
+        else:
+            a0 = 0      # NOP: S_FETCH zeroes idx
+    return re.astype(np.int16), im.astype(np.int16)
+
+
+def run_prog(prog: str, rom: Optional[Dict[str, List[int]]] = None,
+             diag_fast: bool = False) -> Tuple[np.ndarray, np.ndarray]:
+    rom = rom if rom is not None else load_rom()
+    if prog not in rom:
+        raise KeyError(f"program {prog!r} is not in the microcode ROM")
+    return run_words(rom[prog], diag_fast=diag_fast)
+
+
+def to_complex(re: np.ndarray, im: np.ndarray) -> np.ndarray:
+    """q15_to_float of qc_tb.cpp (v / 32768) as complex64."""
+    return (re.astype(np.float32) / np.float32(32768.0)) + 1j * (im.astype(np.float32) / np.float32(32768.0))
+
+
+def tb_csv_lines(re: np.ndarray, im: np.ndarray, n: int) -> List[str]:
+    """The exact text qc_tb.cpp writes for +dump_state=1 (header included).
+
+    The TB normalises the first 2**n entries: float amplitudes, a double
+    sum of float |amp|^2, then float(amp * scale) printed with %.9f.
+    """
+    dim_n = 1 << n
+    fr = re[:dim_n].astype(np.float32) / np.float32(32768.0)
+    fi = im[:dim_n].astype(np.float32) / np.float32(32768.0)
+    l2 = float(np.sum((fr * fr + fi * fi).astype(np.float32), dtype=np.float64))
+    scale = 1.0 / np.sqrt(l2) if l2 > 0.0 else 1.0
+    out_r = (fr.astype(np.float64) * scale).astype(np.float32)
+    out_i = (fi.astype(np.float64) * scale).astype(np.float32)
+    lines = ["index,re,im"]
+    for i in range(dim_n):
+        lines.append(f"{i},{float(out_r[i]):.9f},{float(out_i[i]):.9f}")
+    return lines
+
+
+def prog_qubits(prog: str) -> int:
+    digits = ""
+    for c in reversed(prog):
+        if not c.isdigit():
+            break
+        digits = c + digits
+    n = int(digits) if digits else N_QUBITS
+    return n if 0 < n <= N_QUBITS else N_QUBITS
+
+
+def ideal_state(prog: str, n: int) -> Optional[np.ndarray]:
+    if prog.startswith("qft"):
+        return qft_state(n)
+    if prog.startswith("grover"):
+        return grover_state(n, marked=(1 << n) - 1)
+    if prog == "bell2":
+        return bell_state()
+    return None
+
+
+def predict_fidelity(prog: str, rom: Optional[Dict[str, List[int]]] = None,
+                     diag_fast: bool = False) -> Optional[float]:
+    """Fidelity the TB would report for prog, from the emulated int16 state."""
+    n = prog_qubits(prog)
+    ideal = ideal_state(prog, n)
+    if ideal is None:
+        return None
+    vec = to_complex(*run_prog(prog, rom, diag_fast))[: 1 << n].astype(np.complex128)
+    norm = np.linalg.norm(vec)
+    if norm == 0.0:
+        return 0.0
+    return fidelity(vec / norm, ideal)
+
+
+def validate(states_dir: Path = STATES_DIR, diag_fast: bool = False) -> List[Dict[str, object]]:
+    """Compare emulated dumps with every <prog>_fpga_q<n>.bin/.csv in states_dir."""
+    rom = load_rom()
+    results = []
+    for prog in rom:
+        n = prog_qubits(prog)
+        for path in (Path(states_dir) / f"{prog}_fpga_q{n}.bin", Path(states_dir) / f"{prog}_fpga_q{n}.csv"):
+            if not path.exists():
+                continue
+            t0 = time.perf_counter()
+            re, im = run_prog(prog, rom, diag_fast)
+            if path.suffix == ".bin":
+                # Raw state memory: every mismatched amplitude counts
+                emulated = np.stack([re[: 1 << n], im[: 1 << n]], axis=1)
+                elapsed = time.perf_counter() - t0
+                dumped = open_state_dump(path).data
+                if dumped.shape == emulated.shape:
+                    mismatches = int(np.count_nonzero(np.any(dumped != emulated, axis=1)))
+                else:
+                    mismatches = max(len(dumped), len(emulated))
+            else:
+                lines = tb_csv_lines(re, im, n)
+                elapsed = time.perf_counter() - t0
+                dumped = path.read_text().splitlines()
+                mismatches = sum(1 for a, b in zip(lines, dumped) if a != b) + abs(len(lines) - len(dumped))
+            results.append({"prog": prog, "n": n, "path": path, "exact": mismatches == 0,
+                            "mismatched_lines": mismatches, "ms": elapsed * 1000.0,
+                            "fidelity": predict_fidelity(prog, rom, diag_fast)})
+    return results
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--states-dir", type=Path, default=STATES_DIR,
+                    help="Directory of TB state dumps to validate against")
+    ap.add_argument("--prog", help="Print the emulated int16 state of one program instead")
+    ap.add_argument("--diag-fast", action="store_true",
+                    help="Model a core built with -GDIAG_FAST=1 (dumps must come from that build)")
+    args = ap.parse_args()
+
+    if args.prog:
+        re, im = run_prog(args.prog, diag_fast=args.diag_fast)
+        for i, (r, m) in enumerate(zip(re.tolist(), im.tolist())):
+            print(f"{i:3d}  re={r:7d}  im={m:7d}")
+        return 0
+
+    results = validate(args.states_dir, args.diag_fast)
+    if not results:
+        print(f"[q15] no dumps found under {args.states_dir}")
+        return 1
+    for r in results:
+        status = "exact" if r["exact"] else f"MISMATCH ({r['mismatched_lines']} lines)"
+        fid = "nan" if r["fidelity"] is None else f"{r['fidelity']:.6f}"
+        print(f"[q15] {r['prog']:8s} n={r['n']} {status:12s} fidelity={fid} "
+              f"{r['ms']:.3f} ms  vs {r['path'].name}")
+    return 0 if all(r["exact"] for r in results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
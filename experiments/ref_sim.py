@@ -3,27 +3,77 @@
 
 Exports:
   - qft_state(n) -> complex128 state of length 2**n (QFT(|0..0>)).
+  - qft_states(n, inputs=None) -> complex128 (batch, 2**n) array, row b is the
+    QFT circuit applied to basis state inputs[b] (default: all 2**n inputs,
+    which gives the full circuit unitary with U[:, x] == qft_states(n)[x]).
   - grover_state(n, marked=None) -> complex128 after one Grover iteration
     with default marked index (2**n - 1).
   - fidelity(a, b) -> |<a|b>|^2 assuming both normalized.
   - l2_err(a, b) -> L2 norm of a-b.
   - load_fpga_csv(path, lsb_first=True, n=None) -> normalized complex128
-    vector parsed from testbench CSV dumps (index,re,im).
+    vector parsed from testbench CSV dumps (index,re,im); read_fpga_csv()
+    returns (vector, raw norm) from the same single parse.
+  - open_state_dump(path) -> StateDump whose .data is a read-only memmap of
+    a binary testbench dump; load_state_dump(path) -> normalized complex128,
+    read_state_dump(path) -> (vector, raw norm).
+  - read_state(path, n=None) -> (vector, raw norm) for either dump format.
+  - bit_reverse_permutation(n) -> cached int64 index table, rev[i] is i with
+    its n bits reversed.
+  - AnalyticState / analytic_reference(prog, n) -> closed-form reference
+    (one value everywhere plus a few corrections) for qftN, groverN, bell2;
+    qft_basis_reference(n, x) -> chunk generator for QFT|x>.
+  - stream_metrics(state, reference, chunk=STREAM_CHUNK) -> fidelity, l2_err
+    and raw norm of a dump, memmap or array against a reference, reading
+    the state in chunks with constant extra memory; reports amplitudes/s.
+  - bench_loaders(n=20) -> load times of synthetic 2**n-entry CSV and binary
+    dumps (`python3 experiments/ref_sim.py --bench-qubits 20`);
+    bench_stream(n) -> stream_metrics on a synthetic 2**n Q15 dump
+    (`--bench-stream-qubits 30`). `--metrics DUMP --ref PROG` scores a dump.
+  - write_state_dump(path, data, ...) / state_dump_to_csv(path, out) write
+    the binary format and export it as index,re,im CSV.
 
 Notes:
   - QFT(|0>) is the uniform superposition; the optional bit-reversal at
     the end has no effect for |0>, so qft_state() is simply uniform.
+  - The QFT circuit (cpu_baseline/circuits/qft.py and the microcode ROM)
+    treats qubit 0 as the most significant bit of the Fourier index, so for
+    input x the output amplitude at k is exp(2*pi*i*rev(x)*rev(k)/N)/sqrt(N),
+    rev being n-bit reversal.
   - For Grover we apply: H^{\otimes n} -> oracle -> diffusion, once.
+  - Binary dumps (<prog>_fpga_q<n>.bin, _pipe/_diag before the extension
+    for the scheduler variants) are a 24-byte little-endian header
+    (STATE_HEADER: magic, version, kind, order, n, count, scale) followed
+    by count amplitudes, either raw int16 Q15 (re, im) pairs as read from
+    the state memory (kind 0, scale 2**-15) or complex64 (kind 1).
+    amplitude = stored value * scale; unlike the CSV they are not normalized.
 """
 from __future__ import annotations
 
-import csv
+import argparse
 import math
+import re
+import tempfile
+import time
+import warnings
+from functools import lru_cache
 from pathlib import Path
-from typing import Optional
+from typing import Callable, Dict, Iterator, NamedTuple, Optional, Tuple, Union
 
 import numpy as np
 
+STATE_MAGIC = b"QCST"
+STATE_VERSION = 1
+STATE_KIND_Q15 = 0
+STATE_KIND_F32 = 1
+STATE_ORDER_LSB = 0  # index bit 0 is qubit 0
+STATE_ORDER_MSB = 1
+# Amplitudes per block in stream_metrics (16 MiB of complex128)
+STREAM_CHUNK = 1 << 20
+STATE_HEADER = np.dtype([
+    ("magic", "S4"), ("version", "<u2"), ("kind", "u1"), ("order", "u1"),
+    ("n", "<u4"), ("count", "<u4"), ("scale", "<f8"),
+])
+
 
 def qft_state(n: int) -> np.ndarray:
     if n < 1:
@@ -34,6 +84,19 @@ def qft_state(n: int) -> np.ndarray:
     return vec
 
 
+def qft_states(n: int, inputs=None) -> np.ndarray:
+    if n < 1:
+        raise ValueError("n must be >= 1")
+    N = 1 << n
+    x = np.arange(N) if inputs is None else np.asarray(inputs, dtype=np.int64).reshape(-1)
+    if x.size and (x.min() < 0 or x.max() >= N):
+        raise ValueError("input index out of range")
+    rev = bit_reverse_permutation(n)
+    # Phases reduced mod N in integers keep the exponent exact for large n
+    k = (rev[x][:, None] * rev[None, :]) % N
+    return np.exp(2j * np.pi * k / N) / math.sqrt(N)
+
+
 def grover_state(n: int, marked: Optional[int] = None) -> np.ndarray:
     if n < 1:
         raise ValueError("n must be >= 1")
@@ -86,62 +149,448 @@ def bell_state() -> np.ndarray:
     return v
 
 
-def _bit_reverse(i: int, n: int) -> int:
-    r = 0
-    for _ in range(n):
-        r = (r << 1) | (i & 1)
-        i >>= 1
-    return r
+@lru_cache(maxsize=None)
+def bit_reverse_permutation(n: int) -> np.ndarray:
+    """rev[i] = i with its n low bits reversed (read-only, cached per n)."""
+    rev = np.zeros(1, dtype=np.int64)
+    # Doubling: the reversal of 2i + b on k+1 bits is rev_k(i) + b * 2**k
+    for k in range(n):
+        rev = np.stack((rev, rev + (1 << k)), axis=1).ravel()
+    rev.setflags(write=False)
+    return rev
 
 
-def load_fpga_csv(path: str | Path, lsb_first: bool = True, n: Optional[int] = None) -> np.ndarray:
-    """Load CSV dumps produced by the TB and return a normalized vector.
+def _parse_csv_columns(path: Path) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """(index, re, im) arrays of an index,re,im dump, in one NumPy parse."""
+    with path.open() as f:
+        header = f.readline()
+        body = f.read()
+    names = [c.strip() for c in header.split(",")]
+    try:
+        cols = [names.index(c) for c in ("index", "re", "im")]
+    except ValueError:
+        # No recognised header: the first line is data
+        cols, body = [0, 1, 2], header + body
+    width = len(names)
+    rows = body.count("\n") + (0 if body.endswith("\n") or not body else 1)
+    try:
+        with warnings.catch_warnings():
+            # A malformed field is a ValueError (older NumPy: DeprecationWarning)
+            warnings.simplefilter("error", DeprecationWarning)
+            values = np.fromstring(body.replace("\n", ","), dtype=np.float64, sep=",") if rows else np.zeros(0)
+    except (ValueError, DeprecationWarning):
+        values = None
+    if values is not None and values.size == rows * width:
+        table = values.reshape(rows, width)
+    else:
+        # Blank or malformed rows: let genfromtxt skip them
+        table = np.genfromtxt(body.splitlines(), delimiter=",", invalid_raise=False, ndmin=2)
+        table = table[~np.isnan(table[:, cols]).any(axis=1)] if table.shape[1] >= width else np.zeros((0, width))
+    return table[:, cols[0]].astype(np.int64), table[:, cols[1]], table[:, cols[2]]
 
-    CSV format: header 'index,re,im' followed by rows.
-    If n is provided and lsb_first is False, indices are bit-reversed across n bits.
+
+def read_fpga_csv(path: str | Path, lsb_first: bool = True, n: Optional[int] = None) -> Tuple[np.ndarray, float]:
+    """(normalized complex128 vector, raw norm) of a CSV dump, parsed once.
+
+    The raw norm is the L2 norm of every parsed row before normalization,
+    as the bench reports it in the hw_norm column.
     """
     p = Path(path)
     if not p.exists():
         raise FileNotFoundError(p)
+    idx, re, im = _parse_csv_columns(p)
+    if idx.size == 0:
+        return np.zeros(0, dtype=np.complex128), 0.0
+    raw_norm = math.sqrt(float(np.dot(re, re) + np.dot(im, im)))
 
-    rows = []
-    with p.open() as f:
-        reader = csv.DictReader(f)
-        for row in reader:
-            try:
-                idx = int(row.get("index", ""))
-                re = float(row.get("re", "0"))
-                im = float(row.get("im", "0"))
-                rows.append((idx, re, im))
-            except Exception:
-                continue
-
-    if not rows:
-        return np.zeros(0, dtype=np.complex128)
-
-    max_idx = max(idx for idx, _, _ in rows)
     if n is None:
         # Smallest n such that 2**n > max_idx
-        n = max(1, int(math.ceil(math.log2(max_idx + 1))))
+        n = max(1, int(idx.max()).bit_length())
     N = 1 << n
+    keep = (idx >= 0) & (idx < N)
+    idx, amps = idx[keep], re[keep] + 1j * im[keep]
+    if not lsb_first:
+        idx = bit_reverse_permutation(n)[idx]
     vec = np.zeros(N, dtype=np.complex128)
-
-    for idx, re, im in rows:
-        if idx < 0 or idx >= N:
-            continue
-        j = idx
-        if not lsb_first and n is not None:
-            j = _bit_reverse(idx, n)
-        vec[j] = complex(re, im)
+    vec[idx] = amps
 
     # Normalize
     norm = np.linalg.norm(vec)
     if norm > 0:
         vec = vec / norm
+    return vec, raw_norm
+
+
+def load_fpga_csv(path: str | Path, lsb_first: bool = True, n: Optional[int] = None) -> np.ndarray:
+    """Load CSV dumps produced by the TB and return a normalized vector.
+
+    CSV format: header 'index,re,im' followed by rows.
+    If n is provided and lsb_first is False, indices are bit-reversed across n bits.
+    """
+    return read_fpga_csv(path, lsb_first, n)[0]
+
+
+class StateDump(NamedTuple):
+    n: int
+    lsb_first: bool
+    scale: float
+    data: np.ndarray  # (count, 2) int16 Q15 pairs or (count,) complex64, memmapped
+
+
+def write_state_dump(path: str | Path, data: np.ndarray, n: Optional[int] = None, lsb_first: bool = True,
+                     scale: Optional[float] = None) -> Path:
+    """Write data in the testbench's binary dump format.
+
+    data is either an (N, 2) int16 array of Q15 (re, im) pairs or a complex
+    vector, stored as complex64. n defaults to log2(N).
+    """
+    arr = np.asarray(data)
+    if arr.dtype == np.int16 and arr.ndim == 2 and arr.shape[1] == 2:
+        kind, payload = STATE_KIND_Q15, np.ascontiguousarray(arr, dtype="<i2")
+        scale = 1.0 / 32768.0 if scale is None else scale
+    else:
+        kind, payload = STATE_KIND_F32, np.ascontiguousarray(arr.reshape(-1), dtype="<c8")
+        scale = 1.0 if scale is None else scale
+    count = payload.shape[0]
+    if n is None:
+        n = max(1, (count - 1).bit_length())
+    header = np.array([(STATE_MAGIC, STATE_VERSION, kind, STATE_ORDER_LSB if lsb_first else STATE_ORDER_MSB,
+                        n, count, scale)], dtype=STATE_HEADER)
+    p = Path(path)
+    with p.open("wb") as f:
+        f.write(header.tobytes())
+        payload.tofile(f)
+    return p
+
+
+def open_state_dump(path: str | Path) -> StateDump:
+    """Map a binary dump without reading or copying its payload."""
+    p = Path(path)
+    header = np.fromfile(p, dtype=STATE_HEADER, count=1)
+    if header.size != 1 or header["magic"][0] != STATE_MAGIC:
+        raise ValueError(f"{p} is not a binary state dump")
+    h = header[0]
+    if int(h["version"]) != STATE_VERSION:
+        raise ValueError(f"{p}: unsupported state dump version {int(h['version'])}")
+    kind, count = int(h["kind"]), int(h["count"])
+    if kind == STATE_KIND_Q15:
+        dtype, shape = np.dtype("<i2"), (count, 2)
+    elif kind == STATE_KIND_F32:
+        dtype, shape = np.dtype("<c8"), (count,)
+    else:
+        raise ValueError(f"{p}: unknown state dump kind {kind}")
+    if p.stat().st_size < STATE_HEADER.itemsize + count * dtype.itemsize * (shape[1] if len(shape) > 1 else 1):
+        raise ValueError(f"{p}: truncated state dump ({count} entries expected)")
+    data = np.memmap(p, dtype=dtype, mode="r", offset=STATE_HEADER.itemsize, shape=shape)
+    return StateDump(int(h["n"]), int(h["order"]) == STATE_ORDER_LSB, float(h["scale"]), data)
+
+
+def state_dump_amplitudes(dump: StateDump) -> np.ndarray:
+    """Unnormalized complex128 amplitudes of a dump, in its stored order."""
+    if dump.data.ndim == 2:
+        vec = dump.data[:, 0] * dump.scale + 1j * (dump.data[:, 1] * dump.scale)
+    else:
+        vec = dump.data.astype(np.complex128) * dump.scale
     return vec
 
 
+def read_state_dump(path: str | Path, lsb_first: bool = True) -> Tuple[np.ndarray, float]:
+    """(normalized complex128 vector, raw norm) of a binary dump, LSB-first order.
+
+    The dump's own order field is honoured; pass lsb_first=False to get the
+    bit-reversed (MSB-first) order instead. Reordering reverses the header's
+    n bits, so a partial dump (count < 2**n) comes back as the full 2**n
+    vector with the missing entries zero, as read_fpga_csv does.
+    """
+    dump = open_state_dump(path)
+    vec = state_dump_amplitudes(dump)
+    if dump.lsb_first != lsb_first:
+        N = 1 << dump.n
+        if vec.size > N:
+            raise ValueError(f"{path}: {vec.size} entries do not fit n={dump.n}")
+        out = np.zeros(N, dtype=np.complex128)
+        out[bit_reverse_permutation(dump.n)[: vec.size]] = vec
+        vec = out
+    norm = float(np.linalg.norm(vec))
+    if norm > 0:
+        vec = vec / norm
+    return vec, norm
+
+
+def load_state_dump(path: str | Path, lsb_first: bool = True) -> np.ndarray:
+    """Load a binary dump as a normalized complex128 vector."""
+    return read_state_dump(path, lsb_first)[0]
+
+
+def read_state(path: str | Path, n: Optional[int] = None) -> Tuple[np.ndarray, float]:
+    """(normalized vector, raw norm) of a .bin dump or an index,re,im CSV."""
+    if Path(path).suffix == ".bin":
+        return read_state_dump(path)
+    return read_fpga_csv(path, lsb_first=True, n=n)
+
+
+def state_dump_to_csv(path: str | Path, out: str | Path) -> Path:
+    """Export a binary dump as the testbench's normalized index,re,im CSV."""
+    vec = load_state_dump(path)
+    out = Path(out)
+    with out.open("w") as f:
+        f.write("index,re,im\n")
+        for i, amp in enumerate(vec.astype(np.complex64)):
+            f.write(f"{i},{float(amp.real):.9f},{float(amp.imag):.9f}\n")
+    return out
+
+
+class AnalyticState(NamedTuple):
+    """Closed-form state: amp[k] = base + deltas.get(k, 0) on 2**n entries."""
+    n: int
+    base: complex
+    deltas: Dict[int, complex]
+
+    def chunk(self, idx: np.ndarray) -> np.ndarray:
+        out = np.full(idx.shape, self.base, dtype=np.complex128)
+        for k, d in self.deltas.items():
+            out[idx == k] += d
+        return out
+
+    def norm2(self) -> float:
+        extra = sum(abs(self.base + d) ** 2 - abs(self.base) ** 2 for d in self.deltas.values())
+        return float((1 << self.n) * abs(self.base) ** 2 + extra)
+
+
+def analytic_reference(prog: str, n: int) -> Optional[AnalyticState]:
+    """Closed form of the ideal state for qftN (uniform), groverN and bell2."""
+    N = 1 << n
+    s = 1.0 / math.sqrt(N)
+    if prog.startswith("qft"):
+        return AnalyticState(n, complex(s), {})
+    if prog.startswith("grover"):
+        # One iteration from uniform: unmarked s(N-4)/N, marked s(3N-4)/N
+        unmarked, marked = s * (N - 4) / N, s * (3 * N - 4) / N
+        return AnalyticState(n, complex(unmarked), {N - 1: complex(marked - unmarked)})
+    if prog == "bell2":
+        return AnalyticState(2, 0j, {0: complex(math.sqrt(0.5)), 3: complex(math.sqrt(0.5))})
+    return None
+
+
+def _bit_reverse_indices(idx: np.ndarray, n: int) -> np.ndarray:
+    """n-bit reversal of arbitrary indices without a 2**n table.
+
+    Each 16-bit piece goes through bit_reverse_permutation(16), shifted down
+    to its width and across to its mirrored position.
+    """
+    table = bit_reverse_permutation(16)
+    rev = np.zeros_like(idx)
+    for lo in range(0, n, 16):
+        width = min(16, n - lo)
+        piece = (idx >> lo) & ((1 << width) - 1)
+        rev |= (table[piece] >> (16 - width)) << (n - lo - width)
+    return rev
+
+
+def qft_basis_reference(n: int, x: int) -> Callable[[np.ndarray], np.ndarray]:
+    """Chunk generator for the QFT circuit on |x>: row x of qft_states(n)."""
+    N = 1 << n
+    rx = int(_bit_reverse_indices(np.array([x], dtype=np.int64), n)[0])
+
+    def chunk(idx: np.ndarray) -> np.ndarray:
+        k = (rx * _bit_reverse_indices(idx, n)) % N
+        return np.exp(2j * np.pi * k / N) / math.sqrt(N)
+    return chunk
+
+
+Reference = Union[AnalyticState, Callable[[np.ndarray], np.ndarray]]
+
+
+def _state_blocks(state, chunk: int) -> Tuple[int, bool, Iterator[Tuple[int, np.ndarray]]]:
+    """(n, lsb_first, iterator of (start, complex128 block)) over a state source.
+
+    Only one block is converted at a time; Q15 dumps are scaled per block.
+    """
+    if isinstance(state, (str, Path)) and Path(state).suffix != ".bin":
+        vec, raw = read_fpga_csv(state)
+        state = vec * raw
+    if isinstance(state, (str, Path, StateDump)):
+        dump = open_state_dump(state) if not isinstance(state, StateDump) else state
+        path = None if isinstance(state, StateDump) else Path(state)
+        count = dump.data.shape[0]
+
+        def blocks():
+            # Paths are read with plain file reads so that resident memory stays
+            # one block; a caller's memmap is sliced (its pages stay cached)
+            f = path.open("rb") if path is not None else None
+            try:
+                if f is not None:
+                    f.seek(STATE_HEADER.itemsize)
+                for start in range(0, count, chunk):
+                    if f is not None:
+                        size = min(chunk, count - start) * (dump.data.size // max(count, 1))
+                        part = np.fromfile(f, dtype=dump.data.dtype, count=size).reshape((-1,) + dump.data.shape[1:])
+                    else:
+                        part = dump.data[start:start + chunk]
+                    if part.ndim == 2:
+                        yield start, part[:, 0] * dump.scale + 1j * (part[:, 1] * dump.scale)
+                    else:
+                        yield start, part.astype(np.complex128) * dump.scale
+            finally:
+                if f is not None:
+                    f.close()
+        return dump.n, dump.lsb_first, blocks()
+    arr = np.asarray(state).reshape(-1)
+    n = max(1, (arr.size - 1).bit_length())
+    return n, True, ((start, arr[start:start + chunk].astype(np.complex128)) for start in range(0, arr.size, chunk))
+
+
+def stream_metrics(state, reference: Reference, chunk: int = STREAM_CHUNK) -> Dict[str, float]:
+    """fidelity and l2_err of the normalized state against reference, in one pass.
+
+    state is a dump path, StateDump, memmap or array, read chunk amplitudes
+    at a time. reference is an AnalyticState (used through its closed form:
+    only sum(state), |state|^2 and the state at the corrected indices are
+    accumulated) or a callable mapping LSB-first indices to reference
+    amplitudes, generated per chunk. The results equal fidelity() and
+    l2_err() of the normalized vector against the materialized reference,
+    without ever holding either in memory.
+    """
+    t0 = time.perf_counter()
+    n, lsb_first, blocks = _state_blocks(state, chunk)
+    analytic = isinstance(reference, AnalyticState)
+    if analytic and reference.n != n:
+        raise ValueError(f"reference has {reference.n} qubits, state has {n}")
+    # Stored position of each corrected index (they differ for MSB-first dumps)
+    sparse = {}
+    if analytic:
+        for k in reference.deltas:
+            pos = k if lsb_first else int(_bit_reverse_indices(np.array([k], dtype=np.int64), n)[0])
+            sparse[pos] = k
+
+    norm2, total, overlap, ref2, count = 0.0, 0j, 0j, 0.0, 0
+    for start, v in blocks:
+        count += v.size
+        norm2 += float(np.vdot(v, v).real)
+        if analytic:
+            total += complex(v.sum())
+            for pos, k in sparse.items():
+                if start <= pos < start + v.size:
+                    overlap += np.conj(reference.deltas[k]) * v[pos - start]
+        else:
+            idx = np.arange(start, start + v.size, dtype=np.int64)
+            r = reference(idx if lsb_first else _bit_reverse_indices(idx, n))
+            overlap += complex(np.vdot(r, v))
+            ref2 += float(np.vdot(r, r).real)
+    if analytic:
+        overlap += np.conj(reference.base) * total
+        ref2 = reference.norm2()
+
+    raw_norm = math.sqrt(norm2)
+    ov = overlap / raw_norm if raw_norm > 0 else 0j
+    seconds = time.perf_counter() - t0
+    return {
+        "fidelity": float(abs(ov) ** 2),
+        "l2_err": math.sqrt(max(0.0, (1.0 if raw_norm > 0 else 0.0) + ref2 - 2.0 * ov.real)),
+        "raw_norm": raw_norm,
+        "amplitudes": count,
+        "seconds": seconds,
+        "amps_per_s": count / seconds if seconds > 0 else float("inf"),
+    }
+
+
+def bench_loaders(n: int = 20, repeat: int = 3) -> dict:
+    """Best-of-repeat load times (s) of synthetic 2**n-entry dumps in each format."""
+    rng = np.random.default_rng(0)
+    N = 1 << n
+    vec = rng.standard_normal(N) + 1j * rng.standard_normal(N)
+    vec /= np.linalg.norm(vec)
+    pairs = np.round(np.stack([vec.real, vec.imag], axis=1) * 32767.0).astype(np.int16)
+    out = {"n": n}
+    with tempfile.TemporaryDirectory() as tmp:
+        csv_path = Path(tmp) / "state.csv"
+        with csv_path.open("w") as f:
+            f.write("index,re,im\n")
+            np.savetxt(f, np.column_stack([np.arange(N), vec.real, vec.imag]), fmt=["%d", "%.9f", "%.9f"], delimiter=",")
+        bin_path = write_state_dump(Path(tmp) / "state.bin", pairs, n=n)
+        out["csv_mb"] = csv_path.stat().st_size / 1e6
+        out["bin_mb"] = bin_path.stat().st_size / 1e6
+        cases = {
+            "csv": lambda: read_fpga_csv(csv_path, n=n),
+            "csv_bitrev": lambda: read_fpga_csv(csv_path, lsb_first=False, n=n),
+            "bin": lambda: read_state_dump(bin_path),
+        }
+        for name, fn in cases.items():
+            best = float("inf")
+            for _ in range(repeat):
+                t0 = time.perf_counter()
+                fn()
+                best = min(best, time.perf_counter() - t0)
+            out[f"{name}_s"] = best
+    return out
+
+
+def bench_stream(n: int = 26, chunk: int = STREAM_CHUNK, directory: Optional[Path] = None) -> Dict[str, float]:
+    """stream_metrics of a synthetic noisy 2**n QFT(|0>) Q15 dump vs the closed form.
+
+    The dump is written block by block, so neither step holds the state.
+    """
+    N = 1 << n
+    rng = np.random.default_rng(0)
+    amp = 32768.0 / math.sqrt(N)
+    with tempfile.TemporaryDirectory(dir=directory) as tmp:
+        path = Path(tmp) / "state.bin"
+        header = np.array([(STATE_MAGIC, STATE_VERSION, STATE_KIND_Q15, STATE_ORDER_LSB, n, N, 1.0 / 32768.0)],
+                          dtype=STATE_HEADER)
+        with path.open("wb") as f:
+            f.write(header.tobytes())
+            for start in range(0, N, chunk):
+                size = min(chunk, N - start)
+                # Round(amp + noise) would be 0 for large n; dither keeps the mean
+                block = np.stack([amp + rng.standard_normal(size), rng.standard_normal(size)], axis=1)
+                np.floor(block + rng.random((size, 2))).astype("<i2").tofile(f)
+        result = stream_metrics(path, analytic_reference(f"qft{n}", n), chunk)
+    return result
+
+
 if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--bench-qubits", type=int, default=0,
+                    help="Time the dump loaders on synthetic 2**n-entry dumps instead of the self-checks")
+    ap.add_argument("--bench-stream-qubits", type=int, default=0,
+                    help="Time stream_metrics on a synthetic 2**n-entry Q15 dump (written to a temp dir)")
+    ap.add_argument("--metrics", type=Path, help="Score this .bin/.csv dump with stream_metrics")
+    ap.add_argument("--ref", help="Ideal state for --metrics: qftN, groverN or bell2 (default: from the file name)")
+    args = ap.parse_args()
+    if args.metrics or args.bench_stream_qubits:
+        if args.metrics:
+            name = args.ref or args.metrics.stem.split("_")[0]
+            # n from the binary header, else from the TB's <prog>_fpga_q<n>[_pipe][_diag] file name
+            named = re.search(r"_q(\d+)(?:_pipe)?(?:_diag)?$", args.metrics.stem)
+            if args.metrics.suffix == ".bin":
+                n = open_state_dump(args.metrics).n
+            elif named:
+                n = int(named.group(1))
+            else:
+                raise SystemExit(f"[ref_sim] cannot tell n from {args.metrics.name!r} (expected <prog>_fpga_q<n>.csv)")
+            ref = analytic_reference(name, n)
+            if ref is None:
+                raise SystemExit(f"[ref_sim] no closed-form reference for {name!r}")
+            m = stream_metrics(args.metrics, ref)
+        else:
+            m = bench_stream(args.bench_stream_qubits)
+        try:
+            import resource
+            rss = f", peak RSS {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:.0f} MiB"
+        except ImportError:
+            rss = ""
+        print(f"[ref_sim] stream {m['amplitudes']} amplitudes: fidelity={m['fidelity']:.6f} "
+              f"l2={m['l2_err']:.6f} hw_norm={m['raw_norm']:.6f} in {m['seconds']:.2f} s "
+              f"({m['amps_per_s'] / 1e6:.1f} Mamp/s{rss})")
+        raise SystemExit(0)
+    if args.bench_qubits:
+        r = bench_loaders(args.bench_qubits)
+        N = 1 << r["n"]
+        for name, size in (("csv", r["csv_mb"]), ("csv_bitrev", r["csv_mb"]), ("bin", r["bin_mb"])):
+            print(f"[ref_sim] load {name:10s} 2^{r['n']}: {r[name + '_s'] * 1e3:8.1f} ms "
+                  f"({N / r[name + '_s'] / 1e6:6.1f} Mamp/s, {size:.1f} MB)")
+        raise SystemExit(0)
+
     # Tiny self-checks
     for n in (2, 3):
         q = qft_state(n)
@@ -150,6 +599,10 @@ if __name__ == "__main__":
         # Uniform amplitudes
         amps = np.abs(q) ** 2
         assert np.allclose(amps, np.ones_like(amps) / (1 << n), atol=1e-12)
+        # Batched form: row 0 is qft_state, and all inputs give a unitary
+        u = qft_states(n)
+        assert np.allclose(u[0], q, atol=1e-12)
+        assert np.allclose(u @ u.conj().T, np.eye(1 << n), atol=1e-12)
 
     # Grover checks
     g2 = grover_state(2, marked=3)
@@ -161,4 +614,16 @@ if __name__ == "__main__":
     g3 = grover_state(3)
     assert g3.shape == (8,)
     assert np.isclose(np.linalg.norm(g3), 1.0, atol=1e-12)
+
+    # Binary dump round trip: Q15 pairs are memmapped, not copied
+    with tempfile.TemporaryDirectory() as tmp:
+        pairs = np.array([[16384, 0], [0, -16384], [0, 0], [-16384, 16384]], dtype=np.int16)
+        dump = open_state_dump(write_state_dump(Path(tmp) / "s.bin", pairs))
+        assert isinstance(dump.data, np.memmap) and dump.n == 2 and np.array_equal(dump.data, pairs)
+        v = load_state_dump(Path(tmp) / "s.bin")
+        assert np.allclose(v, (pairs[:, 0] + 1j * pairs[:, 1]) / np.linalg.norm(pairs), atol=1e-12)
+        state_dump_to_csv(Path(tmp) / "s.bin", Path(tmp) / "s.csv")
+        assert np.allclose(load_fpga_csv(Path(tmp) / "s.csv"), v, atol=1e-8)
+        rv, raw = read_fpga_csv(Path(tmp) / "s.csv", lsb_first=False, n=2)
+        assert np.isclose(raw, 1.0, atol=1e-8) and np.allclose(rv[bit_reverse_permutation(2)], v, atol=1e-8)
     print("[ref_sim] basic self-checks passed")
@@ -1,23 +1,53 @@
 #!/usr/bin/env python3
-"""Run FPGA simulator and CPU reference benchmarks and collect results."""
+"""Run FPGA simulator and CPU reference benchmarks and collect results.
+
+Runs are incremental: every row stores an fpga_key and a cpu_key hashing
+(prog, engine, source/build hash, host, parameters), and a stored part whose
+key matches the current configuration is reused instead of re-measured
+(--force re-runs everything). Rows for other programs or hosts are kept.
+
+Jobs run under one asyncio scheduler: Verilator batches and fidelity
+computations run concurrently (--jobs, --job-timeout) on every core but the
+reserved one, while CPU timing jobs run one at a time pinned to the reserved
+core (--cpu-core). Rows and the per-program summary lines are emitted in
+program order once all jobs finish, so stdout and the CSV do not depend on
+completion order; job progress goes to stderr.
+
+Every simulated program also runs on the scheduler variants in
+FPGA_VARIANTS, whose cycle counts go to fpga_cycles_<variant>: -GPIPELINE=1
+(pipelined pair ops) to fpga_cycles_pipe and -GDIAG_FAST=1 (diagonal ops on
+matching addresses only) to fpga_cycles_diag. Each variant's own state dump
+(<prog>_fpga_q<n>_<variant>) is scored into fidelity_<variant>,
+l2_err_<variant> and hw_norm_<variant>: DIAG_FAST also drops the default
+core's one-cycle-late diagonal read, so its final states differ.
+fpga_cycles/fpga_us and the unsuffixed fidelity columns are those of the
+default build. fpga_qubits is the N_QUBITS the model was built with
+(qubits= in the TB's [RUN] records, e.g. 5 under --vflags=-GN_QUBITS=5).
+"""
 from __future__ import annotations
 
 import argparse
+import asyncio
 import csv
 import datetime as dt
+import hashlib
+import inspect
 import os
 import platform
 import re
+import signal
 import subprocess
 import sys
+import time
 from pathlib import Path
-from typing import Dict, List, Optional, Tuple
+from typing import Dict, List, Optional, Set, Tuple
 import math
 import numpy as np
 
 REPO_ROOT = Path(__file__).resolve().parent.parent
 FPGA_CORE_DIR = REPO_ROOT / "fpga_core"
 CPU_REF = REPO_ROOT / "cpu_ref" / "run_cpu.py"
+REF_SIM = REPO_ROOT / "experiments" / "ref_sim.py"
 RESULTS_DIR = REPO_ROOT / "experiments" / "results"
 LOG_DIR = RESULTS_DIR / "logs"
 WAVE_DIR = RESULTS_DIR / "waves"
@@ -28,19 +58,18 @@ if str(REPO_ROOT) not in sys.path:
     sys.path.insert(0, str(REPO_ROOT))
 try:
     from experiments.ref_sim import (
-        qft_state as ref_qft_state,
-        grover_state as ref_grover_state,
-        fidelity as ref_fidelity,
-        l2_err as ref_l2_err,
-        load_fpga_csv as ref_load_fpga_csv,
-        bell_state as ref_bell_state,
+        read_state as ref_read_state,
+        analytic_reference as ref_analytic_reference,
+        stream_metrics as ref_stream_metrics,
     )
 except Exception:
-    ref_qft_state = None
-    ref_grover_state = None
-    ref_fidelity = None
-    ref_l2_err = None
-    ref_load_fpga_csv = None
+    ref_read_state = None
+    ref_stream_metrics = None
+try:
+    from experiments.cycle_model import model_cycles
+except Exception:
+    model_cycles = None
+from experiments.build_cache import BuildError, build_key, ensure_model  # noqa: E402
 
 SUPPORTED_FPGA = {"qft2", "qft3", "qft4", "grover2", "grover3", "grover4", "bell2"}
 ALL_PROGRAMS = [
@@ -54,8 +83,20 @@ SUBSETS = {
     "all": ALL_PROGRAMS,
 }
 
-SIM_RE = re.compile(r"\[SIM\] prog=(?P<prog>\S+) done=(?P<done>\d+) cycles=(?P<cycles>\d+)")
-CPU_RE = re.compile(r"CPU_RESULT prog=(?P<prog>\S+) ms=(?P<ms>[\d\.eE+-]*) ok=(?P<ok>[01])(\s+reason=(?P<reason>\S+))?")
+RUN_RE = re.compile(r"\[RUN\] prog=(?P<prog>\S+) run=(?P<run>\d+) done=(?P<done>\d+) cycles=(?P<cycles>\d+) "
+                    r"fpga_us=(?P<fpga_us>[\d\.]+) check=(?P<check>\w+)(?: mode=(?P<mode>\w+))?(?: diag=(?P<diag>\w+))?"
+                    r"(?: qubits=(?P<qubits>\d+))?")
+# Scheduler variant -> (extra Verilator flag, [RUN] mode=, [RUN] diag=); its
+# cycles go to the fpga_cycles_<variant> column
+FPGA_VARIANTS = {
+    "pipe": ("-GPIPELINE=1", "pipelined", "full"),
+    "diag": ("-GDIAG_FAST=1", "serial", "fast"),
+}
+VARIANT_FIELDS = [f"fpga_cycles_{v}" for v in FPGA_VARIANTS]
+FIDELITY_FIELDS = ["fidelity", "l2_err", "hw_norm"]
+# fidelity/l2_err/hw_norm of each variant's own state dump
+VARIANT_FIDELITY_FIELDS = [f"{k}_{v}" for v in FPGA_VARIANTS for k in FIDELITY_FIELDS]
+CPU_RE = re.compile(r"CPU_RESULT prog=(?P<prog>\S+) ms=(?P<ms>[\d\.eE+-]*) ok=(?P<ok>[01])(\s+reason=(?P<reason>\S+))?(\s+engine=(?P<engine>\S+))?")
 
 
 class BenchError(Exception):
@@ -69,13 +110,23 @@ def parse_args() -> argparse.Namespace:
     group.add_argument("--prog", help="Single program name")
     parser.add_argument("--cpu-only", action="store_true", help="Only run CPU reference")
     parser.add_argument("--fpga-only", action="store_true", help="Only run FPGA simulation")
-    parser.add_argument("--runs", type=int, default=1, help="Number of repetitions per program (min recorded)")
+    parser.add_argument("--runs", type=int, default=1, help="Number of FPGA simulation repetitions per program (min recorded)")
     parser.add_argument("--out", type=Path, default=DEFAULT_CSV, help="Output CSV path")
     parser.add_argument("--all", action="store_true", help="Shortcut for --subset all")
     parser.add_argument("--fclk-hz", type=float, default=float(os.environ.get("FCLK_HZ", 1.0e8)), help="FPGA clock in Hz for latency conversion")
     parser.add_argument("--cpu-max-qubits", type=int, default=6, help="Max CPU qubits for QFT/Grover (default 6)")
     parser.add_argument("--cpu-qubits", type=str, default="", help="Comma-separated CPU qubit list (e.g., 2,3,4). Overrides --cpu-max-qubits")
     parser.add_argument("--strict", action="store_true", help="Exit non-zero if strict prog fidelity < 0.95")
+    parser.add_argument("--cpu-runs", type=int, default=50, help="Timed CPU repetitions per program, in one worker process")
+    parser.add_argument("--cpu-warmup", type=int, default=3, help="Untimed CPU runs after the cold run")
+    parser.add_argument("--cpu-engine", choices=["fast", "statevector", "dense"], default="fast", help="cpu_ref/run_cpu.py engine (default: fast)")
+    parser.add_argument("--jobs", type=int, default=0, help="Concurrent simulation/fidelity jobs (default: one per unreserved core)")
+    parser.add_argument("--job-timeout", type=float, default=900.0, help="Seconds before a simulation or CPU job is killed")
+    parser.add_argument("--cpu-core", type=int, default=None, help="Core reserved for CPU timing jobs (default: the last available core; -1 disables pinning)")
+    parser.add_argument("--vflags", default="", help="Extra Verilator flags for the model build (e.g. -GN_QUBITS=5); each set is cached separately")
+    parser.add_argument("--rebuild", action="store_true", help="Rebuild the Verilator model even on a build-cache hit")
+    parser.add_argument("--force", action="store_true", help="Re-measure every point even if --out already holds a result with the same key")
+    parser.add_argument("--no-model", action="store_true", help="Leave unsupported FPGA programs empty instead of filling modeled cycles")
     return parser.parse_args()
 
 
@@ -89,108 +140,174 @@ def resolve_programs(args: argparse.Namespace) -> List[str]:
     return SUBSETS["all"]
 
 
-def ensure_build(skip_fpga: bool) -> None:
+def ensure_build(skip_fpga: bool, vflags: str = "", force: bool = False) -> Optional[Path]:
+    """Path of the Vqc_top for this configuration, from the build cache."""
     if skip_fpga:
-        return
-    print("[bench] Building FPGA simulator...")
-    proc = subprocess.run(["make", "-C", str(FPGA_CORE_DIR), "-j"], capture_output=True, text=True)
-    if proc.returncode != 0:
-        sys.stderr.write(proc.stdout)
-        sys.stderr.write(proc.stderr)
-        raise BenchError("FPGA build failed")
-
-
-def run_fpga_prog(prog: str, runs: int, dump_vcd: bool) -> Dict[str, Optional[float]]:
-    result: Dict[str, Optional[float]] = {"fpga_cycles": None, "fpga_us": None, "status": None}
-    if prog not in SUPPORTED_FPGA:
-        result["status"] = "unsupported"
-        return result
+        return None
+    try:
+        sim, info = ensure_model(vflags, force)
+    except BuildError as exc:
+        raise BenchError(f"FPGA build failed: {exc}")
+    if info["hit"]:
+        msg = f"build cache hit {info['key']}"
+    else:
+        msg = f"build cache miss {info['key']}, built in {info['build_s']:.1f} s"
+    print(f"[bench] {msg} ({info['dir']})")
+    LOG_DIR.mkdir(parents=True, exist_ok=True)
+    with (LOG_DIR / "build.log").open("a") as f:
+        f.write(f"{dt.datetime.utcnow().isoformat()} {msg} flags={vflags!r}\n")
+    return sim
+
+
+def parse_run_records(stdout: str) -> Dict[str, List[Dict[str, object]]]:
+    """Group the testbench's [RUN] records by program, in run order."""
+    records: Dict[str, List[Dict[str, object]]] = {}
+    for m in RUN_RE.finditer(stdout):
+        records.setdefault(m.group("prog"), []).append({
+            "run": int(m.group("run")),
+            "done": m.group("done") == "1",
+            "cycles": int(m.group("cycles")),
+            "fpga_us": float(m.group("fpga_us")),
+            "check": m.group("check"),
+            "mode": m.group("mode") or "serial",
+            "diag": m.group("diag") or "full",
+            "qubits": int(m.group("qubits")) if m.group("qubits") else None,
+            "line": m.group(0),
+        })
+    return records
+
+
+async def run_process(cmd: List[str], cwd: Path, timeout: Optional[float], env: Optional[Dict[str, str]] = None,
+                      cpus: Optional[Set[int]] = None) -> Tuple[Optional[int], str, str]:
+    """Run cmd, optionally pinned to cpus; returncode is None if it timed out and was killed."""
+    preexec = None
+    if cpus and hasattr(os, "sched_setaffinity"):
+        def preexec() -> None:
+            os.sched_setaffinity(0, cpus)
+    # Own session, so a timeout can kill the job together with its children
+    proc = await asyncio.create_subprocess_exec(*cmd, cwd=cwd, env=env, preexec_fn=preexec, start_new_session=True,
+                                                stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE)
+    timed_out = False
+    try:
+        out, err = await asyncio.wait_for(proc.communicate(), timeout)
+    except asyncio.TimeoutError:
+        timed_out = True
+        try:
+            os.killpg(proc.pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+        out, err = await proc.communicate()
+    stdout, stderr = out.decode(errors="replace"), err.decode(errors="replace")
+    return (None if timed_out else proc.returncode), stdout, stderr
+
+
+def variant_vflags(vflags: str, variant: str) -> str:
+    return f"{vflags} {FPGA_VARIANTS[variant][0]}".strip()
 
-    best_cycles: Optional[int] = None
-    log_path = LOG_DIR / f"{prog}_fpga.log"
-    logs: List[str] = []
+
+async def run_fpga_batch(sim: Path, progs: List[str], runs: int, dump_vcd: bool, timeout: Optional[float] = None,
+                         cpus: Optional[Set[int]] = None, tag: str = "batch",
+                         variant: Optional[str] = None) -> Dict[str, Dict[str, Optional[float]]]:
+    """Run the given FPGA programs `runs` times each in one testbench process.
+
+    The TB rebuilds the model between runs (+progs=... +runs=N) and prints
+    one [RUN] record per run; a program is ok only if all of its runs
+    finished in the expected scheduler mode and passed the TB self-check.
+    Cycles are the minimum over runs. variant names the FPGA_VARIANTS build
+    sim is; the TB suffixes its state dumps with _<variant>.
+    """
     env = os.environ.copy()
     if dump_vcd:
         env["DUMP_VCD"] = "1"
-    vcd_path = FPGA_CORE_DIR / "obj_dir" / "qc_top.vcd"
-
-    for run_idx in range(runs):
-        if vcd_path.exists():
-            vcd_path.unlink()
-        cmd = [str(FPGA_CORE_DIR / "obj_dir" / "Vqc_top"), f"+prog={prog}"]
-        proc = subprocess.run(cmd, cwd=FPGA_CORE_DIR / "obj_dir", capture_output=True, text=True, env=env)
-        logs.append(f"Run {run_idx+1} command: {' '.join(cmd)}\n")
-        logs.append(proc.stdout)
-        logs.append(proc.stderr)
-        if proc.returncode != 0:
-            result["status"] = "sim_fail"
-            break
-        match = SIM_RE.search(proc.stdout)
-        if not match or match.group("done") != "1":
-            result["status"] = "sim_fail"
-            break
-        cycles = int(match.group("cycles"))
-        # Parse optional [BENCH] line
-        m2 = re.search(r"\[BENCH\]\s+fpga_cycles=(\d+)\s+fpga_us=([\d\.]+)", proc.stdout)
-        if m2:
-            try:
-                result["fpga_us"] = float(m2.group(2))
-            except Exception:
-                pass
-        if best_cycles is None or cycles < best_cycles:
-            best_cycles = cycles
-    else:
-        result["status"] = "ok"
+    cmd = [str(sim), f"+progs={','.join(progs)}", f"+runs={max(1, runs)}"]
+    mode, diag = FPGA_VARIANTS[variant][1:] if variant else ("serial", "full")
+    # The TB writes state dumps relative to fpga_core/obj_dir, wherever the binary lives
+    run_dir = FPGA_CORE_DIR / "obj_dir"
+    run_dir.mkdir(exist_ok=True)
+    returncode, stdout, stderr = await run_process(cmd, run_dir, timeout, env, cpus)
+    (LOG_DIR / f"fpga_{tag}.log").write_text(f"Batch command: {' '.join(cmd)}\n" + stdout + stderr)
+    records = parse_run_records(stdout)
+
+    results: Dict[str, Dict[str, Optional[float]]] = {}
+    for prog in progs:
+        recs = records.get(prog, [])
+        result: Dict[str, Optional[float]] = {"fpga_cycles": None, "fpga_us": None, "status": "sim_fail"}
+        passed = [r for r in recs if r["done"] and r["check"] == "pass" and (r["mode"], r["diag"]) == (mode, diag)]
+        if len(recs) == max(1, runs) and len(passed) == len(recs):
+            best = min(recs, key=lambda r: r["cycles"])
+            result.update({"fpga_cycles": float(best["cycles"]), "fpga_us": best["fpga_us"],
+                           "fpga_qubits": best["qubits"], "status": "ok"})
+        elif returncode is None:
+            result["status"] = "timeout"
+        log_name = f"{prog}_fpga_{variant}.log" if variant else f"{prog}_fpga.log"
+        (LOG_DIR / log_name).write_text(
+            f"Batch command: {' '.join(cmd)}\n" + "".join(f"{r['line']}\n" for r in recs))
+        vcd_path = FPGA_CORE_DIR / "obj_dir" / f"qc_top_{prog}.vcd"
+        if dump_vcd and vcd_path.exists():
+            (WAVE_DIR / f"{prog}.vcd").write_bytes(vcd_path.read_bytes())
+        results[prog] = result
+    return results
+
+
+def model_fpga_prog(prog: str, fclk_hz: float) -> Dict[str, Optional[float]]:
+    """Cycle-model estimate for a program the RTL cannot run (status 'modeled')."""
+    result: Dict[str, Optional[float]] = {"fpga_cycles": None, "fpga_us": None, "status": "unsupported"}
+    if model_cycles is None:
+        return result
+    try:
+        cycles, mem_qubits, _ = model_cycles(prog)
+    except (KeyError, ValueError):
+        return result
+    pipe_cycles, _, _ = model_cycles(prog, pipelined=True)
+    diag_cycles, _, _ = model_cycles(prog, diag_fast=True)
+    print(f"[bench] {prog}: modeled {cycles} cycles, {pipe_cycles} pipelined, {diag_cycles} diag_fast "
+          f"(scheduler N_QUBITS={mem_qubits}, not simulated)")
+    result.update({"fpga_cycles": float(cycles), "fpga_us": cycles * 1e6 / fclk_hz,
+                   "fpga_cycles_pipe": float(pipe_cycles), "fpga_cycles_diag": float(diag_cycles),
+                   "fpga_qubits": mem_qubits, "status": "modeled", "fpga_source": "model"})
+    return result
 
-    log_path.write_text("".join(logs))
-    if dump_vcd and vcd_path.exists():
-        target = WAVE_DIR / f"{prog}.vcd"
-        target.write_bytes(vcd_path.read_bytes())
 
-    if best_cycles is not None:
-        result["fpga_cycles"] = float(best_cycles)
-    return result
+CPU_STATS = ["min_ms", "median_ms", "p95_ms", "p99_ms", "std_ms", "cold_ms", "runs"]
+CPU_FIELD_RE = re.compile(r"(\w+)=(\S*)")
+
 
+async def run_cpu_prog(prog: str, runs: int, engine: str = "fast", warmup: int = 3,
+                       timeout: Optional[float] = None, cpus: Optional[Set[int]] = None) -> Dict[str, Optional[float]]:
+    """Time prog in one cpu_ref worker process (run_cpu.py --runs).
 
-def run_cpu_prog(prog: str, runs: int) -> Dict[str, Optional[float]]:
-    result: Dict[str, Optional[float]] = {"cpu_ms": None, "cpu_status": None}
+    The worker does a cold run, `warmup` discarded runs and `runs` timed
+    runs; the distribution comes back as cpu_<stat> keys.
+    """
+    result: Dict[str, Optional[float]] = {"cpu_status": None, "cpu_engine": None}
+    result.update({f"cpu_{k}": None for k in CPU_STATS})
     if not CPU_REF.exists():
         result["cpu_status"] = "no_cpu"
         return result
 
-    best_ms: Optional[float] = None
     log_path = LOG_DIR / f"{prog}_cpu.log"
-    logs: List[str] = []
-
-    for run_idx in range(runs):
-        cmd = [str(CPU_REF), "--prog", prog]
-        proc = subprocess.run(cmd, cwd=REPO_ROOT, capture_output=True, text=True)
-        logs.append(f"Run {run_idx+1} command: {' '.join(cmd)}\n")
-        logs.append(proc.stdout)
-        logs.append(proc.stderr)
-        if proc.returncode != 0:
-            # Parse reason if available
-            match = CPU_RE.search(proc.stdout)
-            reason = None
-            if match:
-                reason = match.group("reason")
-            result["cpu_status"] = reason or "cpu_fail"
-            break
-        match = CPU_RE.search(proc.stdout)
-        if not match or match.group("ok") != "1":
-            reason = match.group("reason") if match else None
-            result["cpu_status"] = reason or "cpu_fail"
-            break
-        ms_str = match.group("ms")
-        ms = float(ms_str) if ms_str else None
-        if ms is not None and (best_ms is None or ms < best_ms):
-            best_ms = ms
-    else:
-        result["cpu_status"] = "ok"
+    cmd = [sys.executable, str(CPU_REF), "--prog", prog, "--engine", engine,
+           "--runs", str(max(1, runs)), "--warmup", str(warmup)]
+    returncode, stdout, stderr = await run_process(cmd, REPO_ROOT, timeout, cpus=cpus)
+    log_path.write_text(f"Worker command: {' '.join(cmd)}\n" + stdout + stderr)
+    if returncode is None:
+        result["cpu_status"] = "timeout"
+        return result
+    match = CPU_RE.search(stdout)
+    if returncode != 0 or not match or match.group("ok") != "1":
+        reason = match.group("reason") if match else None
+        result["cpu_status"] = reason or "cpu_fail"
+        return result
 
-    log_path.write_text("".join(logs))
-    if best_ms is not None:
-        result["cpu_ms"] = best_ms
+    line = stdout[match.start():].splitlines()[0]
+    fields = dict(CPU_FIELD_RE.findall(line))
+    result["cpu_engine"] = match.group("engine")
+    for key in CPU_STATS:
+        try:
+            result[f"cpu_{key}"] = float(fields[key])
+        except (KeyError, ValueError):
+            pass
+    result["cpu_status"] = "ok"
     return result
 
 
@@ -202,6 +319,8 @@ def combine_status(fpga_status: Optional[str], cpu_status: Optional[str], run_fp
         statuses.append(cpu_status)
     if not statuses:
         return "ok"
+    if "timeout" in statuses:
+        return "timeout"
     if "sim_fail" in statuses:
         return "sim_fail"
     if "cpu_fail" in statuses:
@@ -239,68 +358,119 @@ def prog_qubits(name: str) -> Optional[int]:
     return int(m.group(1)) if m else None
 
 
-def state_csv_path(prog: str, n: int) -> Path:
-    return REPO_ROOT / "experiments" / "results" / "states" / f"{prog}_fpga_q{n}.csv"
+def state_dump_path(prog: str, n: int, variant: Optional[str] = None) -> Path:
+    """The TB's newest state dump for prog on the default build or a variant:
+    binary (.bin) or CSV export (.csv)."""
+    base = REPO_ROOT / "experiments" / "results" / "states" / f"{prog}_fpga_q{n}{'_' + variant if variant else ''}"
+    found = [p for p in (base.with_suffix(".bin"), base.with_suffix(".csv")) if p.exists()]
+    return max(found, key=lambda p: p.stat().st_mtime) if found else base.with_suffix(".bin")
 
 
-def raw_hw_norm_from_csv(path: Path) -> Optional[float]:
-    try:
-        rows = list(csv.DictReader(path.open()))
-    except Exception:
-        return None
-    if not rows:
-        return None
-    acc = 0.0
-    for row in rows:
-        try:
-            re_v = float(row.get("re", "0") or 0.0)
-            im_v = float(row.get("im", "0") or 0.0)
-            acc += re_v * re_v + im_v * im_v
-        except Exception:
-            continue
-    return math.sqrt(acc)
-
-
-def compute_fidelity_for_prog(prog: str, n: int) -> Tuple[Optional[float], Optional[float], Optional[float]]:
+def compute_fidelity_for_prog(prog: str, n: int, variant: Optional[str] = None
+                              ) -> Tuple[Optional[float], Optional[float], Optional[float]]:
     """Returns (fidelity, l2_err, hw_norm) or (None, None, None)."""
-    if any(x is None for x in (ref_qft_state, ref_grover_state, ref_fidelity, ref_l2_err, ref_load_fpga_csv)):
+    if ref_read_state is None or ref_stream_metrics is None:
         return (None, None, None)
-    p = state_csv_path(prog, n)
+    p = state_dump_path(prog, n, variant)
     if not p.exists():
         return (None, None, None)
     try:
-        fpga_vec = ref_load_fpga_csv(p, lsb_first=True, n=n)
-        if prog.startswith("qft"):
-            ideal = ref_qft_state(n)
-        elif prog.startswith("grover"):
-            ideal = ref_grover_state(n, marked=(1 << n) - 1)
-        elif prog == "bell2":
-            ideal = ref_bell_state()
-        else:
-            hw = raw_hw_norm_from_csv(p)
-            return (None, None, hw)
-        fid = ref_fidelity(fpga_vec, ideal)
-        l2 = ref_l2_err(fpga_vec, ideal)
-        hw = raw_hw_norm_from_csv(p)
-        return (float(fid), float(l2), float(hw) if hw is not None else None)
+        reference = ref_analytic_reference(prog, n)
+        if reference is None:
+            return (None, None, ref_read_state(p, n=n)[1])
+        # One chunked pass against the closed form gives all three numbers
+        m = ref_stream_metrics(p, reference)
+        return (m["fidelity"], m["l2_err"], m["raw_norm"])
     except Exception:
         return (None, None, None)
 
 
+CSV_FIELDS = [
+    "timestamp", "git_sha", "host", "prog",
+    "fpga_cycles", "fpga_us", *VARIANT_FIELDS, "fpga_qubits",
+    "cpu_min_ms", "cpu_median_ms", "cpu_p95_ms", "cpu_p99_ms", "cpu_std_ms", "cpu_cold_ms", "cpu_runs",
+    "status",
+    *FIDELITY_FIELDS, *VARIANT_FIDELITY_FIELDS, "fpga_source", "cpu_engine",
+    "fpga_key", "cpu_key",
+]
+# Columns owned by each measured part of a row
+FPGA_FIELDS = ["fpga_cycles", "fpga_us", *VARIANT_FIELDS, "fpga_qubits", *FIDELITY_FIELDS, *VARIANT_FIDELITY_FIELDS,
+               "fpga_source", "fpga_key"]
+CPU_FIELDS = [f"cpu_{k}" for k in CPU_STATS] + ["cpu_engine", "cpu_key"]
+
 
 def write_csv(rows: List[Dict[str, Optional[str]]], path: Path) -> None:
     path.parent.mkdir(parents=True, exist_ok=True)
-    fieldnames = [
-        "timestamp", "git_sha", "host", "prog",
-        "fpga_cycles", "fpga_us", "cpu_ms", "cpu_us", "status",
-        "fidelity", "l2_err", "hw_norm",
-    ]
     with path.open("w", newline="") as f:
-        writer = csv.DictWriter(f, fieldnames=fieldnames)
+        writer = csv.DictWriter(f, fieldnames=CSV_FIELDS, extrasaction="ignore")
         writer.writeheader()
         writer.writerows(rows)
 
 
+def read_csv(path: Path) -> List[Dict[str, str]]:
+    """Rows of an existing results CSV (empty if missing or unreadable)."""
+    try:
+        with path.open(newline="") as f:
+            return list(csv.DictReader(f))
+    except (OSError, csv.Error):
+        return []
+
+
+def measurement_key(*parts: object) -> str:
+    return hashlib.sha256("\x1f".join(str(p) for p in parts).encode()).hexdigest()[:16]
+
+
+def source_hash(*paths: Path) -> str:
+    h = hashlib.sha256()
+    for path in paths:
+        h.update(path.read_bytes() if path.exists() else b"<missing>")
+    return h.hexdigest()[:16]
+
+
+def scoring_hash() -> str:
+    """Hash of the fidelity scoring: ref_sim.py and the functions here that call it."""
+    h = hashlib.sha256(source_hash(REF_SIM).encode())
+    for fn in (state_dump_path, compute_fidelity_for_prog):
+        h.update(inspect.getsource(fn).encode())
+    return h.hexdigest()[:16]
+
+
+def fpga_measurement_key(prog: str, build: str, host: str, args: argparse.Namespace) -> str:
+    # build covers RTL, TB, Makefile, Verilator version and --vflags of every model;
+    # scoring_hash the code behind the stored fidelity/l2_err/hw_norm
+    return measurement_key("fpga", prog, build, scoring_hash(), host, max(1, args.runs), args.fclk_hz)
+
+
+def cpu_measurement_key(prog: str, host: str, args: argparse.Namespace) -> str:
+    return measurement_key("cpu", prog, args.cpu_engine, source_hash(CPU_REF), np.__version__,
+                           platform.python_version(), host, max(1, args.cpu_runs), args.cpu_warmup)
+
+
+def _float_or_none(text: Optional[str]) -> Optional[float]:
+    try:
+        value = float(text) if text not in (None, "") else None
+    except ValueError:
+        return None
+    return None if value is None or math.isnan(value) else value
+
+
+def stored_fpga(row: Dict[str, str]) -> Tuple[Dict[str, Optional[float]], Tuple]:
+    """(fpga_info, fidelity tuple) rebuilt from a stored simulated row."""
+    info = {"fpga_cycles": _float_or_none(row.get("fpga_cycles")), "fpga_us": _float_or_none(row.get("fpga_us")),
+            "status": "ok", "fpga_source": "rtl"}
+    info.update({col: _float_or_none(row.get(col)) for col in VARIANT_FIELDS + VARIANT_FIDELITY_FIELDS})
+    qubits = _float_or_none(row.get("fpga_qubits"))
+    info["fpga_qubits"] = int(qubits) if qubits is not None else None
+    fid = tuple(_float_or_none(row.get(k)) for k in FIDELITY_FIELDS)
+    return info, fid
+
+
+def stored_cpu(row: Dict[str, str]) -> Dict[str, Optional[float]]:
+    info: Dict[str, Optional[float]] = {f"cpu_{k}": _float_or_none(row.get(f"cpu_{k}")) for k in CPU_STATS}
+    info.update({"cpu_status": "ok", "cpu_engine": row.get("cpu_engine") or None})
+    return info
+
+
 def git_sha() -> str:
     try:
         out = subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_ROOT)
@@ -309,6 +479,90 @@ def git_sha() -> str:
         return "unknown"
 
 
+def plan_cores(reserve: Optional[int]) -> Tuple[Optional[Set[int]], Optional[Set[int]]]:
+    """(cores for CPU timing, cores for everything else), or (None, None) if pinning is off."""
+    if reserve == -1 or not hasattr(os, "sched_getaffinity"):
+        return None, None
+    available = sorted(os.sched_getaffinity(0))
+    if len(available) < 2:
+        return None, None
+    if reserve is None:
+        reserve = available[-1]
+    if reserve not in available:
+        raise BenchError(f"--cpu-core {reserve} is not in this process's affinity set {available}")
+    return {reserve}, set(available) - {reserve}
+
+
+async def run_jobs(args: argparse.Namespace, sims: Dict[Optional[str], Path], fpga_progs: List[str],
+                   cpu_progs: List[str], jobs: int,
+                   cpu_cores: Optional[Set[int]], sim_cores: Optional[Set[int]], dump_vcd: bool
+                   ) -> Tuple[Dict[str, Dict], Dict[str, Dict], Dict[Tuple[str, Optional[str]], Tuple]]:
+    """Run all FPGA, fidelity and CPU jobs; results are keyed by program
+    (fidelities by (program, variant), None for the default build).
+
+    sims maps None to the default model and each FPGA_VARIANTS name to its
+    model; a chunk runs on all of them in turn.
+    """
+    if sim_cores:
+        # Keep this process (fidelity threads) off the reserved core too
+        os.sched_setaffinity(0, sim_cores)
+    slots = asyncio.Semaphore(jobs)
+    cpu_lock = asyncio.Lock()
+    fpga_results: Dict[str, Dict] = {}
+    cpu_results: Dict[str, Dict] = {}
+    fid_results: Dict[Tuple[str, Optional[str]], Tuple] = {}
+
+    def progress(msg: str) -> None:
+        print(f"[bench][job] {msg}", file=sys.stderr, flush=True)
+
+    async def fidelity(prog: str, variant: Optional[str] = None) -> None:
+        n = prog_qubits(prog) or 0
+        if n <= 0:
+            return
+        async with slots:
+            fid_results[(prog, variant)] = await asyncio.to_thread(compute_fidelity_for_prog, prog, n, variant)
+
+    async def fpga_chunk(idx: int, chunk: List[str]) -> None:
+        async with slots:
+            t0 = time.perf_counter()
+            results = await run_fpga_batch(sims[None], chunk, args.runs, dump_vcd, args.job_timeout,
+                                           sim_cores, tag=f"batch{idx}")
+            for variant in FPGA_VARIANTS:
+                other = await run_fpga_batch(sims[variant], chunk, args.runs, False, args.job_timeout,
+                                             sim_cores, tag=f"batch{idx}_{variant}", variant=variant)
+                for prog in chunk:
+                    if other[prog]["status"] == "ok":
+                        results[prog][f"fpga_cycles_{variant}"] = other[prog]["fpga_cycles"]
+                    elif results[prog]["status"] == "ok":
+                        # A variant that fails its self-check fails the program
+                        results[prog].update({"fpga_cycles": None, "fpga_us": None,
+                                              "status": other[prog]["status"]})
+            fpga_results.update(results)
+            progress(f"fpga {','.join(chunk)}: {time.perf_counter() - t0:.2f} s")
+        await asyncio.gather(*(fidelity(prog, variant) for prog in chunk for variant in (None, *FPGA_VARIANTS)))
+
+    async def cpu_job(prog: str) -> None:
+        # Serialized: only one timing job at a time, alone on its core
+        async with cpu_lock:
+            t0 = time.perf_counter()
+            cpu_results[prog] = await run_cpu_prog(prog, args.cpu_runs, args.cpu_engine, args.cpu_warmup,
+                                                   args.job_timeout, cpu_cores)
+            progress(f"cpu {prog}: {time.perf_counter() - t0:.2f} s")
+
+    tasks = []
+    supported = [p for p in fpga_progs if p in SUPPORTED_FPGA]
+    for prog in fpga_progs:
+        if prog not in SUPPORTED_FPGA:
+            fpga_results[prog] = {"fpga_cycles": None, "fpga_us": None, "status": "unsupported"}
+            tasks.append(fidelity(prog))
+    n_chunks = min(jobs, len(supported))
+    for idx in range(n_chunks):
+        tasks.append(fpga_chunk(idx, supported[idx::n_chunks]))
+    tasks.extend(cpu_job(prog) for prog in cpu_progs)
+    await asyncio.gather(*tasks)
+    return fpga_results, cpu_results, fid_results
+
+
 def main() -> int:
     args = parse_args()
     if args.cpu_only and args.fpga_only:
@@ -322,13 +576,6 @@ def main() -> int:
 
     dump_vcd = os.getenv("DUMP_VCD") is not None
 
-    try:
-        ensure_build(args.cpu_only)
-    except BenchError as exc:
-        print(f"[bench] {exc}", file=sys.stderr)
-        return 1
-
-    rows: List[Dict[str, Optional[str]]] = []
     failures = False
     timestamp = dt.datetime.utcnow().isoformat()
     sha = git_sha()
@@ -340,27 +587,103 @@ def main() -> int:
         cpu_qubits = list(range(2, max(2, args.cpu_max_qubits) + 1))
     print(f"[bench] CPU qubits: {cpu_qubits}")
 
+    want_fpga = [] if args.cpu_only else list(programs)
+    want_cpu = []
     for prog in programs:
-        print(f"[bench] Running {prog}...")
-        run_fpga = not args.cpu_only
-        run_cpu = not args.fpga_only
-        if run_cpu and (prog.startswith("qft") or prog.startswith("grover")):
-            q = prog_qubits(prog)
-            if q is None or q not in cpu_qubits:
-                run_cpu = False
-
-        fpga_info = run_fpga_prog(prog, args.runs, dump_vcd) if run_fpga else {"fpga_cycles": None, "status": None}
-        cpu_info = run_cpu_prog(prog, args.runs) if run_cpu else {"cpu_ms": None, "cpu_status": None}
-
-        status = combine_status(fpga_info.get("status"), cpu_info.get("cpu_status"), run_fpga, run_cpu)
-        if status in {"sim_fail", "cpu_fail"}:
-            failures = True
+        if args.fpga_only:
+            continue
+        q = prog_qubits(prog)
+        if (prog.startswith("qft") or prog.startswith("grover")) and (q is None or q not in cpu_qubits):
+            continue
+        want_cpu.append(prog)
 
-        # Optional fidelity calculation based on dumped state
-        fid = l2 = hw = None
-        n = prog_qubits(prog) or 0
-        if run_fpga and n > 0:
-            fid, l2, hw = compute_fidelity_for_prog(prog, n)
+    # Keys of the requested measurements, and stored rows for this host
+    try:
+        build = ("+".join(build_key(flags)[0] for flags in
+                          [args.vflags] + [variant_vflags(args.vflags, v) for v in FPGA_VARIANTS])
+                 if any(p in SUPPORTED_FPGA for p in want_fpga) else None)
+    except BuildError:
+        build = None  # no reuse; ensure_build reports the problem
+    fpga_keys = {p: fpga_measurement_key(p, build, host, args)
+                 for p in want_fpga if p in SUPPORTED_FPGA and build is not None}
+    cpu_keys = {p: cpu_measurement_key(p, host, args) for p in want_cpu}
+    existing = read_csv(args.out)
+    stored = {row.get("prog"): row for row in existing if row.get("host") == host}
+
+    def reusable(prog: str, part: str, key: Optional[str]) -> bool:
+        row = stored.get(prog)
+        if args.force or row is None or key is None or row.get(f"{part}_key") != key:
+            return False
+        if part == "fpga":
+            return row.get("fpga_source") == "rtl" and bool(row.get("fpga_cycles"))
+        return bool(row.get("cpu_median_ms"))
+
+    reuse_fpga = {p for p in fpga_keys if reusable(p, "fpga", fpga_keys[p])}
+    reuse_cpu = {p for p in cpu_keys if reusable(p, "cpu", cpu_keys[p])}
+    fpga_progs = [p for p in want_fpga if p not in reuse_fpga]
+    cpu_progs = [p for p in want_cpu if p not in reuse_cpu]
+    print(f"[bench] reusing {len(reuse_fpga)} FPGA and {len(reuse_cpu)} CPU point(s); "
+          f"measuring {len(fpga_progs)} FPGA and {len(cpu_progs)} CPU" + (" (--force)" if args.force else ""))
+
+    sims: Dict[Optional[str], Path] = {}
+    if any(p in SUPPORTED_FPGA for p in fpga_progs):
+        try:
+            sims[None] = ensure_build(False, args.vflags, args.rebuild)
+            for variant in FPGA_VARIANTS:
+                sims[variant] = ensure_build(False, variant_vflags(args.vflags, variant), args.rebuild)
+        except BenchError as exc:
+            print(f"[bench] {exc}", file=sys.stderr)
+            return 1
+
+    try:
+        cpu_cores, sim_cores = plan_cores(args.cpu_core)
+    except BenchError as exc:
+        print(f"[bench] {exc}", file=sys.stderr)
+        return 1
+    if cpu_cores:
+        print(f"[bench] CPU timing pinned to core(s) {sorted(cpu_cores)}; simulations on {sorted(sim_cores)}")
+    else:
+        print("[bench] CPU timing not pinned (needs 2+ cores and sched_setaffinity)")
+    jobs = args.jobs if args.jobs > 0 else max(1, len(sim_cores or ()))
+
+    fpga_results, cpu_results, fid_results = asyncio.run(run_jobs(
+        args, sims, fpga_progs, cpu_progs, jobs, cpu_cores, sim_cores, dump_vcd))
+
+    rows: List[Dict[str, Optional[str]]] = []
+    for prog in programs:
+        run_fpga = prog in want_fpga
+        run_cpu = prog in want_cpu
+        old = stored.get(prog)
+        # Parts reused by key, or not requested now but present in the stored row
+        keep_fpga = prog in reuse_fpga or (not run_fpga and old is not None and old.get("fpga_source") == "rtl"
+                                           and bool(old.get("fpga_cycles")))
+        keep_cpu = prog in reuse_cpu or (not run_cpu and old is not None and bool(old.get("cpu_median_ms")))
+        if old is not None and (keep_fpga or not run_fpga) and (keep_cpu or not run_cpu):
+            # Nothing measured now: keep the stored row as it was
+            rows.append(old)
+            print(f"[bench] prog={prog} reused ({old.get('timestamp')}, {old.get('git_sha')})")
+            continue
+
+        if keep_fpga:
+            fpga_info, (fid, l2, hw) = stored_fpga(old)
+        elif run_fpga:
+            fpga_info = dict(fpga_results[prog])
+            if fpga_info.get("fpga_cycles") is not None:
+                fpga_info["fpga_source"] = "rtl"
+            elif fpga_info.get("status") == "unsupported" and not args.no_model:
+                fpga_info = model_fpga_prog(prog, args.fclk_hz)
+            fid, l2, hw = fid_results.get((prog, None), (None, None, None))
+            for variant in FPGA_VARIANTS:
+                metrics = fid_results.get((prog, variant), (None, None, None))
+                fpga_info.update({f"{k}_{variant}": v for k, v in zip(FIDELITY_FIELDS, metrics)})
+        else:
+            fpga_info, (fid, l2, hw) = {"fpga_cycles": None, "status": None}, (None, None, None)
+        cpu_info = stored_cpu(old) if keep_cpu else cpu_results.get(prog, {"cpu_status": None})
+
+        status = combine_status(fpga_info.get("status"), cpu_info.get("cpu_status"),
+                                run_fpga or keep_fpga, run_cpu or keep_cpu)
+        if status in {"sim_fail", "cpu_fail", "timeout"}:
+            failures = True
 
         # Strict programs
         if prog in {"qft2", "qft4", "grover2", "bell2"} and fid is not None and fid < 0.95:
@@ -375,16 +698,35 @@ def main() -> int:
             "prog": prog,
             "fpga_cycles": str(fpga_info.get("fpga_cycles") or ""),
             "fpga_us": str(fpga_info.get("fpga_us") or (float(fpga_info.get("fpga_cycles")) * 1e6 / args.fclk_hz if fpga_info.get("fpga_cycles") else "")),
-            "cpu_ms": str(cpu_info.get("cpu_ms") or ""),
-            "cpu_us": str((cpu_info.get("cpu_ms") or 0) and (float(cpu_info.get("cpu_ms")) * 1000.0) or ""),
+            **{col: str(fpga_info.get(col) or "") for col in VARIANT_FIELDS},
+            "fpga_qubits": str(fpga_info.get("fpga_qubits") or ""),
+            **{f"cpu_{k}": ("" if cpu_info.get(f"cpu_{k}") is None else
+                            (str(int(cpu_info[f"cpu_{k}"])) if k == "runs" else f"{cpu_info[f'cpu_{k}']:.6f}"))
+               for k in CPU_STATS},
             "status": status,
             "fidelity": ("nan" if fid is None else f"{fid:.6f}"),
             "l2_err": ("nan" if l2 is None else f"{l2:.6f}"),
             "hw_norm": ("nan" if hw is None else f"{hw:.6f}"),
+            **{col: ("nan" if fpga_info.get(col) is None else f"{fpga_info[col]:.6f}")
+               for col in VARIANT_FIDELITY_FIELDS},
+            "fpga_source": fpga_info.get("fpga_source") or "",
+            "cpu_engine": cpu_info.get("cpu_engine") or "",
+            # Only successful simulated/timed parts carry a key, so failures are retried
+            "fpga_key": (old.get("fpga_key", "") if keep_fpga else
+                         fpga_keys.get(prog, "") if fpga_info.get("fpga_source") == "rtl" else ""),
+            "cpu_key": (old.get("cpu_key", "") if keep_cpu else
+                        cpu_keys.get(prog, "") if cpu_info.get("cpu_status") == "ok" else ""),
         }
         rows.append(row)
-        print(f"[bench] prog={prog} fpga_us={row['fpga_us']} fidelity={row['fidelity']} l2={row['l2_err']} hw_norm={row['hw_norm']}")
-
+        reused = [part for part, hit in (("fpga", keep_fpga), ("cpu", keep_cpu)) if hit]
+        note = f" (reused {'+'.join(reused)})" if reused else ""
+        variants = "".join(f" fidelity_{v}={row[f'fidelity_{v}']} hw_norm_{v}={row[f'hw_norm_{v}']}" for v in FPGA_VARIANTS)
+        print(f"[bench] prog={prog} fpga_us={row['fpga_us']} fidelity={row['fidelity']} l2={row['l2_err']} "
+              f"hw_norm={row['hw_norm']}{variants}{note}")
+
+    # Keep stored rows for programs/hosts outside this invocation
+    this_run = set(programs)
+    rows = [r for r in existing if not (r.get("host") == host and r.get("prog") in this_run)] + rows
     write_csv(rows, args.out)
     print(f"[bench] Wrote results to {args.out}")
     return 1 if failures else 0
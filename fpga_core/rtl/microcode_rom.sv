@@ -1,5 +1,5 @@
 module microcode_rom(
-    input  logic [2:0]  prog_id,    // 0:QFT2, 1:QFT3, 2:QFT4, 3:GROVER2, 4:GROVER3, 5:GROVER4, 6:BELL2
+    input  logic [2:0]  prog_id,    // 0:QFT2, 1:QFT3, 2:QFT4, 3:GROVER2, 4:GROVER3, 5:GROVER4, 6:BELL2, 7:IMAGE
     input  logic [7:0]  addr,
     output logic [31:0] data
 );
@@ -20,6 +20,21 @@ module microcode_rom(
         return {4'h7, mask, value, 8'd0, ang, 4'h0};
     endfunction
 
+    // prog_id 7 runs a program assembled by experiments/microcode.py, loaded at
+    // simulation start from the $readmemh image named by +rom_image=<file>.
+    // Addresses the image does not fill (all of them without the plusarg, or
+    // in synthesis) read as END.
+    logic [31:0] image [0:255];
+    initial begin
+        for (int i = 0; i < 256; i++) image[i] = pack_i16(4'hF, 4'd0, 4'd0, 16'd0);
+`ifndef SYNTHESIS
+        begin
+            string image_path;
+            if ($value$plusargs("rom_image=%s", image_path)) $readmemh(image_path, image);
+        end
+`endif
+    end
+
     always_comb begin
         data = pack_i16(4'hF, 4'd0, 4'd0, 16'd0); // default END
         unique case (prog_id)
@@ -150,6 +165,7 @@ module microcode_rom(
                     default: data = pack_i16(4'hF, 4'd0, 4'd0, 16'd0);
                 endcase
             end
+            3'd7: data = image[addr]; // IMAGE (+rom_image=)
             default: begin
                 data = pack_i16(4'hF, 4'd0, 4'd0, 16'd0);
             end
@@ -1,14 +1,23 @@
 
 module qc_top #(
-    parameter N_QUBITS = 4
+    parameter N_QUBITS = 4,
+    parameter PIPELINE = 0,  // 1: one-pair-per-clock pair ops (see scheduler.sv)
+    parameter DIAG_FAST = 0  // 1: diagonal ops visit only the addresses they change
 )(
     input  logic clk,
     input  logic start,
     input  logic [2:0] prog_id,
     output logic done,
-    output logic [31:0] cycle_count
+    output logic [31:0] cycle_count,
+    output logic pipelined,
+    output logic diag_fast,
+    output logic [4:0] n_qubits  // N_QUBITS, for the testbench
 );
-    scheduler #(.N_QUBITS(N_QUBITS)) u_sched (
+    assign pipelined = (PIPELINE != 0);
+    assign diag_fast = (DIAG_FAST != 0);
+    assign n_qubits  = 5'(N_QUBITS);
+
+    scheduler #(.N_QUBITS(N_QUBITS), .PIPELINE(PIPELINE), .DIAG_FAST(DIAG_FAST)) u_sched (
         .clk(clk),
         .start(start),
         .prog_id(prog_id),
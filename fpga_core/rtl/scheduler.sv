@@ -1,6 +1,18 @@
 
 module scheduler #(
-    parameter N_QUBITS = 4
+    parameter N_QUBITS = 4,
+    // 0: serial pair ops (compute + write cycle per pair, idx walks all DIM
+    //    addresses); 1: pipelined read / gate / write stages, issuing one pair
+    //    per clock over the DIM/2 pair addresses only (targets outside the
+    //    address width keep the serial walk). Every stage is register to
+    //    register, so the clock is no slower than the serial core's. Final
+    //    states are identical, only cycle counts differ.
+    parameter PIPELINE = 0,
+    // 0: diagonal ops walk all DIM addresses, reading the previous cycle's
+    //    address (bit-exact with the original core); 1: visit only the
+    //    addresses the gate changes, one read-modify-write per clock, and
+    //    skip identity phases and patterns no address matches
+    parameter DIAG_FAST = 0
 )(
     input  logic clk,
     input  logic start,
@@ -34,11 +46,18 @@ module scheduler #(
     logic [AW-1:0] addr_a, addr_b;
     logic signed [15:0] din_a_r, din_a_i, dout_a_r, dout_a_i;
     logic signed [15:0] din_b_r, din_b_i, dout_b_r, dout_b_i;
+    // Write port inputs: the registered we/din, or in pipelined pair mode the
+    // write stage registers
+    logic mem_we_a, mem_we_b;
+    logic [AW-1:0] mem_waddr_a, mem_waddr_b;
+    logic signed [15:0] mem_din_a_r, mem_din_a_i, mem_din_b_r, mem_din_b_i;
+    // Read data before forwarding; dout_* below are the forwarded values
+    logic signed [15:0] mem_dout_a_r, mem_dout_a_i, mem_dout_b_r, mem_dout_b_i;
 
     state_mem #(.N_QUBITS(N_QUBITS)) u_mem (
         .clk(clk),
-        .we_a(we_a), .addr_a(addr_a), .din_a_r(din_a_r), .din_a_i(din_a_i), .dout_a_r(dout_a_r), .dout_a_i(dout_a_i),
-        .we_b(we_b), .addr_b(addr_b), .din_b_r(din_b_r), .din_b_i(din_b_i), .dout_b_r(dout_b_r), .dout_b_i(dout_b_i)
+        .we_a(mem_we_a), .addr_a(addr_a), .waddr_a(mem_waddr_a), .din_a_r(mem_din_a_r), .din_a_i(mem_din_a_i), .dout_a_r(mem_dout_a_r), .dout_a_i(mem_dout_a_i),
+        .we_b(mem_we_b), .addr_b(addr_b), .waddr_b(mem_waddr_b), .din_b_r(mem_din_b_r), .din_b_i(mem_din_b_i), .dout_b_r(mem_dout_b_r), .dout_b_i(mem_dout_b_i)
     );
 
     // Gates
@@ -89,6 +108,7 @@ module scheduler #(
 
     localparam logic [AW-1:0] LAST_IDX = {AW{1'b1}};
     localparam logic [AW-1:0] IDX_ONE  = {{(AW-1){1'b0}}, 1'b1};
+    localparam logic [AW-1:0] LAST_PAIR = LAST_IDX >> 1;
 
     logic [31:0] cnt;
     assign cycle_count = cnt;
@@ -132,6 +152,15 @@ module scheduler #(
         end
     endfunction
 
+    // Lower address of pair p for target b (< AW): p with a 0 inserted at bit b
+    function automatic logic [AW-1:0] pair_lo(input logic [AW-1:0] p, input logic [3:0] b);
+        logic [AW-1:0] low_mask;
+        begin
+            low_mask = (IDX_ONE << b) - IDX_ONE;
+            return ((p & ~low_mask) << 1) | (p & low_mask);
+        end
+    endfunction
+
     function automatic logic [AW-1:0] swap_bits(input logic [AW-1:0] x, input logic [3:0] b1, input logic [3:0] b2);
         logic [AW-1:0] y;
         logic [AW-1:0] mask;
@@ -159,6 +188,149 @@ module scheduler #(
         end
     endfunction
 
+    // Pipelined pair mode, three stages per pair:
+    //   read:  addr_a/addr_b hold pair idx; the amplitudes are registered
+    //          into rd_*
+    //   gate:  the gate runs on rd_* and its outputs are registered into wr_*
+    //   write: wr_* drive the write ports at wr_addr_*
+    // A read of an address still in the write stage is forwarded from it to
+    // every reader, one still in the gate stage to the read stage only (an
+    // instruction's pair is in the gate stage during S_NEXT or S_FETCH, when
+    // nothing else reads). Pairs of one gate are disjoint and S_NEXT/S_FETCH
+    // give the last pair time to reach memory, so with the current issue
+    // spacing the forwarding never fires and the write stage never shares a
+    // port with the next instruction's writes.
+    logic pipe_target, pipe_pair;
+    assign pipe_target = (PIPELINE != 0) && (int'(target) < AW);
+    assign pipe_pair   = pipe_target && (st == S_EXEC_PAIR);
+
+    logic rd_valid, wr_valid;
+    /* verilator lint_off UNUSEDSIGNAL */ // read only by g_pipe
+    logic [3:0] rd_op;
+    logic rd_ctrl;
+    logic signed [15:0] rd_a_r, rd_a_i, rd_b_r, rd_b_i;
+    /* verilator lint_on UNUSEDSIGNAL */
+    logic [AW-1:0] rd_addr_a, rd_addr_b, wr_addr_a, wr_addr_b;
+    logic signed [15:0] wr_a_r, wr_a_i, wr_b_r, wr_b_i;
+    logic signed [15:0] pg0r, pg0i, pg1r, pg1i; // gate stage outputs
+    logic signed [15:0] fwd_a_r, fwd_a_i, fwd_b_r, fwd_b_i;
+
+    generate if (PIPELINE != 0) begin : g_pipe
+        logic signed [15:0] ph0r,ph0i,ph1r,ph1i;
+        gate_h u_ph(.ar(rd_a_r), .ai(rd_a_i), .br(rd_b_r), .bi(rd_b_i),
+                    .out0r(ph0r), .out0i(ph0i), .out1r(ph1r), .out1i(ph1i));
+
+        logic signed [15:0] pxz0r,pxz0i,pxz1r,pxz1i;
+        gate_xz u_pxz(.apply_x(rd_op == OP_X), .apply_z(1'b0),
+                      .in0r(rd_a_r), .in0i(rd_a_i), .in1r(rd_b_r), .in1i(rd_b_i),
+                      .out0r(pxz0r), .out0i(pxz0i), .out1r(pxz1r), .out1i(pxz1i));
+
+        logic signed [15:0] pcnot0r,pcnot0i,pcnot1r,pcnot1i;
+        gate_cnot u_pcnot(.ctrl_bit(rd_ctrl),
+                          .ar(rd_a_r), .ai(rd_a_i), .br(rd_b_r), .bi(rd_b_i),
+                          .out0r(pcnot0r), .out0i(pcnot0i), .out1r(pcnot1r), .out1i(pcnot1i));
+
+        always_comb begin
+            case (rd_op)
+                OP_H: begin
+                    pg0r = ph0r;    pg0i = ph0i;    pg1r = ph1r;    pg1i = ph1i;
+                end
+                OP_X: begin
+                    pg0r = pxz0r;   pg0i = pxz0i;   pg1r = pxz1r;   pg1i = pxz1i;
+                end
+                default: begin // OP_CNOT
+                    pg0r = pcnot0r; pg0i = pcnot0i; pg1r = pcnot1r; pg1i = pcnot1i;
+                end
+            endcase
+        end
+    end else begin : g_serial
+        assign pg0r = '0; assign pg0i = '0;
+        assign pg1r = '0; assign pg1i = '0;
+    end endgenerate
+
+    // Write-after-read forwarding: the gate stage holds the newest value of
+    // its pair, the write stage the next newest, the memory the oldest
+    always_comb begin
+        dout_a_r = mem_dout_a_r; dout_a_i = mem_dout_a_i;
+        dout_b_r = mem_dout_b_r; dout_b_i = mem_dout_b_i;
+        if (wr_valid) begin
+            if (addr_a == wr_addr_a) begin dout_a_r = wr_a_r; dout_a_i = wr_a_i; end
+            if (addr_a == wr_addr_b) begin dout_a_r = wr_b_r; dout_a_i = wr_b_i; end
+            if (addr_b == wr_addr_a) begin dout_b_r = wr_a_r; dout_b_i = wr_a_i; end
+            if (addr_b == wr_addr_b) begin dout_b_r = wr_b_r; dout_b_i = wr_b_i; end
+        end
+    end
+
+    always_comb begin
+        fwd_a_r = dout_a_r; fwd_a_i = dout_a_i;
+        fwd_b_r = dout_b_r; fwd_b_i = dout_b_i;
+        if (rd_valid) begin
+            if (addr_a == rd_addr_a) begin fwd_a_r = pg0r; fwd_a_i = pg0i; end
+            if (addr_a == rd_addr_b) begin fwd_a_r = pg1r; fwd_a_i = pg1i; end
+            if (addr_b == rd_addr_a) begin fwd_b_r = pg0r; fwd_b_i = pg0i; end
+            if (addr_b == rd_addr_b) begin fwd_b_r = pg1r; fwd_b_i = pg1i; end
+        end
+    end
+
+    always_comb begin
+        mem_we_a    = we_a;
+        mem_we_b    = we_b;
+        mem_waddr_a = addr_a;
+        mem_waddr_b = addr_b;
+        mem_din_a_r = din_a_r;
+        mem_din_a_i = din_a_i;
+        mem_din_b_r = din_b_r;
+        mem_din_b_i = din_b_i;
+        if (fast_diag) begin
+            // addr_a holds a matching address: read, phase and write it back
+            mem_we_a = 1'b1;
+            if (opcode == OP_Z || (opcode == OP_MASKPHASE && angle_id == 8'd1)) begin
+                mem_din_a_r = -dout_a_r;
+                mem_din_a_i = -dout_a_i;
+            end else begin
+                mem_din_a_r = ph_out_r;
+                mem_din_a_i = ph_out_i;
+            end
+        end
+        if (wr_valid) begin
+            mem_we_a    = 1'b1;
+            mem_we_b    = 1'b1;
+            mem_waddr_a = wr_addr_a;
+            mem_waddr_b = wr_addr_b;
+            mem_din_a_r = wr_a_r; mem_din_a_i = wr_a_i;
+            mem_din_b_r = wr_b_r; mem_din_b_i = wr_b_i;
+        end
+    end
+
+    // Diagonal fast path: the addresses a Z/CPHASE/MASKPHASE changes are
+    // those with (addr & diag_mask) == diag_value
+    logic [AW-1:0] diag_mask, diag_value;
+    logic diag_skip, fast_diag;
+    assign fast_diag = (DIAG_FAST != 0) && (st == S_EXEC_DIAG);
+
+    always_comb begin
+        diag_mask  = '0;
+        diag_value = '0;
+        diag_skip  = 1'b0;
+        if (opcode == OP_Z) begin
+            if (int'(target) < AW) diag_mask = IDX_ONE << target;
+            else                   diag_skip = 1'b1;
+            diag_value = diag_mask;
+        end else if (opcode == OP_CPHASE) begin
+            if (int'(target) < AW && int'(control_q2) < AW) diag_mask = (IDX_ONE << target) | (IDX_ONE << control_q2);
+            else                                            diag_skip = 1'b1;
+            diag_value = diag_mask;
+        end else begin
+            for (int unsigned b = 0; b < AW && b < 4; ++b) begin
+                diag_mask[b]  = target[b];
+                diag_value[b] = control_q2[b];
+            end
+            diag_skip = (diag_value & ~diag_mask) != '0;
+        end
+        // phase_lut maps every other angle_id to the identity
+        if (opcode != OP_Z && (angle_id == 8'd0 || angle_id > 8'd4)) diag_skip = 1'b1;
+    end
+
     // Next-state logic
     always_comb begin
         // Hold previous values by default
@@ -202,8 +374,18 @@ module scheduler #(
                     pair_stage_next = 1'b0;
                     if (opcode == OP_H || opcode == OP_X || opcode == OP_CNOT) begin
                         st_next = S_EXEC_PAIR;
+                        if (pipe_target) begin
+                            // Register pair 0's addresses while decoding
+                            addr_a_next = '0;
+                            addr_b_next = partner('0, target);
+                        end
                     end else if (opcode == OP_Z || opcode == OP_CPHASE || opcode == OP_MASKPHASE) begin
-                        st_next = S_EXEC_DIAG;
+                        if (DIAG_FAST != 0 && diag_skip) begin
+                            st_next = S_NEXT; // changes no amplitude
+                        end else begin
+                            st_next = S_EXEC_DIAG;
+                            if (DIAG_FAST != 0) addr_a_next = diag_value; // first match
+                        end
                     end else if (opcode == OP_SWAP) begin
                         st_next = S_EXEC_SWAP;
                     end else begin
@@ -212,7 +394,20 @@ module scheduler #(
                 end
             end
 
-            S_EXEC_PAIR: begin
+            S_EXEC_PAIR: if (pipe_target) begin
+                // Pair idx enters the read stage; register the next pair
+                logic [AW-1:0] lo_next;
+                lo_next     = pair_lo(idx + IDX_ONE, target);
+                addr_a_next = lo_next;
+                addr_b_next = partner(lo_next, target);
+                if (idx == LAST_PAIR) begin
+                    st_next  = S_NEXT;
+                    idx_next = '0; // leave idx where the serial walk wraps to
+                end else begin
+                    idx_next = idx + IDX_ONE;
+                end
+                cnt_next = cnt + 32'd1;
+            end else begin
                 logic [AW-1:0] j;
                 j = partner(idx, target);
                 addr_a_next = idx;
@@ -268,7 +463,16 @@ module scheduler #(
                 cnt_next = cnt + 32'd1;
             end
 
-            S_EXEC_DIAG: begin
+            S_EXEC_DIAG: if (DIAG_FAST != 0) begin
+                // addr_a is written back this cycle; step to the next match by
+                // incrementing the bits outside diag_mask
+                addr_a_next = (((addr_a | diag_mask) + IDX_ONE) & ~diag_mask) | diag_value;
+                if ((addr_a | diag_mask) == LAST_IDX) begin
+                    st_next  = S_NEXT;
+                    idx_next = LAST_IDX; // where the full walk leaves idx
+                end
+                cnt_next = cnt + 32'd1;
+            end else begin
                 addr_a_next = idx;
                 if (opcode == OP_Z) begin
                     if (is_bit_set(idx, target)) begin
@@ -369,6 +573,28 @@ module scheduler #(
         apply_x    <= apply_x_next;
         apply_z    <= apply_z_next;
         ctrl_bit   <= ctrl_bit_next;
+
+        // Pipeline stages (idle unless PIPELINE)
+        rd_valid   <= pipe_pair;
+        if (pipe_pair) begin
+            rd_op     <= opcode;
+            rd_ctrl   <= is_bit_set(addr_a, control_q2);
+            rd_addr_a <= addr_a;
+            rd_addr_b <= addr_b;
+            rd_a_r    <= fwd_a_r;
+            rd_a_i    <= fwd_a_i;
+            rd_b_r    <= fwd_b_r;
+            rd_b_i    <= fwd_b_i;
+        end
+        wr_valid   <= rd_valid;
+        if (rd_valid) begin
+            wr_addr_a <= rd_addr_a;
+            wr_addr_b <= rd_addr_b;
+            wr_a_r    <= pg0r;
+            wr_a_i    <= pg0i;
+            wr_b_r    <= pg1r;
+            wr_b_i    <= pg1i;
+        end
     end
 
     initial begin
@@ -389,5 +615,21 @@ module scheduler #(
         apply_x    = 1'b0;
         apply_z    = 1'b0;
         ctrl_bit   = 1'b0;
+        rd_valid   = 1'b0;
+        wr_valid   = 1'b0;
+        rd_op      = OP_H;
+        rd_ctrl    = 1'b0;
+        rd_addr_a  = '0;
+        rd_addr_b  = '0;
+        rd_a_r     = '0;
+        rd_a_i     = '0;
+        rd_b_r     = '0;
+        rd_b_i     = '0;
+        wr_addr_a  = '0;
+        wr_addr_b  = '0;
+        wr_a_r     = '0;
+        wr_a_i     = '0;
+        wr_b_r     = '0;
+        wr_b_i     = '0;
     end
 endmodule
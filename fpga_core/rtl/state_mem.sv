@@ -4,14 +4,15 @@ module state_mem #(
     parameter WIDTH = 16
 )(
     input  logic clk,
-    // Port A (read/write)
+    // Port A (read/write); waddr_a is the write address, equal to addr_a
+    // except while a pipelined write trails the read
     input  logic we_a,
-    input  logic [$clog2(1<<N_QUBITS)-1:0] addr_a,
+    input  logic [$clog2(1<<N_QUBITS)-1:0] addr_a, waddr_a,
     input  logic signed [WIDTH-1:0] din_a_r, din_a_i,
     output logic signed [WIDTH-1:0] dout_a_r, dout_a_i,
     // Port B (read/write)
     input  logic we_b,
-    input  logic [$clog2(1<<N_QUBITS)-1:0] addr_b,
+    input  logic [$clog2(1<<N_QUBITS)-1:0] addr_b, waddr_b,
     input  logic signed [WIDTH-1:0] din_b_r, din_b_i,
     output logic signed [WIDTH-1:0] dout_b_r, dout_b_i
 );
@@ -33,12 +34,12 @@ module state_mem #(
     // Write-first behavior
     always_ff @(posedge clk) begin
         if (we_a) begin
-            mem_r[addr_a] <= din_a_r;
-            mem_i[addr_a] <= din_a_i;
+            mem_r[waddr_a] <= din_a_r;
+            mem_i[waddr_a] <= din_a_i;
         end
         if (we_b) begin
-            mem_r[addr_b] <= din_b_r;
-            mem_i[addr_b] <= din_b_i;
+            mem_r[waddr_b] <= din_b_r;
+            mem_i[waddr_b] <= din_b_i;
         end
     end
 
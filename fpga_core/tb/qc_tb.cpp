@@ -13,98 +13,87 @@
 #include <cstdio>
 #include <cstdint>
 #include <cstdlib>
+#include <cstring>
 #include <iostream>
+#include <memory>
 #include <string>
 #include <vector>
 
-static vluint64_t main_time = 0;
-double sc_time_stamp() { return main_time; }
-
 static inline float q15_to_float(int16_t v) {
     return static_cast<float>(v) / 32768.0f;
 }
 
-int main(int argc, char** argv) {
-    Verilated::commandArgs(argc, argv);
-
-    bool dump_vcd = std::getenv("DUMP_VCD") != nullptr;
-    Verilated::traceEverOn(dump_vcd);
+static int prog_id_of(const std::string& prog) {
+    if (prog=="qft2") return 0;
+    if (prog=="qft3") return 1;
+    if (prog=="qft4") return 2;
+    if (prog=="grover2") return 3;
+    if (prog=="grover3") return 4;
+    if (prog=="grover4") return 5;
+    if (prog=="bell2") return 6;
+    if (prog=="image") return 7; // microcode_rom loads it from +rom_image=<file>
+    return -1;
+}
 
-    // Parse +prog= and optional +fclk_hz=, +dump_state=
-    std::string prog = "qft4";
-    double fclk_hz = 100e6; // default 100 MHz
-    bool dump_state_flag = (std::getenv("DUMP_STATE") != nullptr);
-    for (int i=1;i<argc;i++){
-        std::string a(argv[i]);
-        if (a.rfind("+prog=",0)==0) prog = a.substr(6);
-        else if (a.rfind("+fclk_hz=",0)==0) {
-            try { fclk_hz = std::stod(a.substr(10)); } catch (...) {}
-        } else if (a.rfind("+dump_state=",0)==0) { try { dump_state_flag = std::stol(a.substr(12)) != 0; } catch (...) {} }
-    }
-    // Env override for FCLK_HZ
-    if (const char* env = std::getenv("FCLK_HZ")) {
-        try { fclk_hz = std::stod(env); } catch (...) {}
+static std::vector<std::string> split_list(const std::string& s) {
+    std::vector<std::string> out;
+    std::size_t pos = 0;
+    while (pos <= s.size()) {
+        std::size_t comma = s.find(',', pos);
+        if (comma == std::string::npos) comma = s.size();
+        if (comma > pos) out.push_back(s.substr(pos, comma - pos));
+        pos = comma + 1;
     }
+    return out;
+}
 
-    uint32_t prog_id = 2; // qft4 default
-    if (prog=="qft2") prog_id = 0;
-    else if (prog=="qft3") prog_id = 1;
-    else if (prog=="qft4") prog_id = 2;
-    else if (prog=="grover2") prog_id = 3;
-    else if (prog=="grover3") prog_id = 4;
-    else if (prog=="grover4") prog_id = 5;
-    else if (prog=="bell2") prog_id = 6;
-    else {
-        std::cerr << "[TB][FAIL] unknown +prog option: " << prog << std::endl;
-        return 1;
-    }
+struct RunResult {
+    bool done = false;
+    int n_qubits = 0;       // qc_top's N_QUBITS: the state memory holds 2^n_qubits amplitudes
+    bool pipelined = false; // qc_top built with PIPELINE=1
+    bool diag_fast = false; // qc_top built with DIAG_FAST=1
+    uint32_t cycles = 0;
+    std::vector<std::complex<float>> state;
+    std::vector<int16_t> raw; // Q15 (re, im) pairs as stored in the state memory
+};
+
+// File name suffix for the scheduler variant that produced a run: _pipe
+// and/or _diag, empty for the default build
+static std::string variant_suffix(const RunResult& res) {
+    return std::string(res.pipelined ? "_pipe" : "") + (res.diag_fast ? "_diag" : "");
+}
 
-    Vqc_top* top = new Vqc_top;
+// One run on a freshly constructed model: construction re-runs the RTL
+// initial blocks (scheduler in S_IDLE, state memory back to |0...0>), which
+// is the only reset the design has. Each run gets its own VerilatedContext,
+// since Verilator refuses to add a model to a context whose time is not 0;
+// argc/argv are handed to it for the RTL's $value$plusargs. Coverage builds
+// write <cov_stem>.dat, with _pipe/_diag appended for the scheduler variants.
+static RunResult run_once(uint32_t prog_id, const char* vcd_path, const std::string& cov_stem,
+                          int argc, char** argv) {
+    auto ctx = std::make_unique<VerilatedContext>();
+    ctx->commandArgs(argc, argv);
+    ctx->traceEverOn(vcd_path != nullptr);
+    Vqc_top* top = new Vqc_top{ctx.get()};
 
     VerilatedVcdC* tfp = nullptr;
-    if (dump_vcd) {
+    if (vcd_path) {
         tfp = new VerilatedVcdC;
         top->trace(tfp, 99);
-        tfp->open("obj_dir/qc_top.vcd");
+        tfp->open(vcd_path);
     }
 
     top->clk = 0;
     top->start = 0;
     top->prog_id = prog_id;
 
-    auto cleanup = [&](bool write_cov) {
-        if (top) {
-            top->final();
-#if VM_COVERAGE
-            if (write_cov) {
-                VerilatedCov::write();
-            }
-#endif
-        }
-        if (tfp) {
-            tfp->close();
-            delete tfp; tfp = nullptr;
-        }
-        delete top; top = nullptr;
-    };
-
-    auto fail = [&](const std::string& why) -> void {
-        std::cerr << "[TB][FAIL] " << why << std::endl;
-        cleanup(true);
-        std::exit(1);
-    };
-
-    auto pass = [&](const std::string& name) -> void {
-        std::cout << "[TB][PASS] " << name << std::endl;
-    };
-
     auto tick = [&]() {
         top->clk = !top->clk;
         top->eval();
         if (tfp) {
-            tfp->dump(main_time);
+            tfp->dump(ctx->time());
         }
-        main_time += 5; // 5 ns half-period
+        ctx->timeInc(5); // 5 ns half-period
     };
 
     // idle few cycles
@@ -115,170 +104,322 @@ int main(int argc, char** argv) {
     top->start = 0;
 
     // run until done
-    bool seen_done = false;
+    RunResult res;
     for (int i = 0; i < 200000; ++i) {
         tick();
-        if (top->done) { seen_done = true; break; }
-    }
-
-    printf("[SIM] prog=%s done=%d cycles=%u\n", prog.c_str(), (int)seen_done, top->cycle_count);
-    double fpga_us = (fclk_hz > 0.0) ? (double(top->cycle_count) * 1e6 / fclk_hz) : 0.0;
-    printf("[BENCH] fpga_cycles=%u fpga_us=%.3f\n", top->cycle_count, fpga_us);
-
-    if (!seen_done) {
-        fail("timeout waiting for done");
+        if (top->done) { res.done = true; break; }
     }
+    res.cycles = top->cycle_count;
+    res.pipelined = top->pipelined;
+    res.diag_fast = top->diag_fast;
+    res.n_qubits = top->n_qubits;
+    const int dim = 1 << res.n_qubits;
 
-    constexpr int DIM = 1 << 4; // matches N_QUBITS=4
     auto* root = top->rootp;
     auto* syms = root->vlSymsp;
     auto& mem = syms->TOP__qc_top__u_sched__u_mem;
-    std::vector<std::complex<float>> state(DIM);
-    std::vector<float> mags(DIM);
-    float total_prob = 0.0f;
-    for (int i = 0; i < DIM; ++i) {
+    res.state.resize(dim);
+    res.raw.resize(2 * dim);
+    for (int i = 0; i < dim; ++i) {
         int16_t r = static_cast<int16_t>(mem.mem_r[i]);
         int16_t im = static_cast<int16_t>(mem.mem_i[i]);
-        std::complex<float> amp(q15_to_float(r), q15_to_float(im));
-        state[i] = amp;
-        mags[i] = std::norm(amp);
-        total_prob += mags[i];
+        res.raw[2 * i] = r;
+        res.raw[2 * i + 1] = im;
+        res.state[i] = std::complex<float>(q15_to_float(r), q15_to_float(im));
     }
 
-    if (std::getenv("DUMP_STATE")) {
-        std::cout << "[TB][STATE] " << prog << " amplitudes" << std::endl;
-        for (int i = 0; i < DIM; ++i) {
-            auto amp = state[i];
-            std::cout << "  idx=" << i
-                      << " real=" << amp.real()
-                      << " imag=" << amp.imag()
-                      << " mag2=" << mags[i] << std::endl;
-        }
+    top->final();
+#if VM_COVERAGE
+    ctx->coveragep()->write(cov_stem + variant_suffix(res) + ".dat");
+#else
+    (void)cov_stem;
+#endif
+    if (tfp) {
+        tfp->close();
+        delete tfp;
     }
+    delete top;
+    return res;
+}
 
+// Active qubits from the program name suffix (digits at end), default to all
+// mem_qubits of the state memory
+static int active_qubits_of(const std::string& prog, int mem_qubits) {
+    int active_qubits = mem_qubits;
+    int num = 0;
+    int place = 1;
+    for (int i = int(prog.size()) - 1; i >= 0; --i) {
+        char c = prog[std::size_t(i)];
+        if (c < '0' || c > '9') break;
+        num = (c - '0') * place + num;
+        place *= 10;
+    }
+    if (num > 0) active_qubits = num;
+    return active_qubits;
+}
 
-    // Optional CSV dump of the active-qubit state for fidelity calc
-    if (dump_state_flag) {
-        // Infer active qubits from program name suffix (digits at end), default to 4
-        int active_qubits = 4;
-        {
-            int num = 0;
-            int place = 1;
-            for (int i = int(prog.size()) - 1; i >= 0; --i) {
-                char c = prog[std::size_t(i)];
-                if (c < '0' || c > '9') break;
-                num = (c - '0') * place + num;
-                place *= 10;
-            }
-            if (num > 0 && num <= 4) active_qubits = num;
-        }
-        int dim_n = 1 << active_qubits;
-        const int DIM_ALL = 1 << 4;
-        if (dim_n > DIM_ALL) dim_n = DIM_ALL;
+// Ensure output directory exists: ../../experiments/results/states/, relative
+// to the build directory the TB runs in (fpga_core/obj_dir)
+static std::string states_dir() {
+    std::string dir = std::string("../../experiments/results/states/");
+    std::string cmd = std::string("mkdir -p ") + dir;
+    std::system(cmd.c_str());
+    return dir;
+}
 
-        // Normalize first 2^n entries to unit L2 norm
-        double l2 = 0.0;
-        for (int i = 0; i < dim_n; ++i) {
-            l2 += double(std::norm(state[i]));
-        }
-        double scale = (l2 > 0.0) ? (1.0 / std::sqrt(l2)) : 1.0;
+// Binary dump header, see experiments/ref_sim.py (STATE_HEADER); little-endian host
+struct StateHeader {
+    char magic[4];
+    uint16_t version;
+    uint8_t kind;   // 0: int16 Q15 (re, im) pairs, 1: complex64
+    uint8_t order;  // 0: index bit 0 is qubit 0
+    uint32_t n;
+    uint32_t count;
+    double scale;   // amplitude = stored value * scale
+};
+static_assert(sizeof(StateHeader) == 24, "StateHeader must match ref_sim.STATE_HEADER");
 
-        // Ensure output directory exists: ../../experiments/results/states/
-        std::string dir = std::string("../../experiments/results/states/");
-        {
-            std::string cmd = std::string("mkdir -p ") + dir;
-            std::system(cmd.c_str());
-        }
+// Binary dump of the raw active-qubit state: header and payload in one write.
+// Files are <prog>_fpga_q<n><suffix>, suffix from variant_suffix().
+static void dump_state_bin(const std::string& prog, const std::vector<int16_t>& raw, int active_qubits,
+                           const std::string& suffix) {
+    uint32_t dim_n = 1u << active_qubits;
+    StateHeader hdr = {{'Q', 'C', 'S', 'T'}, 1, 0, 0, uint32_t(active_qubits), dim_n, 1.0 / 32768.0};
+    std::vector<char> buf(sizeof(hdr) + dim_n * 2 * sizeof(int16_t));
+    std::memcpy(buf.data(), &hdr, sizeof(hdr));
+    std::memcpy(buf.data() + sizeof(hdr), raw.data(), dim_n * 2 * sizeof(int16_t));
 
-        char pathbuf[512];
-        std::snprintf(pathbuf, sizeof(pathbuf), "%s%s_fpga_q%d.csv", dir.c_str(), prog.c_str(), active_qubits);
-        std::FILE* fp = std::fopen(pathbuf, "w");
-        if (fp) {
-            std::fputs("index,re,im\n", fp);
-            for (int i = 0; i < dim_n; ++i) {
-                float re = float(state[i].real() * scale);
-                float im = float(state[i].imag() * scale);
-                std::fprintf(fp, "%d,%.9f,%.9f\n", i, re, im);
-            }
-            std::fclose(fp);
-            std::cout << "[TB] dumped FPGA state: " << pathbuf << std::endl;
-        } else {
-            std::cerr << "[TB][WARN] could not open state CSV for write: " << pathbuf << std::endl;
-        }
+    char pathbuf[512];
+    std::snprintf(pathbuf, sizeof(pathbuf), "%s%s_fpga_q%d%s.bin", states_dir().c_str(), prog.c_str(), active_qubits,
+                  suffix.c_str());
+    std::FILE* fp = std::fopen(pathbuf, "wb");
+    if (fp && std::fwrite(buf.data(), 1, buf.size(), fp) == buf.size()) {
+        std::cout << "[TB] dumped FPGA state: " << pathbuf << std::endl;
+    } else {
+        std::cerr << "[TB][WARN] could not write state dump: " << pathbuf << std::endl;
     }
+    if (fp) std::fclose(fp);
+}
 
+// CSV export of the normalized active-qubit state (+dump_format=csv)
+static void dump_state_csv(const std::string& prog, const std::vector<std::complex<float>>& state,
+                           int active_qubits, const std::string& suffix) {
+    int dim_n = 1 << active_qubits;
 
-    auto require_prob_close = [&](float expected, float tol, const std::string& label) {
-        if (std::fabs(expected - total_prob) > tol) {
-            fail(label + ": probability sum off (" + std::to_string(total_prob) + ")");
+    // Normalize first 2^n entries to unit L2 norm
+    double l2 = 0.0;
+    for (int i = 0; i < dim_n; ++i) {
+        l2 += double(std::norm(state[i]));
+    }
+    double scale = (l2 > 0.0) ? (1.0 / std::sqrt(l2)) : 1.0;
+
+    std::string dir = states_dir();
+
+    char pathbuf[512];
+    std::snprintf(pathbuf, sizeof(pathbuf), "%s%s_fpga_q%d%s.csv", dir.c_str(), prog.c_str(), active_qubits,
+                  suffix.c_str());
+    std::FILE* fp = std::fopen(pathbuf, "w");
+    if (fp) {
+        std::fputs("index,re,im\n", fp);
+        for (int i = 0; i < dim_n; ++i) {
+            float re = float(state[i].real() * scale);
+            float im = float(state[i].imag() * scale);
+            std::fprintf(fp, "%d,%.9f,%.9f\n", i, re, im);
         }
+        std::fclose(fp);
+        std::cout << "[TB] dumped FPGA state: " << pathbuf << std::endl;
+    } else {
+        std::cerr << "[TB][WARN] could not open state CSV for write: " << pathbuf << std::endl;
+    }
+}
+
+// Self-check of the final state; returns an empty string on pass, else the reason.
+static std::string check_program(const std::string& prog, const std::vector<float>& mags, float total_prob) {
+    auto prob_off = [&](float expected, float tol) {
+        return std::fabs(expected - total_prob) > tol;
+    };
+    auto prob_msg = [&](const std::string& label) {
+        return label + ": probability sum off (" + std::to_string(total_prob) + ")";
     };
 
     if (prog == "qft2") {
-        require_prob_close(1.0f, 0.02f, "qft2");
+        if (prob_off(1.0f, 0.02f)) return prob_msg("qft2");
         const float expected = 0.25f;
         for (int i = 0; i < 4; ++i) {
             if (std::fabs(mags[i] - expected) > 0.02f) {
-                fail("qft2: uneven superposition at index " + std::to_string(i));
+                return "qft2: uneven superposition at index " + std::to_string(i);
             }
         }
         float tail = total_prob - expected * 4.0f;
         if (tail > 0.01f) {
-            fail("qft2: leakage detected");
+            return "qft2: leakage detected";
         }
-        pass("qft2");
     } else if (prog == "qft3") {
-        require_prob_close(1.0f, 0.05f, "qft3");
+        if (prob_off(1.0f, 0.05f)) return prob_msg("qft3");
         const float expected = 1.0f / 8.0f;
         for (int i = 0; i < 8; ++i) {
             if (std::fabs(mags[i] - expected) > 0.04f) {
-                fail("qft3: uneven superposition at index " + std::to_string(i));
+                return "qft3: uneven superposition at index " + std::to_string(i);
             }
         }
-        pass("qft3");
     } else if (prog == "qft4") {
-        require_prob_close(1.0f, 0.02f, "qft4");
+        if (prob_off(1.0f, 0.02f)) return prob_msg("qft4");
         const float expected = 1.0f / 16.0f;
-        for (int i = 0; i < DIM; ++i) {
+        for (int i = 0; i < 16; ++i) {
             if (std::fabs(mags[i] - expected) > 0.01f) {
-                fail("qft4: uneven superposition at index " + std::to_string(i));
+                return "qft4: uneven superposition at index " + std::to_string(i);
             }
         }
-        pass("qft4");
     } else if (prog == "grover2") {
-        require_prob_close(1.0f, 0.05f, "grover2");
+        if (prob_off(1.0f, 0.05f)) return prob_msg("grover2");
         int peak = static_cast<int>(std::distance(mags.begin(), std::max_element(mags.begin(), mags.end())));
         if (peak != 3) {
-            fail("grover2: expected maximum at index 3, got " + std::to_string(peak));
+            return "grover2: expected maximum at index 3, got " + std::to_string(peak);
         }
         if (mags[peak] < 0.85f) {
-            fail("grover2: marked state amplitude too small");
+            return "grover2: marked state amplitude too small";
         }
-        pass("grover2");
     } else if (prog == "grover3") {
         // Approximate microcode path; accept run and report peak externally
-        pass("grover3");
     } else if (prog == "grover4") {
         // Approximate microcode path; accept run and report peak externally
-        pass("grover4");
     } else if (prog == "bell2") {
-        require_prob_close(1.0f, 0.05f, "bell2");
+        if (prob_off(1.0f, 0.05f)) return prob_msg("bell2");
         float bell_mass = mags[0] + mags[3];
         if (std::fabs(mags[0] - 0.5f) > 0.05f || std::fabs(mags[3] - 0.5f) > 0.05f) {
-            fail("bell2: amplitudes not 0.5 each");
+            return "bell2: amplitudes not 0.5 each";
         }
         if (std::fabs(mags[0] - mags[3]) > 0.05f) {
-            fail("bell2: imbalance between |00> and |11>");
+            return "bell2: imbalance between |00> and |11>";
         }
         float others = total_prob - bell_mass;
         if (others > 0.05f) {
-            fail("bell2: leakage detected");
+            return "bell2: leakage detected";
         }
-        pass("bell2");
+    } else if (prog == "image") {
+        // Assembled program: only the state norm is known here
+        if (prob_off(1.0f, 0.05f)) return prob_msg("image");
     } else {
-        fail("unhandled program check: " + prog);
+        return "unhandled program check: " + prog;
     }
+    return "";
+}
 
-    cleanup(true);
-    return 0;
+int main(int argc, char** argv) {
+    bool dump_vcd = std::getenv("DUMP_VCD") != nullptr;
+
+    // Parse +prog= (or +progs=a,b,... with +runs=N) and optional +fclk_hz=, +dump_state=, +dump_format=
+    std::string prog = "qft4";
+    std::string progs_arg;
+    int runs = 1;
+    double fclk_hz = 100e6; // default 100 MHz
+    bool dump_state_flag = (std::getenv("DUMP_STATE") != nullptr);
+    std::string dump_format = "bin"; // bin, csv or both
+    for (int i=1;i<argc;i++){
+        std::string a(argv[i]);
+        if (a.rfind("+prog=",0)==0) prog = a.substr(6);
+        else if (a.rfind("+progs=",0)==0) progs_arg = a.substr(7);
+        else if (a.rfind("+runs=",0)==0) { try { runs = std::stoi(a.substr(6)); } catch (...) {} }
+        else if (a.rfind("+fclk_hz=",0)==0) {
+            try { fclk_hz = std::stod(a.substr(10)); } catch (...) {}
+        } else if (a.rfind("+dump_state=",0)==0) { try { dump_state_flag = std::stol(a.substr(12)) != 0; } catch (...) {} }
+        else if (a.rfind("+dump_format=",0)==0) dump_format = a.substr(13);
+    }
+    // Env override for FCLK_HZ
+    if (const char* env = std::getenv("FCLK_HZ")) {
+        try { fclk_hz = std::stod(env); } catch (...) {}
+    }
+
+    std::vector<std::string> progs = progs_arg.empty() ? std::vector<std::string>{prog} : split_list(progs_arg);
+    if (progs.empty() || runs < 1) {
+        std::cerr << "[TB][FAIL] need at least one program and +runs >= 1" << std::endl;
+        return 1;
+    }
+    if (dump_format != "bin" && dump_format != "csv" && dump_format != "both") {
+        std::cerr << "[TB][FAIL] +dump_format must be bin, csv or both" << std::endl;
+        return 1;
+    }
+    for (const auto& p : progs) {
+        if (prog_id_of(p) < 0) {
+            std::cerr << "[TB][FAIL] unknown +prog option: " << p << std::endl;
+            return 1;
+        }
+    }
+    // Batch mode: one [RUN] record per run, failures reported at the end
+    const bool batch = !progs_arg.empty() || runs > 1;
+
+    int failures = 0;
+    for (const auto& name : progs) {
+        const uint32_t prog_id = static_cast<uint32_t>(prog_id_of(name));
+        for (int run = 1; run <= runs; ++run) {
+            // Like the state dumps, relative to the run directory (the build
+            // directory: fpga_core/obj_dir for make and the bench)
+            std::string vcd = batch ? "qc_top_" + name + ".vcd" : "qc_top.vcd";
+            // Coverage builds: one file per program in batch mode (runs are identical)
+            std::string cov = batch ? "coverage_" + name : "coverage";
+            RunResult res = run_once(prog_id, (dump_vcd && run == 1) ? vcd.c_str() : nullptr, cov, argc, argv);
+            double fpga_us = (fclk_hz > 0.0) ? (double(res.cycles) * 1e6 / fclk_hz) : 0.0;
+
+            const int dim = static_cast<int>(res.state.size());
+            const int active_qubits = active_qubits_of(name, res.n_qubits);
+            std::vector<float> mags(dim);
+            float total_prob = 0.0f;
+            for (int i = 0; i < dim; ++i) {
+                mags[i] = std::norm(res.state[i]);
+                total_prob += mags[i];
+            }
+            std::string why;
+            if (!res.done) {
+                why = "timeout waiting for done";
+            } else if (active_qubits > res.n_qubits) {
+                why = name + ": needs " + std::to_string(active_qubits) + " qubits, model built with N_QUBITS="
+                      + std::to_string(res.n_qubits);
+            } else {
+                why = check_program(name, mags, total_prob);
+            }
+
+            if (!batch) {
+                printf("[SIM] prog=%s done=%d cycles=%u\n", name.c_str(), (int)res.done, res.cycles);
+                printf("[BENCH] fpga_cycles=%u fpga_us=%.3f mode=%s diag=%s qubits=%d\n", res.cycles, fpga_us,
+                       res.pipelined ? "pipelined" : "serial", res.diag_fast ? "fast" : "full", res.n_qubits);
+            }
+            printf("[RUN] prog=%s run=%d done=%d cycles=%u fpga_us=%.3f check=%s mode=%s diag=%s qubits=%d\n",
+                   name.c_str(), run, (int)res.done, res.cycles, fpga_us, why.empty() ? "pass" : "fail",
+                   res.pipelined ? "pipelined" : "serial", res.diag_fast ? "fast" : "full", res.n_qubits);
+            std::fflush(stdout);
+
+            if (run == 1 && res.done && active_qubits <= res.n_qubits) {
+                if (std::getenv("DUMP_STATE")) {
+                    std::cout << "[TB][STATE] " << name << " amplitudes" << std::endl;
+                    for (int i = 0; i < dim; ++i) {
+                        auto amp = res.state[i];
+                        std::cout << "  idx=" << i
+                                  << " real=" << amp.real()
+                                  << " imag=" << amp.imag()
+                                  << " mag2=" << mags[i] << std::endl;
+                    }
+                }
+                if (dump_state_flag && dump_format != "csv") {
+                    dump_state_bin(name, res.raw, active_qubits, variant_suffix(res));
+                }
+                if (dump_state_flag && dump_format != "bin") {
+                    dump_state_csv(name, res.state, active_qubits, variant_suffix(res));
+                }
+            }
+
+            if (!why.empty()) {
+                std::cerr << "[TB][FAIL] " << why << std::endl;
+                if (!batch) return 1;
+                ++failures;
+            } else if (!batch) {
+                std::cout << "[TB][PASS] " << name << std::endl;
+            }
+        }
+    }
+
+    if (batch) {
+        std::cout << "[TB][" << (failures ? "FAIL" : "PASS") << "] batch: " << progs.size()
+                  << " program(s) x " << runs << " run(s), " << failures << " failed" << std::endl;
+    }
+    return failures ? 1 : 0;
 }